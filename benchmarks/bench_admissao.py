@@ -0,0 +1,158 @@
+"""
+Pico de perguntas contra a cota de gerações simultâneas do Gemini, com e sem o controle
+de admissão do LLM (chatbot/admissao.py).
+
+O LLM falso falha com erro de cota quando uma geração começa com `--cota` outras em
+andamento, como o Gemini sob um pico. Cada cliente faz o que o /chat faz: `verificar_admissao`
+(429 se a fila está cheia) e depois o stream. Todas as perguntas são distintas, então nem o
+cache nem a coalescência ajudam. Sync: uma thread por cliente (como o app.py no worker
+gthread); async: uma task por cliente no event loop (como o app_async.py).
+
+Cenários:
+- pico: `--clientes` perguntas de 30 usuários chegando em `--janela` segundos
+- usuario_pesado: um usuário dispara 60 perguntas de uma vez e 20 usuários fazem uma
+  pergunta cada logo depois; mede quantos usuários leves foram atendidos e em quanto tempo
+
+Uso: python -m benchmarks.bench_admissao [--clientes 150] [--janela 1.0] [--cota 8] [--servidores sync,async]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from benchmarks.bench_coalescencia import preparar
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _ler_frame(frame, inicio, resultado):
+    dados = json.loads(frame[len("data: "):])
+    if "token" in dados and resultado["primeiro_token"] is None:
+        resultado["primeiro_token"] = time.perf_counter() - inicio
+    elif "error" in dados:
+        resultado["erro"] = dados["error"]
+
+
+def _desfecho(usuario, resultado):
+    erro = resultado["erro"]
+    if erro is None:
+        desfecho = "ok"
+    elif "429" in erro:
+        desfecho = "erro_cota"
+    else:
+        desfecho = "recusada_no_stream"
+    return {"desfecho": desfecho, "usuario": usuario, "primeiro_token": resultado["primeiro_token"]}
+
+
+async def cliente(modulo, pergunta, usuario, atraso):
+    await asyncio.sleep(atraso)
+    inicio = time.perf_counter()
+    if modulo.verificar_admissao(pergunta, usuario) is not None:
+        return {"desfecho": "429", "usuario": usuario}
+    resultado = {"primeiro_token": None, "erro": None}
+    async for frame in modulo.get_chatbot_answer_astream(pergunta, usuario):
+        _ler_frame(frame, inicio, resultado)
+    return _desfecho(usuario, resultado)
+
+
+def cliente_sync(modulo, pergunta, usuario, atraso):
+    time.sleep(atraso)
+    inicio = time.perf_counter()
+    if modulo.verificar_admissao(pergunta, usuario) is not None:
+        return {"desfecho": "429", "usuario": usuario}
+    resultado = {"primeiro_token": None, "erro": None}
+    for frame in modulo.get_chatbot_answer_stream(pergunta, usuario):
+        _ler_frame(frame, inicio, resultado)
+    return _desfecho(usuario, resultado)
+
+
+def clientes_cenario(cenario, args):
+    """Lista de (pergunta, usuário, atraso em segundos)."""
+    if cenario == 'pico':
+        return [(f"pergunta {i} sobre a impressora da loja {i}", f"usuario:{i % 30}", args.janela * i / args.clientes)
+                for i in range(args.clientes)]
+    pesado = [(f"pergunta pesada {i}", "usuario:pesado", 0.0) for i in range(60)]
+    leves = [(f"pergunta leve {i}", f"usuario:leve{i}", 0.05 + 0.01 * i) for i in range(20)]
+    return pesado + leves
+
+
+async def rodar(modulo, clientes):
+    return await asyncio.gather(*(cliente(modulo, *c) for c in clientes))
+
+
+def rodar_sync(modulo, clientes):
+    with ThreadPoolExecutor(max_workers=len(clientes)) as executor:
+        return list(executor.map(lambda c: cliente_sync(modulo, *c), clientes))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=150)
+    parser.add_argument('--janela', type=float, default=1.0)
+    parser.add_argument('--cota', type=int, default=8, help="gerações simultâneas aceitas pelo LLM falso")
+    parser.add_argument('--fila', type=int, default=32)
+    parser.add_argument('--fila-por-usuario', type=int, default=4)
+    parser.add_argument('--latencia', type=float, default=0.8)
+    parser.add_argument('--tokens-por-segundo', type=float, default=100.0)
+    parser.add_argument('--servidores', default='sync,async')
+    args = parser.parse_args()
+
+    from benchmarks.fakes import LLMFalso
+    from chatbot.admissao import ControleAdmissao
+    logging.getLogger('langchain_core').setLevel(logging.ERROR)
+    llm = LLMFalso(resposta=" ".join(["verifique o cabo"] * 25), latencia_primeiro_token=args.latencia,
+                   tokens_por_segundo=args.tokens_por_segundo, cota_concorrente=args.cota)
+    modos = {
+        "sem limite": dict(max_concorrentes=100000, fila_maxima=100000, fila_por_usuario=100000),
+        "limite, sem teto por usuário": dict(max_concorrentes=args.cota, fila_maxima=args.fila,
+                                             fila_por_usuario=args.fila),
+        "limite + teto por usuário": dict(max_concorrentes=args.cota, fila_maxima=args.fila,
+                                          fila_por_usuario=args.fila_por_usuario),
+    }
+    temporario = tempfile.mkdtemp(prefix='bench_admissao_')
+    try:
+        modulo = preparar(os.path.join(temporario, 'indice'), llm)
+        modulo.COALESCER_PERGUNTAS = False
+        print(f"LLM falso: cota de {args.cota} gerações simultâneas, primeiro token em {args.latencia:.1f}s, "
+              f"{args.tokens_por_segundo:.0f} tokens/s; fila de {args.fila}")
+        print(f"{'servidor':<10}{'cenário':<16}{'modo':<31}{'req.':>6}{'ok':>6}{'429':>6}{'erro cota':>11}{'outros':>8}"
+              f"{'pico LLM':>10}{'TTFT p50':>10}{'TTFT p99':>10}{'leves ok':>10}{'leves p50':>11}")
+        for servidor, cenario in ((s, c) for s in args.servidores.split(',') for c in ('pico', 'usuario_pesado')):
+            clientes = clientes_cenario(cenario, args)
+            for nome, configuracao in modos.items():
+                modulo.controle_llm = ControleAdmissao(espera_maxima=120, **configuracao)
+                modulo.cache_respostas.limpar()
+                llm.pico_concorrencia = 0
+                if servidor == 'sync':
+                    resultados = rodar_sync(modulo, clientes)
+                else:
+                    resultados = asyncio.run(rodar(modulo, clientes))
+                contagem = {d: sum(r["desfecho"] == d for r in resultados)
+                            for d in ("ok", "429", "erro_cota", "recusada_no_stream")}
+                ttft = [r["primeiro_token"] for r in resultados if r["desfecho"] == "ok"]
+                leves = [r["primeiro_token"] for r in resultados
+                         if r["desfecho"] == "ok" and r["usuario"].startswith("usuario:leve")]
+                print(f"{servidor:<10}{cenario:<16}{nome:<31}{len(resultados):>6}{contagem['ok']:>6}{contagem['429']:>6}"
+                      f"{contagem['erro_cota']:>11}{contagem['recusada_no_stream']:>8}{llm.pico_concorrencia:>10}"
+                      f"{percentil(ttft, 0.5):>9.2f}s{percentil(ttft, 0.99):>9.2f}s"
+                      + (f"{len(leves):>7}/20" if cenario == 'usuario_pesado' else f"{'-':>10}")
+                      + (f"{percentil(leves, 0.5):>10.2f}s" if leves else f"{'-':>11}"))
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
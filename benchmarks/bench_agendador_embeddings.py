@@ -0,0 +1,67 @@
+"""
+Benchmark do agendador de embeddings contra um backend falso (sem rede).
+Mostra docs/s conforme a concorrência aumenta, o efeito das falhas simuladas
+e a retomada a partir do checkpoint.
+
+Uso: python -m benchmarks.bench_agendador_embeddings [--documentos 2000]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from chatbot.agendador_embeddings import AgendadorEmbeddings
+from benchmarks.fakes import EmbeddingsFalsos
+
+
+def medir(textos, workers, tamanho_lote, latencia_chamada, taxa_falhas=0.0, caminho_checkpoint=None):
+    backend = EmbeddingsFalsos(dimensao=64, latencia_chamada=latencia_chamada, taxa_falhas=taxa_falhas)
+    agendador = AgendadorEmbeddings(
+        backend, tamanho_lote=tamanho_lote, max_workers=workers, max_tentativas=8, espera_inicial=0.01,
+        caminho_checkpoint=caminho_checkpoint, mostrar_progresso=False,
+    )
+    inicio = time.perf_counter()
+    vetores = agendador.embeddar(textos)
+    decorrido = time.perf_counter() - inicio
+    assert len(vetores) == len(textos)
+    return decorrido, agendador, backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documentos', type=int, default=2000)
+    parser.add_argument('--tamanho-lote', type=int, default=50)
+    parser.add_argument('--latencia', type=float, default=0.05, help='latência simulada por chamada (s)')
+    args = parser.parse_args()
+
+    textos = [f"Artigo {i}: falha na impressora MP 4200 TH, procedimento {i % 97}" for i in range(args.documentos)]
+
+    print(f"{args.documentos} documentos, lotes de {args.tamanho_lote}, latência {args.latencia * 1000:.0f} ms/chamada")
+    print(f"{'workers':>8} {'tempo (s)':>10} {'docs/s':>10}")
+    for workers in (1, 2, 4, 8, 16):
+        decorrido, _, _ = medir(textos, workers, args.tamanho_lote, args.latencia)
+        print(f"{workers:>8} {decorrido:>10.2f} {len(textos) / decorrido:>10.1f}")
+
+    decorrido, agendador, backend = medir(textos, 8, args.tamanho_lote, args.latencia, taxa_falhas=0.2)
+    print(f"\nCom 20% de falhas (8 workers): {len(textos) / decorrido:.1f} docs/s, "
+          f"{agendador.tentativas_extras} novas tentativas em {backend.chamadas} chamadas")
+
+    # Simula uma construção que cai no meio e é retomada a partir do checkpoint
+    caminho_checkpoint = tempfile.mkdtemp(prefix='checkpoint_bench_')
+    try:
+        metade = textos[:len(textos) // 2]
+        medir(metade, 8, args.tamanho_lote, args.latencia, caminho_checkpoint=caminho_checkpoint)
+        decorrido, agendador, backend = medir(textos, 8, args.tamanho_lote, args.latencia,
+                                              caminho_checkpoint=caminho_checkpoint)
+        print(f"Retomada do checkpoint: {agendador.lotes_do_checkpoint} lotes reaproveitados, "
+              f"{backend.chamadas} chamadas novas, {decorrido:.2f}s")
+    finally:
+        shutil.rmtree(caminho_checkpoint, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Chamadas ao LLM contra requisições de clientes quando muitas perguntas iguais chegam
+juntas (por exemplo, todos os franqueados perguntando do mesmo incidente), com e sem a
+coalescência de perguntas (COALESCER_PERGUNTAS).
+
+Os clientes chegam espalhados em uma janela mais curta que a geração de uma resposta,
+escolhendo entre poucas perguntas (com variações de caixa e espaços). O LLM falso tem
+latência de primeiro token e taxa de tokens configuráveis e conta as gerações iniciadas e o
+pico de gerações simultâneas.
+O cache de respostas é limpo antes de cada cenário, então só a coalescência evita as
+chamadas repetidas. Sync: uma thread por cliente (como o app.py no worker gthread);
+async: uma task por cliente no event loop (como o app_async.py).
+
+Uso: python -m benchmarks.bench_coalescencia [--clientes 50] [--janela 1.0] [--perguntas 1,5,50]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import shutil
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+PALAVRAS = ["impressora", "cupom", "fiscal", "pdv", "bobina", "sat", "rede", "driver", "balança", "teclado"]
+
+
+def preparar(caminho, llm):
+    from langchain_community.vectorstores import FAISS
+    from benchmarks.fakes import EmbeddingsFalsos
+    from chatbot.indice_lexical import construir_e_salvar_indice_lexical
+    from chatbot.indice_mapeado import salvar_docstore_mapeado
+    import chatbot.chatbot as modulo
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    embeddings = EmbeddingsFalsos(dimensao=256)
+    textos = [f"Artigo sobre {PALAVRAS[i % 10]} e {PALAVRAS[(i * 7) % 10]}: procedimento {i} de verificação."
+              for i in range(500)]
+    metadatas = [{'codigo_artigo': str(7000 + i), 'article_title': f'Artigo {i}', 'source_file': f'Artigo_{7000 + i}.pdf'}
+                 for i in range(500)]
+    vectorstore = FAISS.from_texts(textos, embeddings, metadatas=metadatas)
+    vectorstore.save_local(caminho)
+    salvar_docstore_mapeado(vectorstore, caminho)
+    construir_e_salvar_indice_lexical(vectorstore, caminho)
+
+    modulo.CAMINHO_INDICE_PADRAO = caminho
+    modulo.criar_embeddings = lambda modelo: embeddings
+    modulo.ChatGoogleGenerativeAI = lambda **kwargs: llm
+    assert modulo.inicializar_chatbot(), "Falha ao inicializar o chatbot com o índice sintético"
+    return modulo
+
+
+def perguntas_clientes(clientes, distintas, semente=7):
+    """Uma pergunta por cliente, entre `distintas` perguntas base, com variações de caixa e espaços."""
+    aleatorio = random.Random(semente)
+    base = [f"{PALAVRAS[i % 10]} parou de funcionar na loja {i}" for i in range(distintas)]
+    variacoes = [lambda p: p, str.upper, lambda p: p.capitalize() + "?", lambda p: "  " + p.replace(" ", "  ")]
+    return [aleatorio.choice(variacoes)(base[i % distintas]) for i in range(clientes)]
+
+
+def medir_sync(modulo, perguntas, janela):
+    def cliente(i):
+        time.sleep(janela * i / len(perguntas))
+        inicio = time.perf_counter()
+        primeiro_token = None
+        for frame in modulo.get_chatbot_answer_stream(perguntas[i], f"usuario:{i}"):
+            if primeiro_token is None and '"token"' in frame:
+                primeiro_token = time.perf_counter() - inicio
+        return primeiro_token, time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=len(perguntas)) as executor:
+        return list(executor.map(cliente, range(len(perguntas))))
+
+
+async def medir_async(modulo, perguntas, janela):
+    async def cliente(i):
+        await asyncio.sleep(janela * i / len(perguntas))
+        inicio = time.perf_counter()
+        primeiro_token = None
+        async for frame in modulo.get_chatbot_answer_astream(perguntas[i], f"usuario:{i}"):
+            if primeiro_token is None and '"token"' in frame:
+                primeiro_token = time.perf_counter() - inicio
+        return primeiro_token, time.perf_counter() - inicio
+
+    return await asyncio.gather(*(cliente(i) for i in range(len(perguntas))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=50)
+    parser.add_argument('--janela', type=float, default=1.0, help="segundos em que os clientes chegam")
+    parser.add_argument('--perguntas', default='1,5,50', help="perguntas distintas por cenário")
+    parser.add_argument('--latencia', type=float, default=0.8, help="latência do primeiro token do LLM falso")
+    parser.add_argument('--tokens-por-segundo', type=float, default=100.0)
+    args = parser.parse_args()
+
+    from benchmarks.fakes import LLMFalso
+    from chatbot.admissao import ControleAdmissao
+    llm = LLMFalso(resposta=" ".join(["verifique o cabo"] * 25), latencia_primeiro_token=args.latencia,
+                   tokens_por_segundo=args.tokens_por_segundo)
+    temporario = tempfile.mkdtemp(prefix='bench_coalescencia_')
+    try:
+        modulo = preparar(os.path.join(temporario, 'indice'), llm)
+        # Sem limite de admissão: aqui só a coalescência reduz as chamadas (o limite é o bench_admissao)
+        modulo.controle_llm = ControleAdmissao(max_concorrentes=100000, fila_maxima=100000, fila_por_usuario=100000)
+        print(f"{args.clientes} clientes chegando em {args.janela:.1f}s; LLM falso: primeiro token em "
+              f"{args.latencia:.1f}s, {args.tokens_por_segundo:.0f} tokens/s")
+        print(f"{'servidor':<10}{'distintas':>10}{'coalescência':>14}{'requisições':>13}{'chamadas LLM':>14}"
+              f"{'pico LLM':>10}{'TTFT p50':>10}{'TTFT p99':>10}{'total p50':>11}")
+        for servidor in ('sync', 'async'):
+            for distintas in (int(p) for p in args.perguntas.split(',')):
+                perguntas = perguntas_clientes(args.clientes, distintas)
+                for coalescer in (False, True):
+                    modulo.COALESCER_PERGUNTAS = coalescer
+                    modulo.cache_respostas.limpar()
+                    chamadas_antes = llm.chamadas
+                    llm.pico_concorrencia = 0
+                    if servidor == 'sync':
+                        tempos = medir_sync(modulo, perguntas, args.janela)
+                    else:
+                        tempos = asyncio.run(medir_async(modulo, perguntas, args.janela))
+                    ttft = sorted(t[0] for t in tempos)
+                    print(f"{servidor:<10}{distintas:>10}{('sim' if coalescer else 'não'):>14}{len(perguntas):>13}"
+                          f"{llm.chamadas - chamadas_antes:>14}{llm.pico_concorrencia:>10}{statistics.median(ttft):>9.2f}s"
+                          f"{ttft[int(len(ttft) * 0.99)]:>9.2f}s{statistics.median(t[1] for t in tempos):>10.2f}s")
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
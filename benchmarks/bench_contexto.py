@@ -0,0 +1,117 @@
+"""
+Compara o contexto do prompt montado com `format_docs` (os 8 trechos concatenados)
+com a montagem com deduplicação, MMR, k adaptativo e orçamento de tokens.
+Os trechos simulam a recuperação real: chunks de 1000 caracteres com 200 de
+sobreposição, vários do mesmo artigo e cópias do mesmo procedimento em outros códigos.
+
+O tempo até o primeiro token é estimado como montagem + tokens do prompt / taxa de prefill.
+
+Uso: python -m benchmarks.bench_contexto [--consultas 200] [--prefill 4000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chatbot.chatbot import PROMPT_TEMPLATE, format_docs
+from chatbot.montagem_contexto import montar_contexto, estimar_tokens
+
+FRASES = [
+    "Verifique se o cabo USB da impressora {m} está conectado ao PDV.",
+    "Reinicie o serviço de impressão e confirme o status no gerenciador.",
+    "Caso o cupom fiscal não saia, valide a configuração do SAT.",
+    "Abra um chamado para o suporte AERO informando o código do erro {c}.",
+    "Confira se a bobina está instalada corretamente e se há papel.",
+    "Atualize o driver da impressora {m} pela central de software.",
+    "Teste a rede da loja e o acesso ao servidor de retaguarda.",
+    "Se o problema persistir, faça a troca do equipamento pelo fluxo de garantia.",
+]
+
+
+def gerar_artigos(quantidade, aleatorio):
+    artigos = []
+    for i in range(quantidade):
+        modelo = aleatorio.choice(["MP 4200 TH", "Elgin i9", "Bematech 2500", "Epson TM-T20"])
+        texto = " ".join(aleatorio.choice(FRASES).format(m=modelo, c=8000 + i) for _ in range(45))
+        artigos.append((str(7000 + i), f"Falha na impressão da impressora {modelo}", texto))
+    return artigos
+
+
+def gerar_recuperacoes(consultas, aleatorio):
+    """Cada recuperação tem 8 trechos com pontuação decrescente, como o retriever devolve."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    artigos = gerar_artigos(60, aleatorio)
+    chunks_por_artigo = []
+    for codigo, titulo, texto in artigos:
+        metadata = {"article_code": codigo, "article_title": titulo, "source_file": f"Artigo_{codigo}.pdf"}
+        chunks_por_artigo.append([Document(page_content=c, metadata=dict(metadata)) for c in splitter.split_text(texto)])
+
+    recuperacoes = []
+    for _ in range(consultas):
+        principal, secundario, outro = aleatorio.sample(chunks_por_artigo, 3)
+        inicio = aleatorio.randrange(max(1, len(principal) - 3))
+        docs = principal[inicio:inicio + 3] + secundario[:2] + [outro[0]]
+        # Mesmo procedimento publicado sob outro código
+        copia = Document(page_content=principal[inicio].page_content,
+                         metadata={**outro[0].metadata, "article_code": str(aleatorio.randint(9000, 9999))})
+        docs.append(copia)
+        docs.append(aleatorio.choice(aleatorio.choice(chunks_por_artigo)))
+        pontuacao = 1.0
+        selecionados = []
+        for doc in docs:
+            pontuacao -= aleatorio.uniform(0.01, 0.12)
+            selecionados.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "score": pontuacao}))
+        recuperacoes.append(selecionados)
+    return recuperacoes
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--orcamento', type=int, default=1500, help='orçamento de tokens do contexto')
+    parser.add_argument('--prefill', type=float, default=4000.0, help='tokens de prompt processados por segundo')
+    args = parser.parse_args()
+
+    aleatorio = random.Random(0)
+    recuperacoes = gerar_recuperacoes(args.consultas, aleatorio)
+    pergunta = "Falha na impressão da impressora MP 4200 TH"
+
+    resultados = {}
+    for nome, montar in (
+        ("antes (format_docs)", lambda docs: format_docs(docs)),
+        ("depois (montagem)", lambda docs: montar_contexto(docs, pergunta, orcamento_tokens=args.orcamento)[0]),
+    ):
+        tokens_prompt, tempos, ttft = [], [], []
+        for docs in recuperacoes:
+            inicio = time.perf_counter()
+            contexto = montar(docs)
+            prompt = PROMPT_TEMPLATE.format(context=contexto, question=pergunta)
+            decorrido = time.perf_counter() - inicio
+            tokens = estimar_tokens(prompt)
+            tokens_prompt.append(tokens)
+            tempos.append(decorrido * 1000)
+            ttft.append(decorrido * 1000 + tokens / args.prefill * 1000)
+        resultados[nome] = (tokens_prompt, tempos, ttft)
+        print(f"{nome:<22} prompt médio {statistics.mean(tokens_prompt):7.0f} tokens | "
+              f"montagem p50 {percentil(tempos, 0.5):6.2f} ms p99 {percentil(tempos, 0.99):6.2f} ms | "
+              f"TTFT estimado p50 {percentil(ttft, 0.5):6.0f} ms")
+
+    antes = statistics.mean(resultados["antes (format_docs)"][0])
+    depois = statistics.mean(resultados["depois (montagem)"][0])
+    print(f"Tokens de prompt economizados por requisição: {antes - depois:.0f} ({(antes - depois) / antes:.0%})")
+
+
+if __name__ == '__main__':
+    main()
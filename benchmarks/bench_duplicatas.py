@@ -0,0 +1,106 @@
+"""
+Deduplicação de quase iguais (MinHash + LSH, scripts/duplicatas.py) sobre bases sintéticas
+de tamanhos crescentes: tempo por linha (a escala tem de ser linear), memória de pico,
+redução do índice e qualidade dos grupos contra o gabarito.
+
+Os artigos vêm do gerador do bench_embeddings_locais (frases de modelo com as palavras do
+tema, então artigos do mesmo tema já compartilham muito texto). Uma parte deles é
+republicada com outro código e pequenas edições (palavras trocadas, uma frase a mais,
+outro título), como o mesmo procedimento em seções e PDFs diferentes; essas cópias devem
+ser encontradas e nenhum artigo distinto deve ser juntado. O índice a menos é estimado com
+vetores de 768 dimensões em float32 (embedding-001) mais o texto no docstore.
+
+Uso: python -m benchmarks.bench_duplicatas [--linhas 10000,100000] [--copias 0.2]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+from benchmarks.bench_embeddings_locais import gerar_artigos, TEMAS
+
+import duplicatas
+
+BYTES_VETOR = 768 * 4
+
+
+def editar(texto, aleatorio, trocas):
+    """Cópia com `trocas` palavras substituídas e, às vezes, uma frase a mais no fim."""
+    palavras = texto.split()
+    for _ in range(trocas):
+        palavras[aleatorio.randrange(len(palavras))] = aleatorio.choice(TEMAS[aleatorio.choice(list(TEMAS))])
+    if aleatorio.random() < 0.5:
+        palavras += "Atualizado conforme o novo procedimento da franquia.".split()
+    return " ".join(palavras)
+
+
+def gerar_base(linhas, fracao_copias, aleatorio):
+    """DataFrame no formato do base_conhecimento_precisao.csv e o grupo verdadeiro de cada linha."""
+    originais = int(linhas / (1 + fracao_copias * 2))
+    artigos = gerar_artigos(originais, aleatorio)
+    registros, grupos = [], []
+    for grupo, (codigo, titulo, texto, consulta) in enumerate(artigos):
+        # A consulta volta para o texto: aqui o artigo é indexado inteiro
+        texto = f"{texto} {consulta}"
+        registros.append({'codigo_artigo': str(100000 + grupo), 'titulo_artigo': titulo, 'texto_para_busca': texto})
+        grupos.append(grupo)
+        if aleatorio.random() < fracao_copias:
+            for _ in range(aleatorio.randint(1, 3)):
+                registros.append({'codigo_artigo': str(100000 + len(artigos) + len(registros)),
+                                  'titulo_artigo': f"{titulo} (cópia)",
+                                  'texto_para_busca': editar(texto, aleatorio, aleatorio.randint(0, 3))})
+                grupos.append(grupo)
+    ordem = list(range(len(registros)))
+    aleatorio.shuffle(ordem)
+    return pd.DataFrame([registros[i] for i in ordem]), [grupos[i] for i in ordem]
+
+
+def avaliar_grupos(encontrados, verdadeiros):
+    """Precisão e recall dos pares de linhas agrupadas: um par conta se as duas estão no mesmo grupo."""
+    from collections import Counter
+
+    def pares(rotulos):
+        return sum(n * (n - 1) // 2 for n in Counter(rotulos).values())
+
+    juntos = pares(list(zip(encontrados, verdadeiros)))
+    previstos, reais = pares(encontrados), pares(verdadeiros)
+    return juntos / max(previstos, 1), juntos / max(reais, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--linhas', default='10000,100000', help="tamanhos das bases, separados por vírgula")
+    parser.add_argument('--copias', type=float, default=0.2, help="fração dos artigos republicados com outro código")
+    parser.add_argument('--limiar', type=float, default=duplicatas.LIMIAR_PADRAO)
+    args = parser.parse_args()
+
+    print(f"MinHash {duplicatas.PERMUTACOES} hashes em {duplicatas.BANDAS} faixas, shingles de "
+          f"{duplicatas.TAMANHO_SHINGLE} palavras, limiar {args.limiar}")
+    print(f"{'linhas':>9}{'tempo':>9}{'µs/linha':>10}{'pico RSS':>10}{'precisão':>10}{'recall':>8}"
+          f"{'removidas':>11}{'índice antes':>14}{'depois':>10}")
+    for linhas in (int(valor) for valor in args.linhas.split(',')):
+        df, verdadeiros = gerar_base(linhas, args.copias, random.Random(11))
+        inicio = time.perf_counter()
+        resultado, estatisticas = duplicatas.deduplicar_quase_iguais(df, args.limiar)
+        duracao = time.perf_counter() - inicio
+        # Grupo de cada linha: a linha mantida que ficou com o seu código
+        grupo_do_codigo = {}
+        for posicao, linha in enumerate(resultado.itertuples()):
+            for codigo in [linha.codigo_artigo] + [c for c in linha.codigos_alias.split(';') if c]:
+                grupo_do_codigo[codigo] = posicao
+        precisao, recall = avaliar_grupos([grupo_do_codigo[c] for c in df['codigo_artigo']], verdadeiros)
+        antes = estatisticas['linhas_antes'] * BYTES_VETOR + estatisticas['caracteres_antes']
+        depois = estatisticas['linhas_depois'] * BYTES_VETOR + estatisticas['caracteres_depois']
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{len(df):>9}{duracao:>8.1f}s{duracao / len(df) * 1e6:>10.0f}{pico:>8.0f}MB{precisao:>10.3f}"
+              f"{recall:>8.3f}{len(df) - len(resultado):>11}{antes / 1e6:>12.1f}MB{depois / 1e6:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Qualidade e latência da recuperação com os embeddings locais (TF-IDF + SVD, EMBEDDINGS_BACKEND=lsa)
+comparados ao BM25 e, com --google, aos embeddings do Google.
+
+Avaliação por item conhecido: de cada artigo sai uma frase, o restante é indexado e a frase
+retirada é a consulta; o acerto é o próprio artigo. Mede recall@1, recall@5 e MRR@10 nos modos
+vetorial, lexical (BM25) e híbrido (RRF), como o RetrieverHibrido faz no /chat.
+
+O corpus padrão é sintético: artigos agrupados por tema (impressão, TEF, rede...), com as
+palavras do tema e duas palavras próprias de cada artigo espalhadas pelas frases. --csv usa
+uma base real no formato do base_conhecimento_precisao.csv. --google precisa de GOOGLE_API_KEY
+e rede e embeda todo o corpus (uma chamada por lote de textos).
+
+Uso: python -m benchmarks.bench_embeddings_locais [--artigos 3000] [--csv base.csv] [--google]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+TEMAS = {
+    "impressão": ["impressora", "bobina", "cupom", "cabeçote", "papel", "térmica", "spooler", "atolamento",
+                  "guilhotina", "etiqueta"],
+    "tef": ["pinpad", "cartão", "tef", "adquirente", "transação", "estorno", "comprovante", "sitef", "débito",
+            "crédito"],
+    "fiscal": ["sat", "nfce", "sefaz", "xml", "contingência", "certificado", "rejeição", "cfop", "nota", "tributo"],
+    "rede": ["rede", "roteador", "vpn", "ip", "dns", "switch", "cabo", "conexão", "firewall", "latência"],
+    "balança": ["balança", "pesagem", "tara", "calibração", "código", "etiquetadora", "plu", "serial", "carga",
+                "frios"],
+    "estoque": ["estoque", "inventário", "transferência", "recebimento", "divergência", "lote", "validade",
+                "avaria", "coletor", "saldo"],
+    "acesso": ["senha", "usuário", "perfil", "bloqueio", "login", "token", "permissão", "ad", "expirada", "portal"],
+    "pdv": ["pdv", "caixa", "sangria", "abertura", "fechamento", "gaveta", "teclado", "leitor", "monitor",
+            "operador"],
+    "entrega": ["pedido", "entrega", "motorista", "rota", "rastreio", "coleta", "omni", "retirada", "app", "frete"],
+    "cadastro": ["cadastro", "revendedor", "cnpj", "endereço", "franquia", "ativação", "desativação", "grupo",
+                 "associado", "contrato"],
+}
+MODELOS_FRASE = [
+    "Quando o {a} apresenta falha no {b}, verifique o {c} antes de abrir o chamado.",
+    "O analista deve confirmar o {a} e o {b} no sistema da loja.",
+    "Se o {a} continuar sem resposta, reinicie o {b} e teste o {c} novamente.",
+    "Em caso de erro no {a}, registre o {b} e acione o time responsável pelo {c}.",
+    "Oriente a loja a validar o {a} junto com o {b} e o {c}.",
+    "Depois de ajustar o {a}, acompanhe o {b} por alguns minutos.",
+    "Não altere o {a} sem autorização; consulte o {b} e o {c}.",
+]
+
+
+def gerar_artigos(quantidade, aleatorio):
+    """[(codigo, titulo, texto indexado, consulta)]: a consulta é uma frase retirada do artigo."""
+    temas = list(TEMAS)
+    artigos = []
+    for i in range(quantidade):
+        palavras = TEMAS[temas[i % len(temas)]]
+        # Palavras próprias do artigo, que aparecem em quase todas as frases dele
+        proprias = aleatorio.sample(palavras, 2) + [f"e{aleatorio.randrange(100, 999)}"]
+
+        def palavra():
+            sorteio = aleatorio.random()
+            if sorteio < 0.45:
+                return aleatorio.choice(proprias)
+            if sorteio < 0.85:
+                return aleatorio.choice(palavras)
+            return aleatorio.choice(TEMAS[aleatorio.choice(temas)])
+
+        frases = [aleatorio.choice(MODELOS_FRASE).format(a=palavra(), b=palavra(), c=palavra())
+                  for _ in range(aleatorio.randint(6, 12))]
+        titulo = f"CSF {temas[i % len(temas)].capitalize()}: {proprias[0]} e {proprias[1]}"
+        artigos.append((str(7000 + i), titulo, f"Título: {titulo}. " + " ".join(frases[1:]), frases[0]))
+    return artigos
+
+
+def artigos_do_csv(caminho, quantidade, aleatorio):
+    """Mesmo formato de `gerar_artigos` a partir de uma base real; a consulta é uma frase do meio do artigo."""
+    import pandas as pd
+
+    artigos = []
+    for linha in pd.read_csv(caminho).fillna("").itertuples():
+        frases = [frase.strip() for frase in str(linha.texto_para_busca).split(". ") if frase.strip()]
+        longas = [i for i, frase in enumerate(frases) if i > 0 and len(frase.split()) >= 8]
+        if len(frases) < 3 or not longas:
+            continue
+        retirada = aleatorio.choice(longas)
+        texto = ". ".join(frases[:retirada] + frases[retirada + 1:])
+        artigos.append((str(linha.codigo_artigo), str(linha.titulo_artigo), texto, frases[retirada]))
+    aleatorio.shuffle(artigos)
+    return artigos[:quantidade]
+
+
+def avaliar(rankings, esperados):
+    """recall@1, recall@5 e MRR@10 de listas de ids contra o id esperado de cada consulta."""
+    r1 = r5 = mrr = 0.0
+    for ranking, esperado in zip(rankings, esperados):
+        ranking = ranking[:10]
+        if esperado in ranking:
+            posicao = ranking.index(esperado) + 1
+            r1 += posicao == 1
+            r5 += posicao <= 5
+            mrr += 1.0 / posicao
+    n = len(esperados)
+    return r1 / n, r5 / n, mrr / n
+
+
+def percentis_us(tempos):
+    ordenados = sorted(tempos)
+    return (statistics.median(ordenados) * 1e6, ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))] * 1e6)
+
+
+def medir_modelo(nome, embeddings, textos, ids, consultas, esperados, lexical, amostra_latencia):
+    """Indexa os textos com o modelo, avalia os três modos e mede a latência do embedding de consulta."""
+    from langchain_community.vectorstores import FAISS
+    from chatbot.recuperacao import buscar_por_vetores, fusao_rrf
+
+    inicio = time.perf_counter()
+    vetores = embeddings.embed_documents(textos)
+    tempo_indexacao = time.perf_counter() - inicio
+    vectorstore = FAISS.from_embeddings(list(zip(textos, vetores)), embeddings, ids=ids)
+
+    tempos = []
+    for consulta in consultas[:amostra_latencia]:
+        inicio = time.perf_counter()
+        embeddings.embed_query(consulta)
+        tempos.append(time.perf_counter() - inicio)
+    vetores_consultas = embeddings.embed_documents(consultas)
+    vetoriais = [[doc_id for doc_id, _ in pares] for pares in buscar_por_vetores(vectorstore, vetores_consultas, 20)]
+    lexicais = [[doc_id for doc_id, _ in lexical.buscar(consulta, 20)] for consulta in consultas]
+    hibridos = [[doc_id for doc_id, _ in fusao_rrf([v, l])] for v, l in zip(vetoriais, lexicais)]
+    return {
+        "nome": nome,
+        "indexacao_s": tempo_indexacao,
+        "consulta_us": percentis_us(tempos),
+        "vetorial": avaliar(vetoriais, esperados),
+        "hibrido": avaliar(hibridos, esperados),
+    }, lexicais
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--artigos', type=int, default=3000)
+    parser.add_argument('--csv', help="base real no formato do base_conhecimento_precisao.csv")
+    parser.add_argument('--dimensao', type=int, default=256)
+    parser.add_argument('--google', action='store_true', help="compara com os embeddings do Google (rede e chave)")
+    parser.add_argument('--amostra-latencia', type=int, default=500)
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    from chatbot.embeddings_locais import EmbeddingsLSA, NOME_ARQUIVO_LSA, NOME_ARQUIVO_COMPONENTES
+    from chatbot.indice_lexical import IndiceBM25
+
+    aleatorio = random.Random(7)
+    if args.csv:
+        artigos = artigos_do_csv(args.csv, args.artigos, aleatorio)
+    else:
+        artigos = gerar_artigos(args.artigos, aleatorio)
+    ids = [codigo for codigo, _, _, _ in artigos]
+    textos = [texto for _, _, texto, _ in artigos]
+    consultas = [consulta for _, _, _, consulta in artigos]
+
+    inicio = time.perf_counter()
+    lsa = EmbeddingsLSA.ajustar(textos, dimensao=args.dimensao)
+    tempo_ajuste = time.perf_counter() - inicio
+    temporario = tempfile.mkdtemp(prefix='bench_lsa_')
+    try:
+        lsa.salvar(temporario)
+        tamanho = sum(os.path.getsize(os.path.join(temporario, nome))
+                      for nome in (NOME_ARQUIVO_LSA, NOME_ARQUIVO_COMPONENTES))
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+    lexical = IndiceBM25.construir(ids, textos)
+    resultados = []
+    resultado, lexicais = medir_modelo("lsa", lsa, textos, ids, consultas, ids, lexical, args.amostra_latencia)
+    resultados.append(resultado)
+    if args.google:
+        os.environ['EMBEDDINGS_CACHE_DB'] = ''
+        from chatbot.embeddings_cache import criar_embeddings
+        resultados.append(medir_modelo("google", criar_embeddings(), textos, ids, consultas, ids, lexical,
+                                       min(args.amostra_latencia, 50))[0])
+
+    print(f"{len(artigos)} artigos ({'CSV ' + args.csv if args.csv else 'sintéticos'}), uma consulta por artigo")
+    print(f"LSA: {len(lsa.vocabulario)} termos x {lsa.dimensao} dimensões, ajuste em {tempo_ajuste:.2f}s, "
+          f"{tamanho / 1e6:.1f} MB no índice")
+    print(f"{'recuperação':<22}{'recall@1':>10}{'recall@5':>10}{'MRR@10':>9}{'indexação':>11}"
+          f"{'consulta p50':>14}{'p99':>11}")
+    print(f"{'bm25':<22}" + "".join(f"{valor:>10.3f}" for valor in avaliar(lexicais, ids)[:2])
+          + f"{avaliar(lexicais, ids)[2]:>9.3f}")
+    for resultado in resultados:
+        p50, p99 = resultado["consulta_us"]
+        for modo in ("vetorial", "hibrido"):
+            r1, r5, mrr = resultado[modo]
+            print(f"{resultado['nome'] + ' ' + modo:<22}{r1:>10.3f}{r5:>10.3f}{mrr:>9.3f}"
+                  f"{resultado['indexacao_s']:>10.2f}s{p50:>12.0f}µs{p99:>9.0f}µs")
+
+
+if __name__ == '__main__':
+    main()
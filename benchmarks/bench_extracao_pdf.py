@@ -0,0 +1,91 @@
+"""
+Compara a extração serial dos PDFs (documento inteiro em uma string) com a
+extração paralela por faixas de páginas em streaming, usando os PDFs de
+chatbot/documentos. Confere se os artigos gerados são os mesmos.
+
+Uso: python -m benchmarks.bench_extracao_pdf [--workers 4]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+import processar_documentos_pypdf as pdfs
+
+PASTA_DOCUMENTOS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'chatbot', 'documentos'))
+
+
+def extrair_serial(arquivos_pdf, max_paginas):
+    """Fluxo original: texto completo de cada PDF montado com +=, depois a segmentação."""
+    artigos = []
+    for pdf_path in arquivos_pdf:
+        reader = PdfReader(pdf_path)
+        texto_completo = ""
+        for page_num, page in enumerate(reader.pages[:max_paginas]):
+            texto_pagina = page.extract_text()
+            if texto_pagina.strip():
+                texto_completo += f"\n--- PÁGINA {page_num + 1} ---\n"
+                texto_completo += texto_pagina
+        artigos.extend(pdfs.estruturar_artigos_salesforce(texto_completo, pdf_path))
+    return artigos
+
+
+def extrair_paralelo(arquivos_pdf, max_paginas, workers):
+    artigos = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        paginas = pdfs.iterar_paginas_paralelo(arquivos_pdf, executor, paginas_por_tarefa=max(1, min(
+            pdfs.PAGINAS_POR_TAREFA, (max_paginas or pdfs.PAGINAS_POR_TAREFA) // workers)), max_paginas=max_paginas)
+        for pdf_path, texto_pagina in paginas:
+            artigos.extend(pdfs.estruturar_artigos_stream([texto_pagina], pdf_path))
+    return artigos
+
+
+def medir(medir_memoria, funcao, *args):
+    if medir_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    decorrido = time.perf_counter() - inicio
+    pico = 0
+    if medir_memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return resultado, decorrido, pico
+
+
+def formatar_memoria(pico):
+    return f"{pico / 1e6:6.1f} MB" if pico else "   n/d"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--max-paginas', type=int, default=None, help='limita as páginas lidas de cada PDF')
+    parser.add_argument('--memoria', action='store_true',
+                        help='mede o pico de memória do processo principal (tracemalloc deixa a extração mais lenta)')
+    args = parser.parse_args()
+
+    arquivos_pdf = sorted(os.path.join(PASTA_DOCUMENTOS, f) for f in os.listdir(PASTA_DOCUMENTOS)
+                          if f.lower().endswith('.pdf'))
+    print(f"{len(arquivos_pdf)} PDFs em {PASTA_DOCUMENTOS}")
+
+    serial, tempo_serial, pico_serial = medir(args.memoria, extrair_serial, arquivos_pdf, args.max_paginas)
+    print(f"Antes  (serial):       {tempo_serial:7.2f}s, pico de memória {formatar_memoria(pico_serial)}, "
+          f"{len(serial)} artigos")
+
+    for workers in sorted({1, 2, args.workers}):
+        paralelo, tempo, pico = medir(args.memoria, extrair_paralelo, arquivos_pdf, args.max_paginas, workers)
+        print(f"Depois ({workers:2d} processos): {tempo:7.2f}s, pico de memória {formatar_memoria(pico)}, "
+              f"{len(paralelo)} artigos, {tempo_serial / tempo:.2f}x")
+        if paralelo != serial:
+            print("  ATENÇÃO: os artigos extraídos diferem do fluxo serial!")
+
+
+if __name__ == '__main__':
+    main()
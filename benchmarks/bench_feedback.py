@@ -0,0 +1,160 @@
+"""
+Vazão do POST /feedback com a gravação antiga (uma linha no feedback.csv por requisição,
+abrindo e fechando o arquivo) e com o gravador em lotes no SQLite (feedback.py).
+
+Duas medições por modo:
+- chamada direta: N threads chamando a função de gravação, sem HTTP (custo do armazenamento)
+- HTTP: app.py em um servidor WSGI com threads e um cliente com C conexões simultâneas
+
+As respostas enviadas são as do feedback.csv do repositório (alguns KB cada, repetidas),
+como acontece em produção. Tudo é gravado em um diretório temporário.
+
+Uso: python -m benchmarks.bench_feedback [--requisicoes 2000] [--concorrencia 1,8,32]
+"""
+import os
+import sys
+import csv
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DIRETORIO_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app'))
+sys.path.insert(0, DIRETORIO_APP)
+
+TEMPORARIO = tempfile.mkdtemp(prefix='bench_feedback_')
+os.environ['FEEDBACK_DB'] = os.path.join(TEMPORARIO, 'feedback.sqlite3')
+# Sem índice: o app sobe e o /chat fica indisponível, o que não afeta o /feedback
+os.environ['CAMINHO_INDICE'] = os.path.join(TEMPORARIO, 'sem_indice')
+
+import httpx
+from werkzeug.serving import make_server
+
+import feedback
+
+
+def respostas_exemplo():
+    with open(os.path.join(DIRETORIO_APP, 'feedback.csv'), newline='', encoding='utf-8') as f:
+        return [linha["Answer"] for linha in csv.DictReader(f)]
+
+
+def criar_gravador_csv(caminho_csv):
+    """A gravação anterior: abre o CSV, confere o cabeçalho e escreve uma linha por requisição."""
+    def gravar(question, answer, feedback_type):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        file_exists = os.path.isfile(caminho_csv)
+        with open(caminho_csv, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(["Timestamp", "Question", "Answer", "Feedback"])
+            writer.writerow([timestamp, question, answer, feedback_type])
+    return gravar
+
+
+def preparar(modo, rodada):
+    """Retorna (gravar, finalizar, tamanho_em_disco, linhas_gravadas) para um armazenamento vazio."""
+    if modo == 'csv':
+        caminho = os.path.join(TEMPORARIO, f'feedback_{rodada}.csv')
+        gravar = criar_gravador_csv(caminho)
+
+        def linhas():
+            with open(caminho, newline='', encoding='utf-8') as f:
+                return sum(1 for _ in csv.reader(f)) - 1
+        return gravar, lambda: None, lambda: os.path.getsize(caminho), linhas
+
+    caminho = os.path.join(TEMPORARIO, f'feedback_{rodada}.sqlite3')
+    gravador = feedback.GravadorFeedback(caminho_db=caminho)
+
+    def tamanho():
+        return sum(os.path.getsize(caminho + sufixo) for sufixo in ('', '-wal') if os.path.exists(caminho + sufixo))
+
+    def linhas():
+        conexao = feedback._conectar(caminho)
+        try:
+            return conexao.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+        finally:
+            conexao.close()
+    return gravador.registrar, gravador.descarregar, tamanho, linhas
+
+
+def medir_direto(gravar, finalizar, requisicoes, concorrencia, respostas):
+    def uma(i):
+        gravar(f"pergunta {i}", respostas[i % len(respostas)], "positive" if i % 3 else "negative")
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(uma, range(requisicoes)))
+    respondido = time.perf_counter() - inicio
+    finalizar()
+    return requisicoes / respondido, time.perf_counter() - inicio
+
+
+async def carga_http(url, requisicoes, concorrencia, respostas):
+    latencias = []
+    proxima = iter(range(requisicoes))
+    limites = httpx.Limits(max_connections=concorrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=60) as cliente:
+        async def trabalhador():
+            for i in proxima:
+                inicio = time.perf_counter()
+                resposta = await cliente.post(url, json={
+                    "question": f"pergunta {i}", "answer": respostas[i % len(respostas)],
+                    "feedback": "positive" if i % 3 else "negative"})
+                resposta.raise_for_status()
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+        duracao = time.perf_counter() - inicio
+    latencias.sort()
+    return requisicoes / duracao, statistics.median(latencias), latencias[int(len(latencias) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--concorrencia', default='1,8,32')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    respostas = respostas_exemplo()
+    niveis = [int(c) for c in args.concorrencia.split(',')]
+
+    import app as app_sync
+    servidor = make_server('127.0.0.1', 5311, app_sync.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        print(f"{args.requisicoes} feedbacks por medição, respostas de ~"
+              f"{statistics.mean(len(r) for r in respostas) / 1024:.1f} KB ({len(respostas)} distintas)")
+        print(f"{'modo':<8}{'via':<8}{'conc.':>6}{'POSTs/s':>10}{'p50':>9}{'p99':>9}"
+              f"{'em disco':>10}{'linhas':>8}{'até gravar':>12}")
+        rodada = 0
+        for modo in ('csv', 'sqlite'):
+            for concorrencia in niveis:
+                rodada += 1
+                gravar, finalizar, tamanho, linhas = preparar(modo, rodada)
+                vazao, total = medir_direto(gravar, finalizar, args.requisicoes, concorrencia, respostas)
+                print(f"{modo:<8}{'direto':<8}{concorrencia:>6}{vazao:>10.0f}{'':>9}{'':>9}"
+                      f"{tamanho() / 2**20:>8.1f}MB{linhas():>8}{total:>11.2f}s")
+
+                rodada += 1
+                gravar, finalizar, tamanho, linhas = preparar(modo, rodada)
+                app_sync.gravar_feedback = gravar
+                inicio = time.perf_counter()
+                vazao, p50, p99 = asyncio.run(carga_http('http://127.0.0.1:5311/feedback', args.requisicoes,
+                                                         concorrencia, respostas))
+                finalizar()
+                print(f"{modo:<8}{'http':<8}{concorrencia:>6}{vazao:>10.0f}{p50 * 1000:>7.1f}ms{p99 * 1000:>7.1f}ms"
+                      f"{tamanho() / 2**20:>8.1f}MB{linhas():>8}{time.perf_counter() - inicio:>11.2f}s")
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(TEMPORARIO, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
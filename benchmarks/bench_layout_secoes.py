@@ -0,0 +1,135 @@
+"""
+Layout "secoes" (seções pequenas ligadas ao artigo, INDICE_LAYOUT=secoes) contra o layout
+"artigo" (um vetor por artigo inteiro) do criar_indice_estruturado.py.
+
+Os artigos sintéticos têm de 4 a 12 seções numeradas ("2.1", "2.2"...), cada uma sobre um
+tema diferente e com um código de erro próprio (compartilhado por poucas seções da base),
+como os artigos longos da base. A consulta é uma frase retirada de uma
+seção; o acerto é o artigo, e a precisão é a seção certa estar no contexto montado para o
+prompt. Os dois índices são construídos pelo script de criação com os embeddings locais
+(EMBEDDINGS_BACKEND=lsa), sem rede, e consultados pelo RetrieverHibrido com k=8.
+
+Uso: python -m benchmarks.bench_layout_secoes [--artigos 1500] [--consultas 1000]
+"""
+import os
+import sys
+import io
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import contextlib
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+import pandas as pd
+
+from benchmarks.bench_embeddings_locais import TEMAS, MODELOS_FRASE
+
+
+def gerar_base(quantidade, aleatorio):
+    """Linhas do CSV e consultas [(pergunta, código do artigo, início do resto da seção)]."""
+    temas = list(TEMAS)
+    linhas, consultas = [], []
+    for i in range(quantidade):
+        codigo = str(7000 + i)
+        secoes = []
+        for numero in range(1, aleatorio.randint(4, 12) + 1):
+            palavras = TEMAS[aleatorio.choice(temas)]
+            proprias = aleatorio.sample(palavras, 2) + [f"erro e{aleatorio.randrange(quantidade * 2)}"]
+
+            def palavra():
+                return aleatorio.choice(proprias) if aleatorio.random() < 0.5 else aleatorio.choice(palavras)
+
+            frases = [aleatorio.choice(MODELOS_FRASE).format(a=palavra(), b=palavra(), c=palavra())
+                      for _ in range(aleatorio.randint(3, 6))]
+            secoes.append((f"2.{numero} {proprias[0].capitalize()} e {proprias[1]}.", frases))
+        # Uma frase de uma das seções vira a consulta e sai do artigo
+        alvo = aleatorio.randrange(len(secoes))
+        cabecalho, frases = secoes[alvo]
+        consulta = frases.pop(aleatorio.randrange(len(frases)))
+        consultas.append((consulta, codigo, f"{cabecalho} {frases[0]}"))
+        titulo = f"CSF Procedimentos {i}"
+        texto = f"Título: {titulo}. " + " ".join(f"{cabecalho} {' '.join(frases)}" for cabecalho, frases in secoes)
+        linhas.append({'codigo_artigo': codigo, 'titulo_artigo': titulo, 'texto_para_busca': texto})
+    return linhas, consultas
+
+
+def construir(diretorio, layout):
+    import criar_indice_estruturado as construcao
+    from chatbot.versoes_indice import versao_atual
+
+    os.environ['INDICE_LAYOUT'] = layout
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) as saida:
+        construcao.criar_e_salvar_indice_estruturado(reconstruir_tudo=True, diretorio=diretorio)
+    caminho = versao_atual(os.path.join(diretorio, 'faiss_index_estruturado'))[1]
+    if caminho is None or 'SUCESSO' not in saida.getvalue():
+        raise RuntimeError("A construção do índice falhou:\n" + saida.getvalue())
+    return caminho, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--artigos', type=int, default=1500)
+    parser.add_argument('--consultas', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=8)
+    parser.add_argument('--secoes-por-pai', type=int, default=3)
+    parser.add_argument('--modo', default='hibrido', choices=('hibrido', 'vetorial', 'lexical'))
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+    os.environ['EMBEDDINGS_BACKEND'] = 'lsa'
+
+    from chatbot.chatbot import _carregar_indice
+    from chatbot.documentos_pais import NOME_ARQUIVO_PAIS
+    from chatbot.montagem_contexto import criar_montador_contexto
+    from chatbot.recuperacao import RetrieverHibrido
+
+    aleatorio = random.Random(3)
+    linhas, consultas = gerar_base(args.artigos, aleatorio)
+    consultas = aleatorio.sample(consultas, min(args.consultas, len(consultas)))
+    montar = criar_montador_contexto()
+    temporario = tempfile.mkdtemp(prefix='bench_secoes_')
+    print(f"{len(linhas)} artigos sintéticos com 4 a 12 seções, {len(consultas)} consultas, k={args.k}, "
+          f"busca {args.modo}")
+    print(f"{'layout':<10}{'vetores':>9}{'construção':>12}{'artigo@1':>10}{'artigo@k':>10}{'seção no prompt':>17}"
+          f"{'tokens':>8}{'p50':>9}{'p99':>9}")
+    try:
+        pd.DataFrame(linhas).to_csv(os.path.join(temporario, 'base_conhecimento_precisao.csv'), index=False)
+        for layout in ("artigo", "secoes"):
+            caminho, duracao = construir(temporario, layout)
+            indice = _carregar_indice(caminho, None)
+            retriever = RetrieverHibrido(vectorstore=indice["vectorstore"], indice_lexical=indice["lexical"],
+                                         k=args.k, k_candidatos=max(20, args.k * args.secoes_por_pai),
+                                         modo=args.modo, pais=indice["pais"], secoes_por_pai=args.secoes_por_pai)
+            retriever.invoke(consultas[0][0])
+            primeiro = acertos = secao_no_prompt = tokens = 0
+            tempos = []
+            for pergunta, codigo, secao in consultas:
+                inicio = time.perf_counter()
+                documentos = retriever.invoke(pergunta)
+                tempos.append(time.perf_counter() - inicio)
+                codigos = [documento.metadata["codigo_artigo"] for documento in documentos]
+                primeiro += bool(codigos) and codigos[0] == codigo
+                acertos += codigo in codigos
+                contexto, estatisticas = montar(documentos, pergunta)
+                secao_no_prompt += secao in contexto
+                tokens += estatisticas["tokens_usados"]
+            ordenados = sorted(tempos)
+            n = len(consultas)
+            vetores = len(indice["vectorstore"].index_to_docstore_id)
+            print(f"{layout:<10}{vetores:>9}{duracao:>11.1f}s{primeiro / n:>10.3f}{acertos / n:>10.3f}"
+                  f"{secao_no_prompt / n:>17.3f}{tokens / n:>8.0f}{statistics.median(ordenados) * 1000:>7.2f}ms"
+                  f"{ordenados[int(n * 0.99)] * 1000:>7.2f}ms")
+            if indice["pais"] is not None:
+                tamanho = os.path.getsize(os.path.join(caminho, NOME_ARQUIVO_PAIS))
+                print(f"{'':<10}mapa seção -> artigo: {tamanho / 1024:.0f} KB ({tamanho / vetores:.0f} bytes por seção)")
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
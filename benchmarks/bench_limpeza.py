@@ -0,0 +1,92 @@
+"""
+Benchmark de throughput (linhas/s) da limpeza de HTML em scripts/limpar_dados.py
+sobre uma exportação sintética. Compara o fluxo antigo (iterrows + html.parser,
+tudo em memória) com o modo streaming em blocos, com e sem pool de processos.
+
+Uso: python -m benchmarks.bench_limpeza [--linhas 100000] [--workers 4]
+"""
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+import limpar_dados
+
+
+def gerar_exportacao(caminho, linhas, semente=0):
+    """Gera um CSV no formato da exportação do Salesforce, com o HTML na coluna '3'."""
+    aleatorio = random.Random(semente)
+    palavras = ["impressora", "MP 4200 TH", "PDV", "sistema", "falha", "configuração", "rede",
+                "franquia", "cupom", "fiscal", "driver", "reiniciar", "cabo", "USB", "SAT"]
+    with open(caminho, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['0', '1', '2', '3'])
+        for i in range(linhas):
+            paragrafos = "".join(
+                f"<p>{' '.join(aleatorio.choices(palavras, k=25))}</p>" for _ in range(aleatorio.randint(3, 8))
+            )
+            html = f"<h2>{7000 + i} - Como resolver {aleatorio.choice(palavras)}</h2>{paragrafos}"
+            writer.writerow([f"id{i}", "Artigo", "Publicado", html])
+
+
+def limpar_fluxo_antigo(caminho_entrada, caminho_saida):
+    """Reprodução do fluxo original: DataFrame inteiro, iterrows e html.parser."""
+    df = pd.read_csv(caminho_entrada, dtype={'0': str, '3': str})
+    resultados = []
+    for _, row in df.iterrows():
+        html_content = limpar_dados.encontrar_html(row.get('3'), row.get('0'))
+        if not html_content:
+            continue
+        resultados.append(limpar_dados.extrair_registro(html_content, 'html.parser'))
+    pd.DataFrame(resultados).to_csv(caminho_saida, index=False, encoding='utf-8-sig')
+    return len(resultados)
+
+
+def medir(nome, funcao, linhas, medir_memoria):
+    if medir_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    total = funcao()
+    decorrido = time.perf_counter() - inicio
+    memoria = ""
+    if medir_memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memoria = f"  pico {pico / 1e6:7.1f} MB"
+    print(f"{nome:<38} {decorrido:8.1f}s {linhas / decorrido:10.0f} linhas/s{memoria}  ({total} linhas)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tamanho-chunk', type=int, default=5000)
+    parser.add_argument('--memoria', action='store_true',
+                        help='mede o pico de memória do processo principal (tracemalloc deixa tudo mais lento)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        entrada = os.path.join(pasta, 'base_conhecimento.csv')
+        saida = os.path.join(pasta, 'base_conhecimento_limpa.csv')
+        gerar_exportacao(entrada, args.linhas)
+        print(f"Exportação sintética: {args.linhas} linhas, {os.path.getsize(entrada) / 1e6:.1f} MB")
+
+        medir("antigo (iterrows, html.parser)", lambda: limpar_fluxo_antigo(entrada, saida), args.linhas, args.memoria)
+        parsers = ['html.parser'] + (['lxml'] if limpar_dados.escolher_parser() == 'lxml' else [])
+        for nome_parser in parsers:
+            for workers in sorted({1, args.workers}):
+                medir(f"streaming ({nome_parser}, {workers} proc.)",
+                      lambda: limpar_dados.limpar_csv_streaming(entrada, saida, args.tamanho_chunk, workers, nome_parser),
+                      args.linhas, args.memoria)
+
+
+if __name__ == '__main__':
+    main()
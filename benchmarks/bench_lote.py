@@ -0,0 +1,102 @@
+"""
+Perguntas por minuto do POST /chat/batch contra o /chat chamado uma pergunta por vez,
+como o QA repassa hoje as perguntas dos analistas depois de cada atualização da base.
+
+Os embeddings falsos cobram uma latência por chamada à API (--latencia-embedding) e um
+pouco por texto; o LLM falso tem latência até o primeiro token e taxa de tokens. O cache
+de respostas é limpo antes de cada cenário e todas as perguntas são distintas.
+
+- sequencial: get_chatbot_answer_stream até o último frame, uma pergunta depois da outra
+  (o /chat de um cliente sem paralelismo); medido em `--sequenciais` perguntas
+- lote: responder_lote + linhas_ndjson (o /chat/batch) com 1, 4 e 8 gerações simultâneas
+
+Uso: python -m benchmarks.bench_lote [--perguntas 100] [--sequenciais 20] [--latencia 0.8]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from benchmarks.bench_coalescencia import preparar, PALAVRAS
+
+
+def gerar_perguntas(quantidade):
+    return [f"{PALAVRAS[i % 10]} {PALAVRAS[(i * 3 + 1) % 10]} com erro {i} na loja" for i in range(quantidade)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--perguntas', type=int, default=100)
+    parser.add_argument('--sequenciais', type=int, default=20)
+    parser.add_argument('--latencia', type=float, default=0.8, help="latência até o primeiro token do LLM (s)")
+    parser.add_argument('--tokens-por-segundo', type=float, default=100.0)
+    parser.add_argument('--latencia-embedding', type=float, default=0.15, help="latência de uma chamada à API (s)")
+    parser.add_argument('--workers', default='1,4,8')
+    args = parser.parse_args()
+
+    from benchmarks.fakes import LLMFalso
+    from chatbot.embeddings_cache import EmbeddingsComCache
+    from chatbot.lote import linhas_ndjson
+    logging.getLogger('langchain_core').setLevel(logging.ERROR)
+    llm = LLMFalso(resposta=" ".join(["verifique o cabo"] * 15), latencia_primeiro_token=args.latencia,
+                   tokens_por_segundo=args.tokens_por_segundo)
+    temporario = tempfile.mkdtemp(prefix='bench_lote_')
+    os.environ.setdefault('GOOGLE_API_KEY', 'chave-falsa')
+    try:
+        modulo = preparar(os.path.join(temporario, 'indice'), llm)
+        vectorstore = modulo.indice_ativo["vectorstore"]
+        # Como em produção: o cache de embeddings (sem disco) envolve o modelo da API
+        falsos = vectorstore.embedding_function
+        vectorstore.embedding_function = EmbeddingsComCache(falsos, "falso", None)
+        falsos.latencia_chamada, falsos.latencia_documento = args.latencia_embedding, 0.002
+        modulo.COALESCER_PERGUNTAS = False
+
+        print(f"LLM falso: primeiro token em {args.latencia:.2f}s, {len(llm._tokens())} tokens a "
+              f"{args.tokens_por_segundo:.0f}/s; embedding: {args.latencia_embedding * 1000:.0f} ms por chamada")
+        print(f"{'cenário':<26}{'perguntas':>10}{'duração':>10}{'perg./min':>11}{'chamadas emb.':>15}"
+              f"{'gerações':>10}{'primeira':>10}{'erros':>7}")
+
+        def imprimir(nome, quantidade, duracao, chamadas, geracoes, primeira, erros):
+            print(f"{nome:<26}{quantidade:>10}{duracao:>9.1f}s{quantidade / duracao * 60:>11.1f}{chamadas:>15}"
+                  f"{geracoes:>10}{primeira:>9.2f}s{erros:>7}")
+
+        sequenciais = gerar_perguntas(args.sequenciais)
+        modulo.cache_respostas.limpar()
+        chamadas, geracoes = falsos.chamadas, llm.chamadas
+        inicio, primeira, erros = time.perf_counter(), None, 0
+        for pergunta in sequenciais:
+            for frame in modulo.get_chatbot_answer_stream(pergunta):
+                erros += '"error"' in frame
+            primeira = primeira or time.perf_counter() - inicio
+        imprimir("/chat sequencial", len(sequenciais), time.perf_counter() - inicio,
+                 falsos.chamadas - chamadas, llm.chamadas - geracoes, primeira, erros)
+
+        for workers in (int(w) for w in args.workers.split(',')):
+            # Perguntas novas a cada cenário, para não reaproveitar os embeddings do anterior
+            perguntas = [f"{pergunta} (lote {workers})" for pergunta in gerar_perguntas(args.perguntas)]
+            modulo.cache_respostas.limpar()
+            chamadas, geracoes = falsos.chamadas, llm.chamadas
+            inicio, primeira, erros, resumo = time.perf_counter(), None, 0, None
+            resultados = modulo.responder_lote(perguntas, "lote:bench", workers)
+            for linha in linhas_ndjson(resultados, [None] * len(perguntas)):
+                dados = json.loads(linha)
+                if "resumo" in dados:
+                    resumo = dados["resumo"]
+                    continue
+                primeira = primeira or time.perf_counter() - inicio
+                erros += "error" in dados
+            assert resumo["respondidas"] + resumo["erros"] == len(perguntas)
+            imprimir(f"/chat/batch, {workers} worker(s)", len(perguntas), time.perf_counter() - inicio,
+                     falsos.chamadas - chamadas, llm.chamadas - geracoes, primeira, erros)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Mede a memória por worker com 1, 4 e 8 workers em quatro modos de carga do índice:
+
+- pickle: cada worker chama `FAISS.load_local` (comportamento sem preload)
+- mmap: cada worker abre o formato mapeado; as páginas vêm do mesmo page cache
+- pickle+preload: o master carrega o pickle e os workers herdam por fork
+- mmap+preload: o master carrega o formato mapeado (`chatbot.indice_mapeado`) e os workers herdam
+
+Os workers são criados com os.fork, como o gunicorn faz, e cada um executa buscas
+(FAISS + docstore) antes de medir RSS, PSS (memória compartilhada dividida entre os
+processos) e memória privada a partir de /proc/<pid>/smaps_rollup (Linux).
+O PSS total soma o master e os workers.
+
+Uso: python -m benchmarks.bench_memoria_workers [--documentos 20000] [--dimensao 768] [--buscas 200]
+"""
+import os
+import sys
+import gc
+import logging
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from langchain_community.vectorstores import FAISS
+
+from chatbot.indice_mapeado import carregar_vectorstore, salvar_docstore_mapeado
+
+
+def memoria(pid='self'):
+    """(RSS, PSS, privada) em MB."""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) >= 2 and partes[0].endswith(':') and partes[1].isdigit():
+                valores[partes[0][:-1]] = int(partes[1]) / 1024
+    privada = valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0)
+    return valores.get('Rss', 0), valores.get('Pss', 0), privada
+
+
+def construir_indice(caminho, documentos, dimensao, aleatorio):
+    frases = ["Verifique o cabo da impressora {m}.", "Reinicie o serviço de impressão do PDV.",
+              "Abra um chamado informando o erro {c}.", "Confira a bobina e o papel.",
+              "Atualize o driver pela central de software."]
+    textos = [" ".join(random.Random(i).choice(frases).format(m=i % 50, c=8000 + i) for _ in range(40))
+              for i in range(documentos)]
+    vetores = aleatorio.standard_normal((documentos, dimensao)).astype(np.float32)
+    metadatas = [{'codigo_artigo': str(7000 + i), 'titulo_artigo': f'Artigo {i}', 'source_file': f'Artigo_{7000 + i}.pdf'}
+                 for i in range(documentos)]
+    vectorstore = FAISS.from_embeddings(zip(textos, vetores), None, metadatas=metadatas,
+                                        ids=[str(7000 + i) for i in range(documentos)])
+    vectorstore.save_local(caminho)
+    salvar_docstore_mapeado(vectorstore, caminho)
+
+
+def carregar(caminho, modo):
+    if modo.startswith('mmap'):
+        return carregar_vectorstore(caminho, None)
+    return FAISS.load_local(caminho, None, allow_dangerous_deserialization=True)
+
+
+def trabalhar(vectorstore, buscas, dimensao):
+    aleatorio = np.random.default_rng(os.getpid())
+    for _ in range(buscas):
+        _, posicoes = vectorstore.index.search(aleatorio.standard_normal((1, dimensao)).astype(np.float32), 8)
+        for posicao in posicoes[0]:
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(posicao)])
+
+
+def rodar(caminho, modo, workers, buscas, dimensao):
+    """Cria os workers por fork e retorna a memória medida em cada um."""
+    vectorstore = carregar(caminho, modo) if modo.endswith('preload') else None
+    if vectorstore is not None:
+        gc.freeze()
+    filhos = []
+    leitura, escrita = os.pipe()
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(leitura)
+            local = vectorstore if vectorstore is not None else carregar(caminho, modo)
+            trabalhar(local, buscas, dimensao)
+            gc.collect()
+            os.write(escrita, b'.')
+            time.sleep(3600)
+            os._exit(0)
+        filhos.append(pid)
+    os.close(escrita)
+    # Espera todos os workers terminarem as buscas antes de medir, para contar o compartilhamento real
+    prontos = 0
+    while prontos < workers:
+        prontos += len(os.read(leitura, workers))
+    os.close(leitura)
+    medidas = [memoria(pid) for pid in filhos]
+    master = memoria()
+    for pid in filhos:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+    if vectorstore is not None:
+        gc.unfreeze()
+    return medidas, master
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documentos', type=int, default=20000)
+    parser.add_argument('--dimensao', type=int, default=768)
+    parser.add_argument('--buscas', type=int, default=200)
+    parser.add_argument('--workers', default='1,4,8')
+    args = parser.parse_args()
+    # O benchmark não gera embeddings de consulta; silencia o aviso de embedding_function=None
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    caminho = tempfile.mkdtemp(prefix='bench_memoria_')
+    try:
+        construir_indice(caminho, args.documentos, args.dimensao, np.random.default_rng(42))
+        tamanhos = {nome: os.path.getsize(os.path.join(caminho, nome)) / 1024 / 1024 for nome in os.listdir(caminho)}
+        print(f"Índice: {args.documentos} documentos x {args.dimensao} dimensões | " +
+              ", ".join(f"{nome} {mb:.1f} MB" for nome, mb in sorted(tamanhos.items())))
+        print(f"{'modo':<16}{'workers':>8}{'RSS/worker':>12}{'PSS/worker':>12}{'privada/worker':>16}{'PSS total':>11}")
+        for modo in ('pickle', 'pickle+preload', 'mmap', 'mmap+preload'):
+            for workers in [int(w) for w in args.workers.split(',')]:
+                medidas, master = rodar(caminho, modo, workers, args.buscas, args.dimensao)
+                rss, pss, privada = (sum(m[i] for m in medidas) / workers for i in range(3))
+                print(f"{modo:<16}{workers:>8}{rss:>10.1f}MB{pss:>10.1f}MB{privada:>14.1f}MB"
+                      f"{master[1] + sum(m[1] for m in medidas):>9.1f}MB")
+    finally:
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
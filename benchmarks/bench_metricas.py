@@ -0,0 +1,153 @@
+"""
+Custo das métricas Prometheus por requisição do /chat.
+
+Cada modo roda em um subprocesso, porque o prometheus_client escolhe o armazenamento
+no import:
+- desativadas: METRICAS_PROMETHEUS=0 (as métricas viram operações vazias)
+- processo: registro em memória do processo (um worker)
+- multiprocesso: PROMETHEUS_MULTIPROC_DIR, valores em arquivos mapeados (vários workers)
+
+Em cada modo, o get_chatbot_answer_stream inteiro roda sobre um índice sintético com o
+LLM falso respondendo sem latência. Como a diferença entre os modos fica perto do ruído
+de uma requisição inteira, as chamadas de instrumentação de uma requisição (MedicaoStream
+com 200 frames e as observações das etapas) também são medidas isoladamente, em laço.
+O custo de gerar o /metrics também é medido.
+
+Uso: python -m benchmarks.bench_metricas [--documentos 2000] [--requisicoes 300] [--rodadas 3]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+MODOS = ('desativadas', 'processo', 'multiprocesso')
+PALAVRAS = ["impressora", "cupom", "fiscal", "pdv", "bobina", "sat", "rede", "driver", "balança", "teclado"]
+
+
+def medir_modo(args):
+    """Roda dentro do subprocesso: mede o stream completo e a geração do /metrics."""
+    from langchain_community.vectorstores import FAISS
+    from benchmarks.fakes import EmbeddingsFalsos, LLMFalso
+    from chatbot.indice_lexical import construir_e_salvar_indice_lexical
+    from chatbot.indice_mapeado import salvar_docstore_mapeado
+    import chatbot.chatbot as modulo
+    from chatbot import metricas
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    embeddings = EmbeddingsFalsos(dimensao=256)
+    textos = [f"Artigo sobre {PALAVRAS[i % 10]} e {PALAVRAS[(i * 7) % 10]}: procedimento {i} de verificação."
+              for i in range(args.documentos)]
+    metadatas = [{'codigo_artigo': str(7000 + i), 'article_title': f'Artigo {i}', 'source_file': f'Artigo_{7000 + i}.pdf'}
+                 for i in range(args.documentos)]
+    vectorstore = FAISS.from_texts(textos, embeddings, metadatas=metadatas)
+    vectorstore.save_local(args.caminho)
+    salvar_docstore_mapeado(vectorstore, args.caminho)
+    construir_e_salvar_indice_lexical(vectorstore, args.caminho)
+
+    modulo.CAMINHO_INDICE_PADRAO = args.caminho
+    modulo.criar_embeddings = lambda modelo: embeddings
+    # ~200 chunks por resposta, como uma resposta real no formato do prompt
+    modulo.ChatGoogleGenerativeAI = lambda **kwargs: LLMFalso(resposta=" ".join(["verifique o cabo"] * 70))
+    assert modulo.inicializar_chatbot(), "Falha ao inicializar o chatbot com o índice sintético"
+
+    perguntas = [f"{PALAVRAS[i % 10]} parou {i} vezes com {PALAVRAS[(i // 10) % 10]}" for i in range(args.requisicoes)]
+    for pergunta in perguntas[:20]:
+        modulo.cache_respostas.limpar()
+        list(modulo.get_chatbot_answer_stream(pergunta))
+    tempos = []
+    for pergunta in perguntas:
+        modulo.cache_respostas.limpar()
+        inicio = time.perf_counter()
+        for _ in modulo.get_chatbot_answer_stream(pergunta):
+            pass
+        tempos.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    for _ in range(5000):
+        medicao = metricas.MedicaoStream()
+        for _ in range(200):
+            medicao.marcar_frame()
+        for etapa in ("embedding", "busca_vetorial", "busca_lexical", "montagem_contexto"):
+            metricas.observar(etapa, 0.001)
+        metricas.RESPOSTAS.labels("busca").inc()
+        medicao.finalizar("ok")
+    instrumentacao = (time.perf_counter() - inicio) / 5000
+
+    tempos_metricas = []
+    for _ in range(50):
+        inicio = time.perf_counter()
+        metricas.gerar_metricas()
+        tempos_metricas.append(time.perf_counter() - inicio)
+    print(json.dumps({"disponivel": metricas.PROMETHEUS_DISPONIVEL, "requisicao_ms": statistics.median(tempos) * 1000,
+                      "instrumentacao_us": instrumentacao * 1e6,
+                      "metrics_ms": statistics.median(tempos_metricas) * 1000}))
+
+
+def rodar(modo, args, temporario):
+    ambiente = {**os.environ, 'GOOGLE_API_KEY': 'chave-falsa', 'PYTHONWARNINGS': 'ignore'}
+    ambiente.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    ambiente.pop('METRICAS_PROMETHEUS', None)
+    if modo == 'desativadas':
+        ambiente['METRICAS_PROMETHEUS'] = '0'
+    elif modo == 'multiprocesso':
+        diretorio = os.path.join(temporario, 'prometheus')
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.makedirs(diretorio)
+        ambiente['PROMETHEUS_MULTIPROC_DIR'] = diretorio
+    caminho = os.path.join(temporario, f'indice_{modo}')
+    saida = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_metricas', '--interno', '--caminho', caminho,
+         '--documentos', str(args.documentos), '--requisicoes', str(args.requisicoes)],
+        env=ambiente, capture_output=True, text=True, check=True,
+        cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documentos', type=int, default=2000)
+    parser.add_argument('--requisicoes', type=int, default=300)
+    parser.add_argument('--rodadas', type=int, default=3)
+    parser.add_argument('--interno', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--caminho', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.interno:
+        medir_modo(args)
+        return
+
+    temporario = tempfile.mkdtemp(prefix='bench_metricas_')
+    try:
+        # Rodadas intercaladas para que a variação da máquina afete os três modos igualmente
+        resultados = {modo: [] for modo in MODOS}
+        for _ in range(args.rodadas):
+            for modo in MODOS:
+                resultados[modo].append(rodar(modo, args, temporario))
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+    base = statistics.median(r["requisicao_ms"] for r in resultados['desativadas'])
+    base_instrumentacao = statistics.median(r["instrumentacao_us"] for r in resultados['desativadas'])
+    print(f"{args.requisicoes} requisições por rodada, {args.rodadas} rodadas (mediana), LLM falso sem latência")
+    print(f"{'modo':<15}{'por requisição':>16}{'Δ requisição':>14}{'instrumentação':>16}{'Δ instr.':>10}"
+          f"{'/metrics':>12}")
+    for modo in MODOS:
+        requisicao = statistics.median(r["requisicao_ms"] for r in resultados[modo])
+        geracao = statistics.median(r["metrics_ms"] for r in resultados[modo])
+        instrumentacao = statistics.median(r["instrumentacao_us"] for r in resultados[modo])
+        custo = f"{(requisicao - base) * 1000:+.0f}µs" if modo != 'desativadas' else '-'
+        custo_instrumentacao = f"{instrumentacao - base_instrumentacao:+.1f}µs" if modo != 'desativadas' else '-'
+        print(f"{modo:<15}{requisicao:>14.3f}ms{custo:>14}{instrumentacao:>14.1f}µs{custo_instrumentacao:>10}"
+              f"{(f'{geracao:.3f}ms' if resultados[modo][0]['disponivel'] else '-'):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Mede o tempo até o primeiro 200 em uma partida a frio do servidor (gunicorn app:app,
+1 worker), com a inicialização síncrona antiga (INICIALIZACAO_SINCRONA=1: langchain,
+Gemini e índice carregados no import) e com a inicialização em segundo plano.
+
+Para cada modo são medidos, a partir do início do processo:
+- o primeiro 200 em /health (liveness; o que o balanceador e o Railway enxergam)
+- o primeiro 200 em /health/ready (chatbot pronto para responder o /chat)
+
+O índice é sintético (vetores aleatórios) e fica em um diretório temporário, apontado
+por CAMINHO_INDICE. Sem GOOGLE_API_KEY, usa uma chave falsa: a carga não chama a API.
+
+Uso: python -m benchmarks.bench_partida_fria [--documentos 20000] [--dimensao 768] [--repeticoes 3]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import statistics
+import urllib.request
+import urllib.error
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from langchain_community.vectorstores import FAISS
+
+from chatbot.indice_lexical import construir_e_salvar_indice_lexical
+from chatbot.indice_mapeado import salvar_docstore_mapeado
+
+DIRETORIO_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app'))
+
+
+def construir_indice(caminho, documentos, dimensao):
+    aleatorio = np.random.default_rng(42)
+    textos = [f"Artigo {i}: verifique a impressora, o cupom fiscal e a rede da loja {i % 97}." for i in range(documentos)]
+    vetores = aleatorio.standard_normal((documentos, dimensao)).astype(np.float32)
+    metadatas = [{'codigo_artigo': str(7000 + i), 'article_title': f'Artigo {i}', 'source_file': f'Artigo_{7000 + i}.pdf'}
+                 for i in range(documentos)]
+    vectorstore = FAISS.from_embeddings(zip(textos, vetores), None, metadatas=metadatas)
+    vectorstore.save_local(caminho)
+    salvar_docstore_mapeado(vectorstore, caminho)
+    construir_e_salvar_indice_lexical(vectorstore, caminho)
+
+
+def primeiro_200(url, inicio, processo, timeout):
+    while time.perf_counter() - inicio < timeout:
+        if processo.poll() is not None:
+            raise RuntimeError(f"O servidor terminou com código {processo.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resposta:
+                if resposta.status == 200:
+                    return time.perf_counter() - inicio
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return float('nan')
+
+
+def medir(modo, caminho, porta, timeout):
+    ambiente = {**os.environ, 'CAMINHO_INDICE': caminho, 'PYTHONWARNINGS': 'ignore'}
+    ambiente.setdefault('GOOGLE_API_KEY', 'chave-falsa')
+    ambiente.pop('PRE_CARREGAR_INDICE', None)
+    if modo == 'sincrona':
+        ambiente['INICIALIZACAO_SINCRONA'] = '1'
+    else:
+        ambiente.pop('INICIALIZACAO_SINCRONA', None)
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{porta}', '--workers', '1',
+         '--timeout', '120'],
+        cwd=DIRETORIO_APP, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        vivo = primeiro_200(f'http://127.0.0.1:{porta}/health', inicio, processo, timeout)
+        pronto = primeiro_200(f'http://127.0.0.1:{porta}/health/ready', inicio, processo, timeout)
+    finally:
+        processo.terminate()
+        processo.wait()
+    return vivo, pronto
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documentos', type=int, default=20000)
+    parser.add_argument('--dimensao', type=int, default=768)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    caminho = tempfile.mkdtemp(prefix='bench_partida_')
+    try:
+        construir_indice(caminho, args.documentos, args.dimensao)
+        print(f"Índice sintético: {args.documentos} documentos x {args.dimensao} dimensões, "
+              f"{args.repeticoes} partidas por modo (mediana)")
+        print(f"{'inicialização':<16}{'1º 200 /health':>16}{'1º 200 /health/ready':>22}")
+        for modo in ('sincrona', 'segundo_plano'):
+            medidas = [medir(modo, caminho, 5400 + i, args.timeout) for i in range(args.repeticoes)]
+            vivo = statistics.median(m[0] for m in medidas)
+            pronto = statistics.median(m[1] for m in medidas)
+            print(f"{modo:<16}{vivo:>15.2f}s{pronto:>21.2f}s")
+    finally:
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Latência (p50/p95/p99) do GET /search, a pesquisa de artigos sem o LLM.
+
+O índice é construído com criar_indice_estruturado.py sobre o CSV sintético da suíte de
+componentes, com embeddings falsos. A latência da API de embeddings do Google é simulada
+só nas consultas (--latencia-embedding), para mostrar o que o modo "auto" evita:
+
+- lexical: só BM25
+- auto (embedding em cache): vira híbrido com o vetor guardado pelo /chat
+- auto (sem cache): vira lexical, sem chamar a API
+- hibrido (sem cache): calcula o embedding da consulta, como o retriever do /chat
+- /chat até as fontes: o caminho anterior, até o primeiro frame (sem o LLM)
+- http: o /search do app.py em um servidor WSGI, modo auto, um cliente sequencial
+
+Uso: python -m benchmarks.bench_pesquisa [--documentos 5000] [--consultas 500]
+"""
+import os
+import io
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+
+from benchmarks.suite_componentes import gerar_csv, gerar_consultas
+from benchmarks.fakes import EmbeddingsFalsos, LLMFalso
+from chatbot.embeddings_cache import EmbeddingsComCache
+
+
+def resumir(tempos):
+    ordenados = sorted(tempos)
+
+    def percentil(p):
+        return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))] * 1000
+    return (len(ordenados), statistics.median(ordenados) * 1000, percentil(0.95), percentil(0.99),
+            ordenados[-1] * 1000)
+
+
+def cronometrar(funcao, consultas):
+    tempos = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        funcao(consulta)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documentos', type=int, default=5000)
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--dimensao', type=int, default=768)
+    parser.add_argument('--latencia-embedding', type=float, default=0.15,
+                        help="latência simulada de uma chamada de embedding de consulta (s)")
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    aleatorio = random.Random(11)
+
+    temporario = tempfile.mkdtemp(prefix='bench_pesquisa_')
+    os.environ.setdefault('GOOGLE_API_KEY', 'chave-falsa')
+    os.environ['EMBEDDINGS_CACHE_DB'] = ''
+    os.environ['FEEDBACK_DB'] = os.path.join(temporario, 'feedback.sqlite3')
+    os.environ['CAMINHO_INDICE'] = os.path.join(temporario, 'faiss_index_estruturado')
+    falsos = EmbeddingsFalsos(dimensao=args.dimensao)
+    embeddings = EmbeddingsComCache(falsos, "falso", None)
+    try:
+        import criar_indice_estruturado as construcao
+        construcao.criar_embeddings = lambda modelo: embeddings
+        gerar_csv(os.path.join(temporario, 'base_conhecimento_precisao.csv'), args.documentos, aleatorio)
+        with contextlib.redirect_stdout(io.StringIO()):
+            construcao.criar_e_salvar_indice_estruturado(reconstruir_tudo=True, diretorio=temporario)
+
+        import chatbot.chatbot as modulo
+        modulo.CAMINHO_INDICE_PADRAO = os.path.join(temporario, 'faiss_index_estruturado')
+        modulo.criar_embeddings = lambda modelo: embeddings
+        modulo.ChatGoogleGenerativeAI = lambda **kwargs: LLMFalso()
+        # O import do app.py inicializa o chatbot em segundo plano, como no servidor
+        import app as app_sync
+        import inicializacao
+        while not inicializacao.pronto():
+            assert inicializacao.status()["estado"] == "inicializando", inicializacao.status()
+            time.sleep(0.05)
+
+        consultas = gerar_consultas(args.consultas, aleatorio)
+        # Consultas que o /chat já fez: o embedding delas está no cache
+        em_cache = [f"{consulta} (repetida)" for consulta in consultas]
+        for consulta in em_cache:
+            embeddings.embed_query(consulta)
+        falsos.latencia_chamada = args.latencia_embedding
+        poucas = max(20, args.consultas // 20)
+        ineditas = [f"{consulta} (inédita {i})" for i, consulta in enumerate(consultas[:poucas])]
+
+        def pesquisar(modo):
+            return lambda consulta: modulo.pesquisar_artigos(consulta, 1, 10, modo)
+
+        def ate_as_fontes(consulta):
+            next(iter(modulo.get_chatbot_answer_stream(consulta)))
+
+        pesquisar("lexical")(consultas[0])
+        cenarios = [
+            ("lexical", cronometrar(pesquisar("lexical"), consultas)),
+            ("auto (embedding em cache)", cronometrar(pesquisar("auto"), em_cache)),
+            ("auto (sem cache)", cronometrar(pesquisar("auto"), [c + " nova" for c in consultas])),
+            ("hibrido (sem cache)", cronometrar(pesquisar("hibrido"), ineditas)),
+            ("/chat até as fontes", cronometrar(ate_as_fontes, [c + " chat" for c in ineditas])),
+        ]
+        assert modulo.pesquisar_artigos(em_cache[0], 1, 10, "auto")["modo"] == "hibrido"
+
+        import httpx
+        from werkzeug.serving import make_server
+        servidor = make_server('127.0.0.1', 5312, app_sync.app, threaded=True)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        try:
+            with httpx.Client(base_url='http://127.0.0.1:5312') as cliente:
+                cliente.get('/search', params={'q': consultas[0]}).raise_for_status()
+                cenarios.append(("http /search (auto)", cronometrar(
+                    lambda consulta: cliente.get('/search', params={'q': consulta}).raise_for_status(),
+                    [c + " http" for c in consultas])))
+        finally:
+            servidor.shutdown()
+
+        print(f"{args.documentos} artigos, dimensão {args.dimensao}, 10 resultados por página; "
+              f"embedding de consulta simulado em {args.latencia_embedding * 1000:.0f} ms")
+        print(f"{'cenário':<28}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'máx':>10}")
+        for nome, tempos in cenarios:
+            n, p50, p95, p99, maximo = resumir(tempos)
+            print(f"{nome:<28}{n:>6}{p50:>8.2f}ms{p95:>8.2f}ms{p99:>8.2f}ms{maximo:>8.2f}ms")
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Qualidade e latência da recuperação em duas etapas (RECUPERACAO_REORDENAR=1) contra a busca
+híbrida de uma etapa que vai hoje para o prompt (RRF de FAISS + BM25, k=8).
+
+Mesma avaliação por item conhecido do bench_embeddings_locais: uma frase sai de cada artigo
+sintético e vira a consulta. Os vetores são os embeddings locais (LSA), sem rede. Para cada
+configuração: recall@1, acerto entre os trechos entregues ao prompt, MRR, tokens do contexto
+depois da montagem (deduplicação, MMR e orçamento) e a latência da recuperação. O feedback
+fica vazio (os saldos são zero); o Gemini não é chamado, então o efeito nele aparece só
+como tokens a menos no prompt.
+
+Uso: python -m benchmarks.bench_reordenacao [--artigos 3000] [--candidatos 50] [--k 4]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from benchmarks.bench_embeddings_locais import gerar_artigos
+
+
+def percentis_ms(tempos):
+    ordenados = sorted(tempos)
+    return statistics.median(ordenados) * 1000, ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--artigos', type=int, default=3000)
+    parser.add_argument('--candidatos', type=int, default=50)
+    parser.add_argument('--k', type=int, default=4, help="trechos entregues ao prompt na busca em duas etapas")
+    parser.add_argument('--orcamento-ms', type=float, default=5.0)
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    from langchain_community.vectorstores import FAISS
+    from chatbot.embeddings_locais import EmbeddingsLSA
+    from chatbot.indice_lexical import IndiceBM25, texto_para_indexar
+    from chatbot.montagem_contexto import criar_montador_contexto
+    from chatbot.recuperacao import RetrieverHibrido
+    from chatbot.reordenacao import Reordenador
+
+    artigos = gerar_artigos(args.artigos, random.Random(7))
+    ids = [codigo for codigo, _, _, _ in artigos]
+    textos = [texto for _, _, texto, _ in artigos]
+    consultas = [consulta for _, _, _, consulta in artigos]
+    embeddings = EmbeddingsLSA.ajustar(textos)
+    vectorstore = FAISS.from_embeddings(
+        list(zip(textos, embeddings.embed_documents(textos))), embeddings,
+        metadatas=[{"codigo_artigo": codigo, "titulo_artigo": titulo} for codigo, titulo, _, _ in artigos], ids=ids)
+    lexical = IndiceBM25.construir(ids, [texto_para_indexar(vectorstore.docstore.search(i)) for i in ids])
+    inicio = time.perf_counter()
+    # Sem banco de feedback: os saldos ficam zerados
+    reordenador = Reordenador.construir(vectorstore, lexical, caminho_feedback=os.path.join(tempfile.gettempdir(),
+                                                                                           "sem_feedback.sqlite3"),
+                                        orcamento_ms=args.orcamento_ms)
+    tempo_construcao = time.perf_counter() - inicio
+    montar = criar_montador_contexto()
+
+    configuracoes = [
+        ("híbrida, k=8 (atual)", RetrieverHibrido(vectorstore=vectorstore, indice_lexical=lexical, k=8)),
+        (f"duas etapas, k=8", RetrieverHibrido(vectorstore=vectorstore, indice_lexical=lexical, k=8,
+                                               reordenador=reordenador, k_reordenacao=args.candidatos)),
+        (f"duas etapas, k={args.k}", RetrieverHibrido(vectorstore=vectorstore, indice_lexical=lexical, k=args.k,
+                                                      reordenador=reordenador, k_reordenacao=args.candidatos)),
+    ]
+    print(f"{len(artigos)} artigos sintéticos, embeddings LSA ({embeddings.dimensao} dimensões), "
+          f"{args.candidatos} candidatos na primeira etapa, orçamento de {args.orcamento_ms:.1f} ms; "
+          f"reordenador montado em {tempo_construcao * 1000:.0f} ms")
+    print(f"{'recuperação':<24}{'recall@1':>9}{'no prompt':>10}{'MRR':>7}{'trechos':>9}{'tokens':>8}"
+          f"{'p50':>9}{'p99':>9}")
+    for nome, retriever in configuracoes:
+        retriever.invoke(consultas[0])
+        acertos1 = acertos = mrr = trechos = tokens = 0
+        tempos = []
+        for consulta, esperado in zip(consultas, ids):
+            inicio = time.perf_counter()
+            documentos = retriever.invoke(consulta)
+            tempos.append(time.perf_counter() - inicio)
+            codigos = [documento.metadata["codigo_artigo"] for documento in documentos]
+            if esperado in codigos:
+                posicao = codigos.index(esperado) + 1
+                acertos1 += posicao == 1
+                acertos += 1
+                mrr += 1.0 / posicao
+            trechos += len(documentos)
+            tokens += montar(documentos, consulta)[1]["tokens_usados"]
+        n = len(consultas)
+        p50, p99 = percentis_ms(tempos)
+        print(f"{nome:<24}{acertos1 / n:>9.3f}{acertos / n:>10.3f}{mrr / n:>7.3f}{trechos / n:>9.1f}"
+              f"{tokens / n:>8.0f}{p50:>7.2f}ms{p99:>7.2f}ms")
+
+    # Só a segunda etapa, com os candidatos já buscados
+    from chatbot.recuperacao import buscar_posicoes
+    relevancias, posicoes = buscar_posicoes(vectorstore, embeddings.embed_documents(consultas), args.candidatos)
+    pontuacoes = [lexical.pontuar(consulta) for consulta in consultas]
+    estouros = reordenador.estouros
+    tempos = []
+    for consulta, linha_relevancias, linha_posicoes, linha_pontuacoes in zip(consultas, relevancias, posicoes,
+                                                                              pontuacoes):
+        inicio = time.perf_counter()
+        reordenador.reordenar(consulta, linha_relevancias, linha_posicoes, linha_pontuacoes, args.k, args.candidatos)
+        tempos.append(time.perf_counter() - inicio)
+    p50, p99 = percentis_ms(tempos)
+    print(f"reordenador sozinho: p50 {p50:.3f} ms, p99 {p99:.3f} ms, máx {max(tempos) * 1000:.3f} ms; "
+          f"{reordenador.estouros - estouros} de {len(consultas)} passaram do orçamento")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Teste de carga do /chat: quantos streams SSE simultâneos um processo sustenta no
+modo síncrono (app.py no servidor WSGI sem threads, como `gunicorn --workers 1`)
+e no modo assíncrono (app_async.py no uvicorn).
+
+O LLM é o `LLMFalso` (latência até o primeiro token + taxa de tokens) e os embeddings
+são os `EmbeddingsFalsos`, sobre um índice pequeno criado em um diretório temporário.
+Cada conexão faz uma pergunta diferente, para não cair no cache de respostas.
+
+Uso: python -m benchmarks.bench_streams_concorrentes [--conexoes 10,100,500]
+         [--primeiro-token 0.5] [--tokens-por-segundo 40] [--timeout 30]
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+import httpx
+import uvicorn
+from werkzeug.serving import make_server
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.fakes import EmbeddingsFalsos, LLMFalso
+from chatbot.indice_lexical import construir_e_salvar_indice_lexical
+from chatbot.indice_mapeado import salvar_docstore_mapeado
+
+PALAVRAS = ["impressora", "cupom", "fiscal", "pdv", "bobina", "sat", "rede", "driver", "balança", "teclado"]
+
+
+def preparar_chatbot(caminho, args):
+    """Cria o índice falso e aponta o módulo do chatbot para ele, com o LLM falso."""
+    os.environ.setdefault('GOOGLE_API_KEY', 'chave-falsa')
+    embeddings = EmbeddingsFalsos(dimensao=64)
+    textos = [f"Artigo sobre {PALAVRAS[i % 10]} e {PALAVRAS[(i * 3) % 10]}: procedimento {i}." for i in range(200)]
+    metadatas = [{'codigo_artigo': str(7000 + i), 'article_title': f'Artigo {i}', 'source_file': f'Artigo_{7000 + i}.pdf'}
+                 for i in range(200)]
+    vectorstore = FAISS.from_texts(textos, embeddings, metadatas=metadatas)
+    vectorstore.save_local(caminho)
+    salvar_docstore_mapeado(vectorstore, caminho)
+    construir_e_salvar_indice_lexical(vectorstore, caminho)
+
+    import chatbot.chatbot as modulo
+    modulo.CAMINHO_INDICE_PADRAO = caminho
+    modulo.criar_embeddings = lambda modelo: embeddings
+    modulo.ChatGoogleGenerativeAI = lambda **kwargs: LLMFalso(
+        latencia_primeiro_token=args.primeiro_token, tokens_por_segundo=args.tokens_por_segundo)
+    assert modulo.inicializar_chatbot(), "Falha ao inicializar o chatbot com o índice falso"
+
+
+def esperar_pronto(porta, timeout=60):
+    """O chatbot carrega em segundo plano; espera o /health/ready responder 200."""
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            if httpx.get(f'http://127.0.0.1:{porta}/health/ready').status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"O servidor na porta {porta} não ficou pronto em {timeout}s")
+
+
+def servir_sync(porta):
+    import app as app_sync
+    servidor = make_server('127.0.0.1', porta, app_sync.app, threaded=False)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    esperar_pronto(porta)
+    return servidor.shutdown
+
+
+def servir_async(porta):
+    import app_async
+    servidor = uvicorn.Server(uvicorn.Config(app_async.app, host='127.0.0.1', port=porta, log_level='error'))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    esperar_pronto(porta)
+
+    def parar():
+        servidor.should_exit = True
+    return parar
+
+
+async def um_stream(cliente, url, i, ativos, timeout):
+    inicio = time.perf_counter()
+    primeiro = None
+    pergunta = f"problema {i} com {PALAVRAS[i % 10]} e {PALAVRAS[(i // 10) % 10]} na loja"
+    try:
+        async with cliente.stream('GET', url, params={'message': pergunta}, timeout=timeout) as resposta:
+            async for linha in resposta.aiter_lines():
+                if linha.startswith('data: ') and primeiro is None:
+                    primeiro = time.perf_counter() - inicio
+                    ativos['agora'] += 1
+                    ativos['maximo'] = max(ativos['maximo'], ativos['agora'])
+        if primeiro is not None:
+            ativos['agora'] -= 1
+        return primeiro, time.perf_counter() - inicio
+    except (httpx.HTTPError, OSError):
+        if primeiro is not None:
+            ativos['agora'] -= 1
+        return None
+
+
+async def carga(url, conexoes, timeout):
+    ativos = {'agora': 0, 'maximo': 0}
+    limites = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limites) as cliente:
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(um_stream(cliente, url, i, ativos, timeout) for i in range(conexoes)))
+        duracao = time.perf_counter() - inicio
+    completos = [r for r in resultados if r is not None and r[0] is not None]
+    return completos, duracao, ativos['maximo']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conexoes', default='10,100,500')
+    parser.add_argument('--primeiro-token', type=float, default=0.5)
+    parser.add_argument('--tokens-por-segundo', type=float, default=40)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    caminho = tempfile.mkdtemp(prefix='bench_streams_')
+    try:
+        preparar_chatbot(caminho, args)
+        print(f"LLM falso: {args.primeiro_token}s até o primeiro token, {args.tokens_por_segundo} tokens/s, "
+              f"timeout de {args.timeout}s por stream")
+        print(f"{'modo':<7}{'conexões':>9}{'completos':>10}{'simultâneos':>12}{'TTFB p50':>10}{'TTFB p99':>10}"
+              f"{'duração p50':>12}{'total':>8}")
+        for modo, servir, porta in (('sync', servir_sync, 5301), ('async', servir_async, 5302)):
+            parar = servir(porta)
+            try:
+                for conexoes in [int(c) for c in args.conexoes.split(',')]:
+                    # Os dois modos usam o mesmo módulo do chatbot; as respostas não podem vir do cache
+                    sys.modules['chatbot.chatbot'].cache_respostas.limpar()
+                    completos, duracao, simultaneos = asyncio.run(carga(f'http://127.0.0.1:{porta}/chat', conexoes,
+                                                                        args.timeout))
+                    ttfb = sorted(r[0] for r in completos) or [float('nan')]
+                    total = [r[1] for r in completos] or [float('nan')]
+                    print(f"{modo:<7}{conexoes:>9}{len(completos):>10}{simultaneos:>12}{statistics.median(ttfb):>9.2f}s"
+                          f"{ttfb[min(len(ttfb) - 1, int(len(ttfb) * 0.99))]:>9.2f}s"
+                          f"{statistics.median(total):>11.2f}s{duracao:>7.1f}s")
+            finally:
+                parar()
+    finally:
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
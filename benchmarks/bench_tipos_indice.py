@@ -0,0 +1,124 @@
+"""
+Compara os tipos de índice FAISS de `chatbot.tipos_indice` com a busca exata (flat):
+recall@8 em relação ao flat, latência p50/p99 de uma consulta e memória do índice.
+
+Roda sobre o índice real (web_app/faiss_index_estruturado, se existir) e sobre um
+corpus sintético com agrupamentos, parecido com embeddings de texto (768 dimensões,
+como o models/embedding-001). Para o corpus de 1M de vetores use --vetores 1000000;
+o flat sozinho ocupa ~3 GB nesse caso.
+
+Uso: python -m benchmarks.bench_tipos_indice [--vetores 100000] [--dimensao 768]
+         [--consultas 300] [--tipos flat,ivf_flat,hnsw,ivf_pq,sq8,sq_fp16] [--sem-real]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app')))
+
+from chatbot.tipos_indice import TIPOS_INDICE, criar_indice_faiss
+
+K = 8
+CAMINHO_INDICE_REAL = os.path.join(os.path.dirname(__file__), '..', 'web_app', 'faiss_index_estruturado', 'index.faiss')
+
+
+def rss_mb():
+    """Memória residente do processo, lida de /proc (Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def gerar_corpus(total, dimensao, consultas, aleatorio):
+    """Vetores normalizados em torno de centros aleatórios; as consultas são vizinhas de vetores do corpus."""
+    centros = aleatorio.standard_normal((max(16, total // 500), dimensao)).astype(np.float32)
+    vetores = np.empty((total, dimensao), dtype=np.float32)
+    for inicio in range(0, total, 50000):
+        fim = min(total, inicio + 50000)
+        grupo = aleatorio.integers(0, len(centros), fim - inicio)
+        vetores[inicio:fim] = centros[grupo] + 0.6 * aleatorio.standard_normal((fim - inicio, dimensao)).astype(np.float32)
+    faiss.normalize_L2(vetores)
+    return vetores, gerar_consultas(vetores, consultas, aleatorio)
+
+
+def gerar_consultas(vetores, consultas, aleatorio):
+    base = vetores[aleatorio.integers(0, len(vetores), consultas)]
+    ruido = 0.3 * aleatorio.standard_normal(base.shape).astype(np.float32) / np.sqrt(vetores.shape[1])
+    consultas = np.ascontiguousarray(base + ruido, dtype=np.float32)
+    faiss.normalize_L2(consultas)
+    return consultas
+
+
+def medir(indice, consultas):
+    """Busca uma consulta por vez, como o /chat faz, e retorna (posições, latências em ms)."""
+    posicoes = np.empty((len(consultas), K), dtype=np.int64)
+    latencias = []
+    for i in range(len(consultas)):
+        inicio = time.perf_counter()
+        _, posicoes[i] = indice.search(consultas[i:i + 1], K)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return posicoes, latencias
+
+
+def recall(posicoes, verdade):
+    return float(np.mean([len(set(p) & set(v)) / K for p, v in zip(posicoes, verdade)]))
+
+
+def comparar(nome, vetores, consultas, tipos):
+    print(f"\n=== {nome}: {len(vetores)} vetores x {vetores.shape[1]} dimensões, {len(consultas)} consultas ===")
+    print(f"{'tipo':<10}{'recall@8':>10}{'p50 ms':>10}{'p99 ms':>10}{'índice MB':>11}{'RSS +MB':>10}"
+          f"{'construção s':>14}  parâmetros")
+    verdade = None
+    for tipo in ['flat'] + [t for t in tipos if t != 'flat']:
+        rss_antes = rss_mb()
+        inicio = time.perf_counter()
+        indice, parametros = criar_indice_faiss(vetores, tipo)
+        construcao = time.perf_counter() - inicio
+        rss_depois = rss_mb()
+        tamanho_mb = faiss.serialize_index(indice).nbytes / 1024 / 1024
+        posicoes, latencias = medir(indice, consultas)
+        if verdade is None:
+            verdade = posicoes
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        extras = {c: v for c, v in parametros.items() if c not in ('tipo', 'dimensao', 'total_vetores')}
+        print(f"{tipo:<10}{recall(posicoes, verdade):>10.3f}{statistics.median(latencias):>10.3f}{p99:>10.3f}"
+              f"{tamanho_mb:>11.1f}{rss_depois - rss_antes:>10.1f}{construcao:>14.1f}  {extras}")
+        del indice
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vetores', type=int, default=100000)
+    parser.add_argument('--dimensao', type=int, default=768)
+    parser.add_argument('--consultas', type=int, default=300)
+    parser.add_argument('--tipos', default=','.join(TIPOS_INDICE))
+    parser.add_argument('--sem-real', action='store_true', help='não usa o índice real mesmo se ele existir')
+    args = parser.parse_args()
+    tipos = [t for t in args.tipos.split(',') if t]
+    aleatorio = np.random.default_rng(42)
+    faiss.omp_set_num_threads(1)
+
+    if not args.sem_real and os.path.exists(CAMINHO_INDICE_REAL):
+        real = faiss.read_index(CAMINHO_INDICE_REAL)
+        vetores = real.reconstruct_n(0, real.ntotal)
+        comparar('Índice real', vetores, gerar_consultas(vetores, args.consultas, aleatorio), tipos)
+    else:
+        print(f"Índice real não encontrado em {os.path.abspath(CAMINHO_INDICE_REAL)}; usando só o corpus sintético.")
+
+    vetores, consultas = gerar_corpus(args.vetores, args.dimensao, args.consultas, aleatorio)
+    comparar('Corpus sintético', vetores, consultas, tipos)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Substitutos determinísticos dos serviços do Google para rodar os benchmarks
+sem rede e sem GOOGLE_API_KEY.
+"""
+import time
+import asyncio
+import hashlib
+import random
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class ErroCotaSimulado(Exception):
+    """Simula o erro de cota (429) das APIs do Google."""
+
+
+class EmbeddingsFalsos(Embeddings):
+    """
+    Embeddings determinísticos derivados do hash do texto, com latência
+    configurável por chamada e por documento e uma taxa de falhas simulada.
+    """
+
+    def __init__(self, dimensao=768, latencia_chamada=0.0, latencia_documento=0.0, taxa_falhas=0.0, semente=42):
+        self.dimensao = dimensao
+        self.latencia_chamada = latencia_chamada
+        self.latencia_documento = latencia_documento
+        self.taxa_falhas = taxa_falhas
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.documentos = 0
+
+    def _vetor(self, texto):
+        semente = int.from_bytes(hashlib.sha256(texto.encode("utf-8")).digest()[:8], "little")
+        vetor = np.random.default_rng(semente).standard_normal(self.dimensao).astype(np.float32)
+        return (vetor / np.linalg.norm(vetor)).tolist()
+
+    def embed_documents(self, texts, task_type=None):
+        with self._lock:
+            self.chamadas += 1
+            falhar = self._aleatorio.random() < self.taxa_falhas
+        time.sleep(self.latencia_chamada + self.latencia_documento * len(texts))
+        if falhar:
+            raise ErroCotaSimulado("429 Resource has been exhausted")
+        with self._lock:
+            self.documentos += len(texts)
+        return [self._vetor(texto) for texto in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# Gerações em threads (servidor sync) mexem nos contadores do LLMFalso ao mesmo tempo
+_lock_geracoes = threading.Lock()
+
+
+class LLMFalso(BaseChatModel):
+    """
+    Modelo de chat que responde sempre o mesmo texto, com latência até o primeiro
+    token e taxa de tokens configuráveis. O streaming assíncrono usa asyncio.sleep,
+    então não bloqueia o event loop, como uma chamada de rede real.
+    `chamadas` conta as gerações iniciadas, como as chamadas que chegariam ao Gemini.
+    Com `cota_concorrente`, uma geração iniciada com essa quantidade já em andamento
+    falha com ErroCotaSimulado, como a cota de requisições simultâneas do Gemini.
+    A contagem vale para as gerações em threads (`_stream`, `_generate`) e no event loop.
+    """
+
+    resposta: str = "Para resolver, reinicie o serviço de impressão e verifique o cabo da impressora."
+    latencia_primeiro_token: float = 0.0
+    tokens_por_segundo: float = 0.0
+    chamadas: int = 0
+    cota_concorrente: int = 0
+    em_andamento: int = 0
+    pico_concorrencia: int = 0
+    erros_cota: int = 0
+
+    @property
+    def _llm_type(self):
+        return "llm-falso"
+
+    def _tokens(self):
+        return [token + " " for token in self.resposta.split()]
+
+    def _intervalo(self):
+        return 1.0 / self.tokens_por_segundo if self.tokens_por_segundo else 0.0
+
+    def _iniciar_geracao(self):
+        with _lock_geracoes:
+            self.chamadas += 1
+            if self.cota_concorrente and self.em_andamento >= self.cota_concorrente:
+                self.erros_cota += 1
+                raise ErroCotaSimulado("429 Resource has been exhausted (e.g. check quota).")
+            self.em_andamento += 1
+            self.pico_concorrencia = max(self.pico_concorrencia, self.em_andamento)
+
+    def _encerrar_geracao(self):
+        with _lock_geracoes:
+            self.em_andamento -= 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._iniciar_geracao()
+        try:
+            time.sleep(self.latencia_primeiro_token + self._intervalo() * len(self._tokens()))
+        finally:
+            self._encerrar_geracao()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.resposta))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._iniciar_geracao()
+        try:
+            time.sleep(self.latencia_primeiro_token)
+            for token in self._tokens():
+                time.sleep(self._intervalo())
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        finally:
+            self._encerrar_geracao()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._iniciar_geracao()
+        try:
+            await asyncio.sleep(self.latencia_primeiro_token)
+            for token in self._tokens():
+                await asyncio.sleep(self._intervalo())
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        finally:
+            self._encerrar_geracao()
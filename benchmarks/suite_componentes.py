@@ -0,0 +1,284 @@
+"""
+Suíte de benchmarks por componente do chatbot, sem rede e sem GOOGLE_API_KEY.
+
+Os embeddings do Google e o Gemini são trocados por `EmbeddingsFalsos` e `LLMFalso`
+(latência e taxa de tokens configuráveis) e cada etapa é medida isoladamente:
+
+- construcao_indice: criar_indice_estruturado.py sobre um CSV sintético
+- carga_indice: FAISS mapeado + docstore, BM25 e índice de códigos (_carregar_indice)
+- recuperacao: RetrieverHibrido nos modos vetorial, lexical e híbrido, e a rota por código
+- montagem_prompt: format_docs + PromptTemplate e a montagem com MMR e orçamento de tokens
+- serializacao_sse: formatar_fontes e os frames "data: {json}" de uma resposta longa
+- stream_sem_llm: get_chatbot_answer_stream inteiro com o LLM falso respondendo sem latência
+
+O resultado vai para um JSON (--saida) e --comparar mostra a diferença para uma rodada anterior.
+
+Uso: python -m benchmarks.suite_componentes [--documentos 2000] [--consultas 200]
+         [--saida resultados.json] [--comparar anterior.json]
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import subprocess
+
+DIRETORIO_APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'web_app'))
+sys.path.insert(0, DIRETORIO_APP)
+
+import pandas as pd
+from langchain.prompts import PromptTemplate
+
+from benchmarks.fakes import EmbeddingsFalsos, LLMFalso
+from chatbot.embeddings_cache import EmbeddingsComCache
+from chatbot.indice_lexical import IndiceBM25
+from chatbot.indice_mapeado import carregar_vectorstore
+from chatbot.recuperacao import RetrieverHibrido, construir_indice_codigos, buscar_por_codigos
+from chatbot.versoes_indice import versao_atual
+
+PALAVRAS = ["impressora", "cupom", "fiscal", "pdv", "bobina", "sat", "rede", "driver", "balança", "teclado",
+            "gaveta", "leitor", "etiqueta", "tef", "pinpad", "nota", "estoque", "senha", "sistema", "backup"]
+FRASES = [
+    "Verifique se o cabo USB da {a} está conectado ao PDV e se a fonte está ligada.",
+    "Reinicie o serviço de {a} e confirme o status no gerenciador de dispositivos.",
+    "Caso o {a} não responda, valide a configuração do {b} no sistema da loja.",
+    "Abra um chamado para o suporte AERO informando o código do erro do {a}.",
+    "Atualize o driver do {a} pela central de software e teste novamente o {b}.",
+]
+
+
+def gerar_csv(caminho, documentos, aleatorio):
+    linhas = []
+    for i in range(documentos):
+        a, b = aleatorio.choice(PALAVRAS), aleatorio.choice(PALAVRAS)
+        titulo = f"CSF Tech: Falha {a} {b} {i}"
+        frases = [aleatorio.choice(FRASES).format(a=aleatorio.choice(PALAVRAS), b=aleatorio.choice(PALAVRAS))
+                  for _ in range(12)]
+        linhas.append({'codigo_artigo': str(7000 + i), 'titulo_artigo': titulo,
+                       'texto_para_busca': f"Título: {titulo}. " + " ".join(frases)})
+    pd.DataFrame(linhas).to_csv(caminho, index=False)
+
+
+def gerar_consultas(quantidade, aleatorio):
+    return [f"{aleatorio.choice(PALAVRAS)} não funciona depois de trocar o {aleatorio.choice(PALAVRAS)}"
+            for _ in range(quantidade)]
+
+
+def resumir(tempos, **extras):
+    """p50, p95, média e n em milissegundos."""
+    ordenados = sorted(tempos)
+    return {
+        "n": len(ordenados),
+        "p50_ms": round(statistics.median(ordenados) * 1000, 4),
+        "p95_ms": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 4),
+        "media_ms": round(statistics.mean(ordenados) * 1000, 4),
+        **extras,
+    }
+
+
+def cronometrar(funcao, argumentos):
+    tempos = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        funcao(argumento)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def medir_construcao(diretorio, args):
+    import criar_indice_estruturado as construcao
+    construcao.criar_embeddings = lambda modelo: EmbeddingsComCache(
+        EmbeddingsFalsos(dimensao=args.dimensao, latencia_chamada=args.latencia_embedding,
+                         latencia_documento=args.latencia_documento),
+        "falso", None)
+    os.environ['EMBEDDINGS_CACHE_DB'] = ''
+    tempos = []
+    for _ in range(args.repeticoes):
+        anterior = versao_atual(os.path.join(diretorio, 'faiss_index_estruturado'))[0]
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()) as saida:
+            construcao.criar_e_salvar_indice_estruturado(reconstruir_tudo=True, diretorio=diretorio)
+        tempos.append(time.perf_counter() - inicio)
+        if versao_atual(os.path.join(diretorio, 'faiss_index_estruturado'))[0] == anterior:
+            raise RuntimeError("A construção do índice falhou:\n" + saida.getvalue())
+        time.sleep(1)  # versões têm resolução de segundos
+    return resumir(tempos, documentos_por_s=round(args.documentos / statistics.median(tempos), 1))
+
+
+def medir_carga(caminho, embeddings, repeticoes):
+    import chatbot.chatbot as modulo
+    etapas = {
+        "total": lambda _: modulo._carregar_indice(caminho, embeddings),
+        "vectorstore": lambda _: carregar_vectorstore(caminho, embeddings),
+        "bm25": lambda _: IndiceBM25.carregar(caminho),
+    }
+    resultado = {nome: resumir(cronometrar(funcao, range(repeticoes))) for nome, funcao in etapas.items()}
+    vectorstore = carregar_vectorstore(caminho, embeddings)
+    resultado["indice_codigos"] = resumir(cronometrar(lambda _: construir_indice_codigos(vectorstore),
+                                                      range(repeticoes)))
+    return resultado
+
+
+def medir_recuperacao(indice, consultas):
+    resultado = {}
+    for modo in ("vetorial", "lexical", "hibrido"):
+        retriever = RetrieverHibrido(vectorstore=indice["vectorstore"], indice_lexical=indice["lexical"], k=8, modo=modo)
+        retriever.invoke(consultas[0])
+        resultado[modo] = resumir(cronometrar(retriever.invoke, consultas))
+    perguntas_codigo = [f"procedimento do artigo {7000 + i % 50}" for i in range(len(consultas))]
+    resultado["codigo_artigo"] = resumir(cronometrar(
+        lambda pergunta: buscar_por_codigos(pergunta, indice["codigos"], indice["vectorstore"]), perguntas_codigo))
+    return resultado
+
+
+def medir_montagem(indice, consultas):
+    import chatbot.chatbot as modulo
+    retriever = RetrieverHibrido(vectorstore=indice["vectorstore"], indice_lexical=indice["lexical"], k=8)
+    documentos = [(consulta, retriever.invoke(consulta)) for consulta in consultas]
+    prompt = PromptTemplate(template=modulo.PROMPT_TEMPLATE, input_variables=["context", "question"])
+    return {
+        "format_docs": resumir(cronometrar(
+            lambda item: prompt.format(context=modulo.format_docs(item[1]), question=item[0]), documentos)),
+        "montador_contexto": resumir(cronometrar(
+            lambda item: prompt.format(context=modulo.montar_contexto_prompt(
+                {"source_documents": item[1], "question": item[0]}), question=item[0]), documentos)),
+    }
+
+
+def medir_serializacao(indice, consultas, resposta):
+    import chatbot.chatbot as modulo
+    retriever = RetrieverHibrido(vectorstore=indice["vectorstore"], indice_lexical=indice["lexical"], k=8)
+    documentos = [retriever.invoke(consulta) for consulta in consultas]
+    tokens = [token + " " for token in resposta.split()]
+
+    def serializar(docs):
+        frames = ["data: " + json.dumps({"sources": modulo.formatar_fontes(docs)}) + "\n\n"]
+        frames.extend("data: " + json.dumps({"token": token}) + "\n\n" for token in tokens)
+        return frames
+
+    tempos = cronometrar(serializar, documentos)
+    return resumir(tempos, frames_por_resposta=len(tokens) + 1,
+                   us_por_frame=round(statistics.median(tempos) / (len(tokens) + 1) * 1e6, 3))
+
+
+def medir_stream(consultas, args, resposta):
+    """O gerador SSE inteiro (recuperação, montagem, LLM falso e frames), sem o cache de respostas."""
+    import chatbot.chatbot as modulo
+    modulo.ChatGoogleGenerativeAI = lambda **kwargs: LLMFalso(
+        resposta=resposta, latencia_primeiro_token=args.primeiro_token, tokens_por_segundo=args.tokens_por_segundo)
+    assert modulo.inicializar_chatbot(), "Falha ao inicializar o chatbot com o índice sintético"
+
+    def responder(consulta):
+        modulo.cache_respostas.limpar()
+        for _ in modulo.get_chatbot_answer_stream(consulta):
+            pass
+
+    responder(consultas[0])
+    return resumir(cronometrar(responder, consultas), primeiro_token_s=args.primeiro_token,
+                   tokens_por_segundo=args.tokens_por_segundo)
+
+
+def ambiente(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=DIRETORIO_APP).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": vars(args),
+    }
+
+
+def achatar(etapas, prefixo=""):
+    """{"recuperacao": {"hibrido": {"p50_ms": ...}}} -> {"recuperacao.hibrido": {...}}"""
+    planas = {}
+    for nome, valor in etapas.items():
+        if "p50_ms" in valor:
+            planas[prefixo + nome] = valor
+        else:
+            planas.update(achatar(valor, prefixo + nome + "."))
+    return planas
+
+
+def imprimir(etapas, anterior=None):
+    planas = achatar(etapas)
+    planas_anteriores = achatar(anterior["etapas"]) if anterior else {}
+    print(f"{'etapa':<32}{'p50':>12}{'p95':>12}{'n':>6}" + (f"{'p50 antes':>12}{'Δ':>8}" if anterior else ""))
+    for nome, valor in planas.items():
+        linha = f"{nome:<32}{valor['p50_ms']:>10.3f}ms{valor['p95_ms']:>10.3f}ms{valor['n']:>6}"
+        if nome in planas_anteriores:
+            antes = planas_anteriores[nome]["p50_ms"]
+            linha += f"{antes:>10.3f}ms{(valor['p50_ms'] / antes - 1) * 100 if antes else 0:>+7.1f}%"
+        print(linha)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documentos', type=int, default=2000)
+    parser.add_argument('--dimensao', type=int, default=768)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=3, help="Repetições da construção e da carga do índice")
+    parser.add_argument('--latencia-embedding', type=float, default=0.0, help="Segundos por chamada de embeddings")
+    parser.add_argument('--latencia-documento', type=float, default=0.0, help="Segundos por documento embeddado")
+    parser.add_argument('--primeiro-token', type=float, default=0.0)
+    parser.add_argument('--tokens-por-segundo', type=float, default=0.0, help="0 = sem limite")
+    parser.add_argument('--saida', default=None, help="Arquivo JSON com os resultados")
+    parser.add_argument('--comparar', default=None, help="JSON de uma rodada anterior")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+    logging.getLogger('langchain_community.vectorstores.faiss').setLevel(logging.ERROR)
+
+    aleatorio = random.Random(args.semente)
+    consultas = gerar_consultas(args.consultas, aleatorio)
+    # Resposta no tamanho das respostas reais (~1000 tokens no formato do PROMPT_TEMPLATE)
+    resposta = " ".join(aleatorio.choice(FRASES).format(a=aleatorio.choice(PALAVRAS), b=aleatorio.choice(PALAVRAS))
+                        for _ in range(80))
+
+    diretorio = tempfile.mkdtemp(prefix='suite_componentes_')
+    os.environ['GOOGLE_API_KEY'] = 'chave-falsa'
+    os.environ['CAMINHO_INDICE'] = os.path.join(diretorio, 'faiss_index_estruturado')
+    try:
+        gerar_csv(os.path.join(diretorio, 'base_conhecimento_precisao.csv'), args.documentos, aleatorio)
+        etapas = {"construcao_indice": medir_construcao(diretorio, args)}
+
+        import chatbot.chatbot as modulo
+        embeddings = EmbeddingsFalsos(dimensao=args.dimensao)
+        modulo.CAMINHO_INDICE_PADRAO = os.environ['CAMINHO_INDICE']
+        modulo.criar_embeddings = lambda modelo: embeddings
+        _, caminho = versao_atual(modulo.CAMINHO_INDICE_PADRAO)
+        etapas["carga_indice"] = medir_carga(caminho, embeddings, args.repeticoes)
+        indice = modulo._carregar_indice(caminho, embeddings)
+        etapas["recuperacao"] = medir_recuperacao(indice, consultas)
+        etapas["montagem_prompt"] = medir_montagem(indice, consultas)
+        etapas["serializacao_sse"] = medir_serializacao(indice, consultas, resposta)
+        etapas["stream_sem_llm"] = medir_stream(consultas, args, resposta)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    resultado = {"ambiente": ambiente(args), "etapas": etapas}
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+    imprimir(etapas, anterior)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultados salvos em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
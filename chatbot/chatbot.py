@@ -1,49 +1,89 @@
 import os
 import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import google.generativeai as genai
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableParallel
 from langchain_core.output_parsers import StrOutputParser
 import json # Adicionado: Importa o módulo json
+from chatbot.cache_respostas import CacheRespostas, assinatura_indice, normalizar_pergunta
+from chatbot.coalescencia import Coalescedor, CoalescedorAsync
+from chatbot.admissao import ControleAdmissao, FilaCheia, EsperaEsgotada
+from chatbot.pesquisa import pesquisar
+from chatbot.embeddings_cache import criar_embeddings
+from chatbot.embeddings_locais import carregar_embeddings_locais
+from chatbot.indice_lexical import IndiceBM25
+from chatbot.recuperacao import RetrieverHibrido, construir_indice_codigos, buscar_por_codigos
+from chatbot.reordenacao import Reordenador, reordenacao_ativada
+from chatbot.documentos_pais import MapaPais
+from chatbot.montagem_contexto import criar_montador_contexto
+from chatbot.tipos_indice import aplicar_parametros_busca, carregar_parametros
+from chatbot.indice_mapeado import carregar_vectorstore
+from chatbot.versoes_indice import versao_atual
+from chatbot import metricas
 
 # Cache para armazenar a cadeia de QA
 qa_chain_cache = None
+rag_chain_cache = None
+vectorstore_cache = None
+indice_codigos_cache = {}
+# Embeddings das consultas do índice ativo: os do Google (com cache) ou o modelo local salvo com o índice
+embeddings_cache = None
+embeddings_google = None
+caminho_indice_cache = None
+# Índice carregado no master do gunicorn antes do fork (modo preload)
+indice_pre_carregado = None
+# Versão ativa do índice e as cadeias montadas sobre ela, trocadas de uma vez na recarga.
+# Cada requisição lê este dicionário uma única vez, então termina na versão em que começou.
+indice_ativo = None
+_lock_recarga = threading.Lock()
+CAMINHO_INDICE_PADRAO = os.environ.get("CAMINHO_INDICE") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "faiss_index_estruturado"))
 
-def format_docs(docs):
-    """Função auxiliar para formatar os documentos recuperados em uma única string."""
-    return "\n\n".join(doc.page_content for doc in docs)
+# Contadores por rota de atendimento: "cache", "codigo_artigo" ou "busca"
+metricas_rotas = {}
+_lock_metricas = threading.Lock()
 
-def inicializar_chatbot():
-    """
-    Carrega o índice FAISS e inicializa a cadeia de QA usando LCEL,
-    configurada para retornar a resposta e os documentos de origem.
-    """
-    global qa_chain_cache
-    try:
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            print("Erro: A chave de API do Google (GOOGLE_API_KEY) não foi definida.")
-            return False
-        genai.configure(api_key=api_key)
+# Tokens do contexto antes e depois da montagem (deduplicação, MMR e orçamento)
+metricas_contexto = {"requisicoes": 0, "tokens_originais": 0, "tokens_usados": 0}
+montador_contexto = criar_montador_contexto()
 
-        caminho_indice = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "faiss_index_estruturado"))
+# Cache das respostas já geradas (pergunta normalizada e, opcionalmente, similaridade do embedding)
+_similaridade_cache = os.environ.get("CACHE_RESPOSTAS_SIMILARIDADE")
+cache_respostas = CacheRespostas(
+    tamanho_maximo=int(os.environ.get("CACHE_RESPOSTAS_TAMANHO", "256")),
+    ttl_segundos=float(os.environ.get("CACHE_RESPOSTAS_TTL", "3600")),
+    similaridade_minima=float(_similaridade_cache) if _similaridade_cache else None,
+)
 
-        if not os.path.isdir(caminho_indice):
-            print(f"Erro: O diretório do índice '{caminho_indice}' não foi encontrado.")
-            return False
+# Perguntas iguais feitas ao mesmo tempo compartilham uma única geração (COALESCER_PERGUNTAS=0 desliga)
+COALESCER_PERGUNTAS = os.environ.get("COALESCER_PERGUNTAS", "1") != "0"
+coalescedor = Coalescedor()
+coalescedor_async = CoalescedorAsync()
 
-        print("Carregando índice FAISS...")
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        vectorstore = FAISS.load_local(caminho_indice, embeddings, allow_dangerous_deserialization=True)
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 8})
+# Vagas do Gemini por processo, com fila limitada e atendimento alternado entre usuários
+controle_llm = ControleAdmissao(
+    max_concorrentes=int(os.environ.get("LLM_MAX_CONCORRENTES", "8")),
+    fila_maxima=int(os.environ.get("LLM_FILA_MAXIMA", "32")),
+    fila_por_usuario=int(os.environ.get("LLM_FILA_POR_USUARIO", "4")),
+    espera_maxima=float(os.environ.get("LLM_ESPERA_MAXIMA_SEGUNDOS", "60")),
+)
+# Frames com a posição na fila: vão para o cliente, mas não para o cache nem para as métricas de tokens
+PREFIXO_FRAME_FILA = 'data: {"fila"'
+# Gerações simultâneas de um lote (POST /chat/batch), cada uma ocupando uma vaga do controle_llm
+LOTE_MAX_WORKERS = int(os.environ.get("LOTE_MAX_WORKERS", "4"))
+# Recuperação em duas etapas (RECUPERACAO_REORDENAR=1): candidatos buscados e trechos que seguem para o prompt
+REORDENACAO_CANDIDATOS = int(os.environ.get("REORDENACAO_CANDIDATOS", "50"))
+REORDENACAO_K = int(os.environ.get("REORDENACAO_K", "8"))
+# Índices no layout "secoes": seções de um mesmo artigo que podem ir para o prompt
+PAIS_SECOES_MAXIMAS = int(os.environ.get("PAIS_SECOES_MAXIMAS", "3"))
 
-        print("Criando a cadeia de QA com LCEL para retornar fontes...")
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", temperature=0.02, streaming=True)
-        
-        prompt_template = """Você é um assistente especializado em artigos técnicos do Grupo Boticário para orientação de franqueados.
+# Prompt do assistente (o recuo das linhas faz parte do texto enviado ao modelo)
+PROMPT_TEMPLATE = """Você é um assistente especializado em artigos técnicos do Grupo Boticário para orientação de franqueados.
         Analise TODA a pergunta do usuário e CONSOLIDE informações similares para otimizar TMA/TME.
         
         **REGRAS CRÍTICAS PARA CONSOLIDAÇÃO:**
@@ -128,23 +168,154 @@ def inicializar_chatbot():
 
         **Resposta Estruturada:**
         """
-        prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-
-        # Define a cadeia que formata o input para o LLM
-        rag_chain_from_docs = (
-            RunnablePassthrough.assign(context=(lambda x: format_docs(x["source_documents"])))
-            | prompt
-            | llm
-            | StrOutputParser()
-        )
-
-        # Define a cadeia final que recupera os documentos e depois chama a cadeia acima
-        qa_chain_cache = RunnableParallel(
-            {
-                "source_documents": retriever,
-                "question": RunnablePassthrough()
-            }
-        ).assign(answer=rag_chain_from_docs)
+
+def format_docs(docs):
+    """Função auxiliar para formatar os documentos recuperados em uma única string."""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+def montar_contexto_prompt(entrada):
+    """Monta o contexto do prompt e registra quantos tokens a montagem economizou."""
+    inicio = time.perf_counter()
+    contexto, estatisticas = montador_contexto(entrada["source_documents"], entrada.get("question"))
+    metricas.observar("montagem_contexto", time.perf_counter() - inicio)
+    metricas.CONTEXTO_TOKENS_ECONOMIZADOS.observe(max(0, estatisticas["tokens_originais"] - estatisticas["tokens_usados"]))
+    with _lock_metricas:
+        metricas_contexto["requisicoes"] += 1
+        metricas_contexto["tokens_originais"] += estatisticas["tokens_originais"]
+        metricas_contexto["tokens_usados"] += estatisticas["tokens_usados"]
+    return contexto
+
+def _carregar_indice(caminho_indice, embeddings):
+    """Carrega o índice FAISS (mapeado em memória quando possível), o BM25 e o índice de códigos."""
+    parametros = carregar_parametros(caminho_indice)
+    # Índices construídos com EMBEDDINGS_BACKEND=lsa trazem o próprio modelo, sem chamadas à API
+    embeddings = carregar_embeddings_locais(caminho_indice) or embeddings
+    vectorstore = carregar_vectorstore(caminho_indice, embeddings, parametros.get("tipo", "flat"))
+    # nprobe / efSearch salvos com o índice (ou FAISS_NPROBE / FAISS_EF_SEARCH) para índices IVF e HNSW
+    aplicar_parametros_busca(vectorstore.index, parametros)
+    # Busca híbrida: FAISS + BM25 (bm25.npz ao lado do índice) combinados por RRF
+    lexical = IndiceBM25.carregar(caminho_indice)
+    return {
+        "caminho": caminho_indice,
+        "vectorstore": vectorstore,
+        "lexical": lexical,
+        # Código do artigo -> ids do docstore, para responder perguntas que citam o código
+        "codigos": construir_indice_codigos(vectorstore),
+        "embeddings": embeddings,
+        # Arrays da segunda etapa da recuperação, montados uma vez por versão do índice
+        "reordenador": Reordenador.construir(vectorstore, lexical) if reordenacao_ativada() else None,
+        # Seção -> artigo (pais.npy) dos índices no layout "secoes"; None quando cada documento é um artigo
+        "pais": MapaPais.carregar(caminho_indice, vectorstore),
+    }
+
+def pre_carregar_indice():
+    """
+    Carrega o índice uma vez no master do gunicorn, antes do fork dos workers, sem criar
+    os clientes do Gemini (conexões gRPC não sobrevivem ao fork). Cada worker depois chama
+    `inicializar_chatbot`, que reaproveita o índice e compartilha as páginas com o master.
+    """
+    global indice_pre_carregado
+    versao, caminho_indice = versao_atual(CAMINHO_INDICE_PADRAO)
+    if caminho_indice is None:
+        return False
+    indice_pre_carregado = _carregar_indice(caminho_indice, None)
+    indice_pre_carregado["versao"] = versao
+    return True
+
+def _montar_cadeias(indice):
+    """Monta o retriever híbrido e as cadeias LCEL (com e sem recuperação) sobre um índice carregado."""
+    k = 8 if indice["reordenador"] is None else REORDENACAO_K
+    retriever = RetrieverHibrido(
+        vectorstore=indice["vectorstore"],
+        indice_lexical=indice["lexical"],
+        k=k,
+        # Com seções, cada artigo pode ocupar até PAIS_SECOES_MAXIMAS posições da busca
+        k_candidatos=max(20, k * PAIS_SECOES_MAXIMAS) if indice["pais"] is not None else 20,
+        modo=os.environ.get("RECUPERACAO_MODO", "hibrido"),
+        reordenador=indice["reordenador"],
+        k_reordenacao=REORDENACAO_CANDIDATOS,
+        pais=indice["pais"],
+        secoes_por_pai=PAIS_SECOES_MAXIMAS,
+    )
+    llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", temperature=0.02, streaming=True)
+    
+    prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["context", "question"])
+
+    # Define a cadeia que formata o input para o LLM
+    rag_chain_from_docs = (
+        RunnablePassthrough.assign(context=montar_contexto_prompt)
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+
+    # Define a cadeia final que recupera os documentos e depois chama a cadeia acima
+    qa_chain = RunnableParallel(
+        {
+            "source_documents": retriever,
+            "question": RunnablePassthrough()
+        }
+    ).assign(answer=rag_chain_from_docs)
+    return retriever, qa_chain, rag_chain_from_docs
+
+def _ativar_indice(indice, versao, duracao_carga):
+    """Publica o índice e as cadeias montadas sobre ele com uma única atribuição."""
+    global indice_ativo, qa_chain_cache, rag_chain_cache, vectorstore_cache, indice_codigos_cache, caminho_indice_cache
+    global embeddings_cache
+    retriever, qa_chain, rag_chain = _montar_cadeias(indice)
+    novo = {
+        "versao": versao,
+        "caminho": indice["caminho"],
+        "carregado_em": time.time(),
+        "duracao_carga_s": round(duracao_carga, 3),
+        "vectorstore": indice["vectorstore"],
+        "codigos": indice["codigos"],
+        "lexical": indice["lexical"],
+        "embeddings": indice["embeddings"],
+        "retriever": retriever,
+        "qa_chain": qa_chain,
+        "rag_chain": rag_chain,
+    }
+    indice_ativo = novo
+    embeddings_cache = novo["embeddings"]
+    metricas.registrar_indice(novo["vectorstore"], novo["caminho"])
+    qa_chain_cache, rag_chain_cache = qa_chain, rag_chain
+    vectorstore_cache, indice_codigos_cache, caminho_indice_cache = novo["vectorstore"], novo["codigos"], novo["caminho"]
+
+def inicializar_chatbot():
+    """
+    Carrega o índice FAISS e inicializa a cadeia de QA usando LCEL,
+    configurada para retornar a resposta e os documentos de origem.
+    """
+    global embeddings_google
+    try:
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            print("Erro: A chave de API do Google (GOOGLE_API_KEY) não foi definida.")
+            return False
+        genai.configure(api_key=api_key)
+
+        # A versão publicada em CAMINHO_INDICE_PADRAO/ATUAL (ou o índice antigo, salvo direto no diretório)
+        versao, caminho_indice = versao_atual(CAMINHO_INDICE_PADRAO)
+
+        if caminho_indice is None:
+            print(f"Erro: O diretório do índice '{CAMINHO_INDICE_PADRAO}' não foi encontrado.")
+            return False
+
+        print(f"Carregando índice FAISS (versão {versao})...")
+        inicio = time.perf_counter()
+        embeddings = criar_embeddings("models/embedding-001")
+        if indice_pre_carregado is not None and indice_pre_carregado["caminho"] == caminho_indice:
+            indice = indice_pre_carregado
+            if indice["embeddings"] is None:
+                indice["embeddings"] = indice["vectorstore"].embedding_function = embeddings
+        else:
+            indice = _carregar_indice(caminho_indice, embeddings)
+        embeddings_google = embeddings
+        cache_respostas.limpar()
+
+        print("Criando a cadeia de QA com LCEL para retornar fontes...")
+        _ativar_indice(indice, versao, time.perf_counter() - inicio)
         
         print("Chatbot inicializado com sucesso para streaming!")
         return True
@@ -153,48 +324,390 @@ def inicializar_chatbot():
         print(f"Ocorreu um erro durante a inicialização do chatbot: {e}")
         return False
 
-def get_chatbot_answer_stream(question):
+def recarregar_indice(forcar=False):
+    """
+    Carrega a versão publicada do índice, se for diferente da ativa, e troca o índice e as
+    cadeias de uma vez. Requisições em andamento terminam na versão antiga. Retorna True se trocou.
+    Erros de carga sobem para quem chamou; a versão antiga continua ativa.
+    """
+    if indice_ativo is None:
+        return False
+    with _lock_recarga:
+        versao, caminho_indice = versao_atual(CAMINHO_INDICE_PADRAO)
+        if caminho_indice is None or (not forcar and caminho_indice == indice_ativo["caminho"]):
+            return False
+        print(f"Recarregando o índice: versão {indice_ativo['versao']} -> {versao}")
+        inicio = time.perf_counter()
+        indice = _carregar_indice(caminho_indice, embeddings_google)
+        _ativar_indice(indice, versao, time.perf_counter() - inicio)
+        return True
+
+def obter_versao_indice():
+    """Versão ativa do índice, quando foi carregada e quanto tempo a carga levou."""
+    ativo = indice_ativo
+    if ativo is None:
+        return None
+    return {
+        "versao": ativo["versao"],
+        "caminho": ativo["caminho"],
+        "carregado_em": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ativo["carregado_em"])),
+        "duracao_carga_s": ativo["duracao_carga_s"],
+    }
+
+def pesquisar_artigos(consulta, pagina=1, por_pagina=10, modo=None):
+    """Só a recuperação, sem o LLM (GET /search). Retorna None se o índice não foi carregado."""
+    ativo = indice_ativo
+    if ativo is None:
+        return None
+    return pesquisar(ativo, consulta, pagina, por_pagina, modo or os.environ.get("PESQUISA_MODO", "auto"),
+                     embeddings_cache)
+
+def obter_estatisticas_fila():
+    """Retorna o estado da fila e das vagas do LLM deste processo."""
+    return controle_llm.estatisticas()
+
+def obter_estatisticas_cache():
+    """Retorna os contadores do cache de respostas e do cache de embeddings."""
+    estatisticas = {"respostas": cache_respostas.estatisticas(),
+                    "coalescencia": {"sync": coalescedor.estatisticas(), "async": coalescedor_async.estatisticas()}}
+    if hasattr(embeddings_cache, "estatisticas"):
+        estatisticas["embeddings"] = embeddings_cache.estatisticas()
+    return estatisticas
+
+def _embedding_para_cache(question):
+    """Calcula o embedding da pergunta apenas se a busca por similaridade estiver ativa."""
+    if cache_respostas.similaridade_minima is None or embeddings_cache is None:
+        return None
+    try:
+        return embeddings_cache.embed_query(question)
+    except Exception:
+        return None
+
+def registrar_rota(rota, tempo_ate_fontes=None):
+    """Registra a rota usada na resposta e o tempo até o envio das fontes."""
+    metricas.RESPOSTAS.labels(rota).inc()
+    with _lock_metricas:
+        metrica = metricas_rotas.setdefault(rota, {"requisicoes": 0, "tempo_ate_fontes_total_ms": 0.0})
+        metrica["requisicoes"] += 1
+        if tempo_ate_fontes is not None:
+            metrica["tempo_ate_fontes_total_ms"] += tempo_ate_fontes * 1000
+
+def obter_metricas_rotas():
+    """Retorna as requisições e o tempo médio até as fontes de cada rota, e a economia de tokens do contexto."""
+    with _lock_metricas:
+        metricas = {
+            rota: {
+                "requisicoes": metrica["requisicoes"],
+                "tempo_medio_ate_fontes_ms": round(metrica["tempo_ate_fontes_total_ms"] / metrica["requisicoes"], 3),
+            }
+            for rota, metrica in metricas_rotas.items()
+        }
+        metricas["contexto"] = {
+            **metricas_contexto,
+            "tokens_economizados": max(0, metricas_contexto["tokens_originais"] - metricas_contexto["tokens_usados"]),
+        }
+        return metricas
+
+def formatar_fontes(source_docs):
+    """Lista de fontes únicas (título e arquivo) enviada no primeiro frame SSE."""
+    unique_sources = []
+    seen_sources = set()
+    for doc in source_docs:
+        source_file = doc.metadata.get('source_file', 'Origem desconhecida')
+        if source_file not in seen_sources:
+            unique_sources.append({
+                "title": doc.metadata.get('article_title', 'N/A'),
+                "source_file": source_file
+            })
+            seen_sources.add(source_file)
+    return unique_sources
+
+def _frame_fila(posicao):
+    return "data: " + json.dumps({"fila": {"posicao": posicao}}) + "\n\n"
+
+def _frames_da_resposta(frames):
+    """Frames que entram no cache: sem os avisos de posição na fila."""
+    return [frame for frame in frames if not frame.startswith(PREFIXO_FRAME_FILA)]
+
+def _gerar_frames_resposta(question, ativo, usuario=None):
+    """
+    Recupera os documentos e gera os frames SSE com as fontes e os tokens da resposta.
+    Rota rápida: os artigos citados pelo código vão direto para o prompt, sem embedding nem busca.
+    O lugar na fila do LLM é reservado antes da recuperação (com a fila cheia, nada é feito);
+    a espera pela vaga, com os avisos de posição, fica entre as fontes e os tokens.
+    """
+    senha = controle_llm.entrar(usuario)
+    try:
+        inicio = time.perf_counter()
+        source_docs = buscar_por_codigos(question, ativo["codigos"], ativo["vectorstore"]) if ativo["codigos"] else []
+        rota = "codigo_artigo"
+        if not source_docs:
+            source_docs = ativo["retriever"].invoke(question)
+            rota = "busca"
+        registrar_rota(rota, time.perf_counter() - inicio)
+        yield "data: " + json.dumps({"sources": formatar_fontes(source_docs)}) + "\n\n"
+        for posicao in controle_llm.aguardar(senha):
+            yield _frame_fila(posicao)
+        for token in ativo["rag_chain"].stream({"source_documents": source_docs, "question": question}):
+            yield "data: " + json.dumps({"token": token}) + "\n\n"
+    finally:
+        controle_llm.sair(senha)
+
+def _chave_coalescencia(question, ativo):
+    """Mesma pergunta normalizada na mesma versão do índice; sem coalescência, cada requisição é única."""
+    return (ativo["caminho"], normalizar_pergunta(question)) if COALESCER_PERGUNTAS else object()
+
+def verificar_admissao(question, usuario):
+    """
+    Chamado pelo /chat antes de abrir o stream: None se a pergunta pode seguir, senão os
+    segundos do Retry-After do 429. Perguntas já no cache ou iguais a uma geração em
+    andamento não ocupam vaga do LLM e sempre passam.
+    """
+    ativo = indice_ativo
+    retry_after = controle_llm.verificar(usuario)
+    if retry_after is None or ativo is None or cache_respostas.contem(question):
+        return None
+    chave = _chave_coalescencia(question, ativo)
+    if coalescedor.em_andamento(chave) or coalescedor_async.em_andamento(chave):
+        return None
+    return retry_after
+
+def get_chatbot_answer_stream(question, usuario=None):
     """
     Recebe uma pergunta e retorna um gerador para a resposta e as fontes.
+    Respostas completas ficam no cache e são reenviadas com os mesmos frames SSE.
+    Perguntas iguais em andamento se inscrevem na mesma geração (`Coalescedor`).
+    `usuario` é a chave de justiça da fila do LLM (veja `autenticacao.usuario_da_requisicao`).
     """
-    if qa_chain_cache is None:
+    # Lido uma vez: uma recarga no meio do stream não troca o índice desta resposta
+    ativo = indice_ativo
+    if ativo is None:
         yield "data: " + json.dumps({"error": "O chatbot não foi inicializado corretamente." }) + "\n\n"
         return
 
+    # Um índice FAISS reconstruído invalida todas as respostas guardadas
+    cache_respostas.verificar_indice(assinatura_indice(ativo["caminho"]))
+    # O embedding (uma chamada à API) só é calculado se a pergunta exata não estiver no cache
+    embedding_pergunta = None
+    frames_cache = cache_respostas.buscar_exata(question)
+    if frames_cache is None:
+        embedding_pergunta = _embedding_para_cache(question)
+        frames_cache = cache_respostas.buscar(question, embedding_pergunta)
+    if frames_cache is not None:
+        registrar_rota("cache", 0.0)
+        yield from frames_cache
+        return
+
+    def guardar(frames):
+        # Uma resposta da versão antiga não entra no cache depois de uma recarga
+        if ativo is indice_ativo:
+            cache_respostas.guardar(question, _frames_da_resposta(frames), embedding_pergunta)
+
+    medicao = metricas.MedicaoStream()
+    desfecho = "desconectado"
     try:
-        stream = qa_chain_cache.stream(question)
-        
-        # O primeiro chunk pode conter as fontes e/ou o início da resposta
-        first_chunk = next(stream)
-        
-        source_docs = first_chunk.get("source_documents", [])
-        unique_sources = []
-        seen_sources = set()
-        for doc in source_docs:
-            source_file = doc.metadata.get('source_file', 'Origem desconhecida')
-            if source_file not in seen_sources:
-                unique_sources.append({
-                    "title": doc.metadata.get('article_title', 'N/A'),
-                    "source_file": source_file
-                })
-                seen_sources.add(source_file)
-        
-        # Envia as fontes primeiro
-        yield "data: " + json.dumps({"sources": unique_sources}) + "\n\n"
-
-        # Envia o primeiro pedaço da resposta, se houver
-        if 'answer' in first_chunk:
-            yield "data: " + json.dumps({"token": first_chunk['answer']}) + "\n\n"
-
-        # Continua enviando o resto da resposta em streaming
-        for chunk in stream:
-            if 'answer' in chunk:
-                yield "data: " + json.dumps({"token": chunk['answer']}) + "\n\n"
+        # `guardar` roda uma vez, no fim da geração e antes de a chave sair do coalescedor,
+        # então uma pergunta igual que chegue depois já encontra a resposta no cache
+        for frame in coalescedor.assinar(_chave_coalescencia(question, ativo),
+                                         lambda: _gerar_frames_resposta(question, ativo, usuario), guardar):
+            if not frame.startswith(PREFIXO_FRAME_FILA):
+                medicao.marcar_frame()
+            yield frame
+        desfecho = "ok"
+    except (FilaCheia, EsperaEsgotada) as e:
+        desfecho = "erro"
+        yield "data: " + json.dumps({"error": str(e)}) + "\n\n"
+    except Exception as e:
+        desfecho = "erro"
+        error_message = f"Ocorreu um erro ao processar a pergunta: {e}"
+        print(error_message)
+        yield "data: " + json.dumps({"error": error_message}) + "\n\n"
+        return
+    finally:
+        # Sem "ok" nem "erro", o gerador foi fechado no meio: o cliente desconectou
+        medicao.finalizar(desfecho)
+
+async def _agerar_frames_resposta(question, ativo, usuario=None):
+    """Versão assíncrona de `_gerar_frames_resposta`, usando `ainvoke` do retriever e `astream` do LLM."""
+    senha = controle_llm.entrar(usuario)
+    try:
+        inicio = time.perf_counter()
+        source_docs = buscar_por_codigos(question, ativo["codigos"], ativo["vectorstore"]) if ativo["codigos"] else []
+        rota = "codigo_artigo"
+        if not source_docs:
+            source_docs = await ativo["retriever"].ainvoke(question)
+            rota = "busca"
+        registrar_rota(rota, time.perf_counter() - inicio)
+        yield "data: " + json.dumps({"sources": formatar_fontes(source_docs)}) + "\n\n"
+        async for posicao in controle_llm.aaguardar(senha):
+            yield _frame_fila(posicao)
+        async for token in ativo["rag_chain"].astream({"source_documents": source_docs, "question": question}):
+            yield "data: " + json.dumps({"token": token}) + "\n\n"
+    finally:
+        controle_llm.sair(senha)
+
+async def get_chatbot_answer_astream(question, usuario=None):
+    """
+    Versão assíncrona de `get_chatbot_answer_stream` para o servidor ASGI (app_async.py):
+    os mesmos frames SSE, mas a espera pelo LLM não prende uma thread por conexão.
+    """
+    # Lido uma vez: uma recarga no meio do stream não troca o índice desta resposta
+    ativo = indice_ativo
+    if ativo is None:
+        yield "data: " + json.dumps({"error": "O chatbot não foi inicializado corretamente." }) + "\n\n"
+        return
+
+    cache_respostas.verificar_indice(assinatura_indice(ativo["caminho"]))
+    embedding_pergunta = None
+    frames_cache = cache_respostas.buscar_exata(question)
+    if frames_cache is None:
+        if cache_respostas.similaridade_minima is not None:
+            embedding_pergunta = await asyncio.to_thread(_embedding_para_cache, question)
+        frames_cache = cache_respostas.buscar(question, embedding_pergunta)
+    if frames_cache is not None:
+        registrar_rota("cache", 0.0)
+        for frame in frames_cache:
+            yield frame
+        return
+
+    def guardar(frames):
+        if ativo is indice_ativo:
+            cache_respostas.guardar(question, _frames_da_resposta(frames), embedding_pergunta)
 
+    medicao = metricas.MedicaoStream()
+    desfecho = "desconectado"
+    try:
+        async for frame in coalescedor_async.assinar(_chave_coalescencia(question, ativo),
+                                                     lambda: _agerar_frames_resposta(question, ativo, usuario),
+                                                     guardar):
+            if not frame.startswith(PREFIXO_FRAME_FILA):
+                medicao.marcar_frame()
+            yield frame
+        desfecho = "ok"
+    except (FilaCheia, EsperaEsgotada) as e:
+        desfecho = "erro"
+        yield "data: " + json.dumps({"error": str(e)}) + "\n\n"
     except Exception as e:
+        desfecho = "erro"
         error_message = f"Ocorreu um erro ao processar a pergunta: {e}"
         print(error_message)
         yield "data: " + json.dumps({"error": error_message}) + "\n\n"
+        return
+    finally:
+        medicao.finalizar(desfecho)
+
+def _resposta_dos_frames(frames):
+    """(resposta, fontes) de uma resposta guardada no cache como frames SSE."""
+    tokens, fontes = [], []
+    for frame in frames:
+        dados = json.loads(frame[len("data: "):])
+        if "sources" in dados:
+            fontes = dados["sources"]
+        elif "token" in dados:
+            tokens.append(dados["token"])
+    return "".join(tokens), fontes
+
+def _gerar_resposta_lote(question, source_docs, ativo, usuario):
+    """Uma geração do lote, sem streaming, dentro de uma vaga do LLM como as do /chat."""
+    while True:
+        try:
+            senha = controle_llm.entrar(usuario)
+            break
+        except FilaCheia as e:
+            # Ninguém espera o lote na tela: com a fila cheia, ele aguarda em vez de desistir
+            time.sleep(e.retry_after)
+    try:
+        for _ in controle_llm.aguardar(senha):
+            pass
+        return ativo["rag_chain"].invoke({"source_documents": source_docs, "question": question})
+    finally:
+        controle_llm.sair(senha)
+
+def responder_lote(perguntas, usuario=None, max_workers=None):
+    """
+    Responde várias perguntas de uma vez (POST /chat/batch e `python -m chatbot.lote`).
+    Retorna um gerador com um dicionário por pergunta, na ordem em que ficam prontas,
+    ou None se o índice não foi carregado.
+    """
+    ativo = indice_ativo
+    if ativo is None:
+        return None
+    return _gerar_lote(list(perguntas), ativo, usuario, max_workers or LOTE_MAX_WORKERS)
+
+def _gerar_lote(perguntas, ativo, usuario, max_workers):
+    inicio = time.perf_counter()
+    cache_respostas.verificar_indice(assinatura_indice(ativo["caminho"]))
+
+    def resultados(indices, rota, resposta=None, fontes=None, erro=None):
+        tempo_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        for indice in indices:
+            if erro is not None:
+                yield {"indice": indice, "question": perguntas[indice], "error": erro, "tempo_ms": tempo_ms}
+            else:
+                yield {"indice": indice, "question": perguntas[indice], "answer": resposta, "sources": fontes,
+                       "rota": rota, "tempo_ms": tempo_ms}
+
+    # Perguntas iguais (normalizadas) no mesmo lote são respondidas uma vez
+    grupos = {}
+    for indice, pergunta in enumerate(perguntas):
+        grupos.setdefault(normalizar_pergunta(pergunta), []).append(indice)
+    pendentes = []
+    for indices in grupos.values():
+        frames = cache_respostas.buscar(perguntas[indices[0]])
+        if frames is None:
+            pendentes.append(indices)
+            continue
+        registrar_rota("cache", 0.0)
+        yield from resultados(indices, "cache", *_resposta_dos_frames(frames))
+    if not pendentes:
+        return
+
+    # Rota do código do artigo para quem cita um código; as demais em uma única recuperação em lote
+    inicio_recuperacao = time.perf_counter()
+    documentos = [buscar_por_codigos(perguntas[indices[0]], ativo["codigos"], ativo["vectorstore"])
+                  if ativo["codigos"] else [] for indices in pendentes]
+    rotas = ["codigo_artigo" if docs else "busca" for docs in documentos]
+    sem_codigo = [posicao for posicao, docs in enumerate(documentos) if not docs]
+    erro_busca = None
+    if sem_codigo:
+        try:
+            encontrados = ativo["retriever"].buscar_em_lote([perguntas[pendentes[p][0]] for p in sem_codigo])
+            for posicao, docs in zip(sem_codigo, encontrados):
+                documentos[posicao] = docs
+        except Exception as e:
+            erro_busca = f"Ocorreu um erro ao processar a pergunta: {e}"
+    duracao_recuperacao = time.perf_counter() - inicio_recuperacao
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="lote-llm")
+    try:
+        futuros = {}
+        for posicao, indices in enumerate(pendentes):
+            if erro_busca is not None and rotas[posicao] == "busca":
+                yield from resultados(indices, "busca", erro=erro_busca)
+                continue
+            registrar_rota(rotas[posicao], duracao_recuperacao)
+            futuro = executor.submit(_gerar_resposta_lote, perguntas[indices[0]], documentos[posicao], ativo, usuario)
+            futuros[futuro] = posicao
+        for futuro in as_completed(futuros):
+            posicao = futuros[futuro]
+            indices, fontes = pendentes[posicao], formatar_fontes(documentos[posicao])
+            try:
+                resposta = futuro.result()
+            except Exception as e:
+                yield from resultados(indices, rotas[posicao],
+                                      erro=str(e) if isinstance(e, EsperaEsgotada)
+                                      else f"Ocorreu um erro ao processar a pergunta: {e}")
+                continue
+            # Guardada com os mesmos frames do /chat, que depois a reenvia do cache
+            if ativo is indice_ativo:
+                cache_respostas.guardar(perguntas[indices[0]], [
+                    "data: " + json.dumps({"sources": fontes}) + "\n\n",
+                    "data: " + json.dumps({"token": resposta}) + "\n\n",
+                ])
+            yield from resultados(indices, rotas[posicao], resposta, fontes)
+    finally:
+        # Cliente desconectado: as gerações que ainda não começaram são canceladas
+        executor.shutdown(wait=False, cancel_futures=True)
 
 # Bloco de teste atualizado
 if __name__ == '__main__':
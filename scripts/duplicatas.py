@@ -0,0 +1,208 @@
+"""
+Detecção de artigos quase iguais (MinHash + LSH) para a base gerada pelos scripts de
+processamento. O mesmo procedimento aparece em várias seções e PDFs com códigos
+diferentes; cada grupo de quase iguais vira uma linha só, a mais completa, com os
+códigos das outras em `codigos_alias` ("7501;7502").
+
+Cada texto vira o conjunto dos seus shingles (sequências de TAMANHO_SHINGLE palavras) e
+uma assinatura MinHash de DEDUP_PERMUTACOES inteiros. A assinatura é dividida em
+DEDUP_BANDAS faixas; textos com uma faixa igual são candidatos e só viram duplicatas se
+a similaridade de Jaccard estimada pela assinatura for pelo menos DEDUP_LIMIAR. Tudo é
+numpy em lotes e um dicionário por faixa (pd.factorize), linear no número de linhas.
+Os lotes são medidos em shingles, não em linhas: a matriz hashes x shingles de um lote
+fica em torno de ELEMENTOS_POR_LOTE inteiros de 64 bits mesmo com artigos longos.
+
+Uso avulso sobre um export: python scripts/duplicatas.py entrada.csv [saida.csv]
+"""
+import os
+import re
+import sys
+import time
+import zlib
+import itertools
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_SHINGLE = 5
+# Similaridade de Jaccard mínima entre os shingles (DEDUP_LIMIAR; 1 ou mais desliga a deduplicação)
+LIMIAR_PADRAO = float(os.environ.get('DEDUP_LIMIAR', '0.7'))
+PERMUTACOES = int(os.environ.get('DEDUP_PERMUTACOES', '64'))
+BANDAS = int(os.environ.get('DEDUP_BANDAS', '16'))
+# Elementos da matriz (hashes x shingles) calculada de uma vez: 4M x 8 bytes = 32 MB. Um lote junta
+# textos até ELEMENTOS_POR_LOTE / PERMUTACOES shingles; um texto maior que isso é calculado sozinho,
+# em blocos de funções de hash
+ELEMENTOS_POR_LOTE = 4_000_000
+
+_PALAVRA = re.compile(r'\w+')
+
+
+class Assinador:
+    """Assinaturas MinHash dos textos, com as funções de hash sorteadas por uma semente fixa."""
+
+    def __init__(self, permutacoes=PERMUTACOES, semente=1):
+        aleatorio = np.random.default_rng(semente)
+        # Hash multiplica-e-desloca: (a * x + b) mod 2^64, bits altos; a ímpar
+        self.a = aleatorio.integers(1, 1 << 63, permutacoes, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = aleatorio.integers(0, 1 << 63, permutacoes, dtype=np.uint64)
+        # Mistura as palavras de um shingle em um hash só, posição por posição
+        self.pesos_posicao = aleatorio.integers(1, 1 << 63, TAMANHO_SHINGLE, dtype=np.uint64) | np.uint64(1)
+        self.hash_palavras = {}
+
+    def _palavras(self, texto):
+        """Hash de cada palavra do texto, com pelo menos TAMANHO_SHINGLE posições (completa com zeros)."""
+        hash_palavras = self.hash_palavras
+        hashes = [hash_palavras.get(p) or hash_palavras.setdefault(p, zlib.crc32(p.encode()) | 1)
+                  for p in _PALAVRA.findall(texto.lower())]
+        return hashes + [0] * (TAMANHO_SHINGLE - len(hashes))
+
+    def shingles(self, textos):
+        """Hashes de 64 bits dos shingles de vários textos, concatenados, e onde começa cada texto."""
+        return self._shingles([self._palavras(texto) for texto in textos])
+
+    def _shingles(self, palavras):
+        tamanhos = np.fromiter(map(len, palavras), dtype=np.int64, count=len(palavras))
+        hashes = np.fromiter(itertools.chain.from_iterable(palavras), dtype=np.uint64, count=int(tamanhos.sum()))
+        janelas = np.lib.stride_tricks.sliding_window_view(hashes, TAMANHO_SHINGLE)
+        # Multiplicação e soma em uint64 com estouro: um hash por janela de palavras
+        combinados = (janelas * self.pesos_posicao).sum(axis=1, dtype=np.uint64)
+        # Só as janelas inteiras dentro de um texto
+        por_texto = tamanhos - TAMANHO_SHINGLE + 1
+        inicios = np.cumsum(tamanhos) - tamanhos
+        validas = np.repeat(inicios - np.cumsum(np.r_[0, por_texto[:-1]]), por_texto) + np.arange(por_texto.sum())
+        return combinados[validas], np.cumsum(np.r_[0, por_texto[:-1]])
+
+    def _assinar_lote(self, palavras, destino, elementos):
+        shingles, offsets = self._shingles(palavras)
+        # Funções de hash por bloco: todas de uma vez, a não ser num texto longo demais para o lote
+        por_bloco = max(1, elementos // len(shingles))
+        for inicio in range(0, len(self.a), por_bloco):
+            # Uma linha por função de hash: o mínimo de cada texto é sobre um trecho contíguo da linha.
+            # As operações no lugar evitam uma segunda matriz do mesmo tamanho
+            permutados = self.a[inicio:inicio + por_bloco, None] * shingles
+            permutados += self.b[inicio:inicio + por_bloco, None]
+            permutados >>= np.uint64(32)
+            destino[:, inicio:inicio + por_bloco] = np.minimum.reduceat(permutados, offsets, axis=1).T
+
+    def assinar(self, textos, elementos_por_lote=None):
+        """Matriz (len(textos), permutações) uint32 com o mínimo de cada hash sobre os shingles de cada texto."""
+        assinaturas = np.empty((len(textos), len(self.a)), dtype=np.uint32)
+        elementos = elementos_por_lote or ELEMENTOS_POR_LOTE
+        shingles_por_lote = max(1, elementos // len(self.a))
+        inicio, palavras, shingles = 0, [], 0
+        for i, texto in enumerate(textos):
+            palavras.append(self._palavras(texto))
+            shingles += len(palavras[-1]) - TAMANHO_SHINGLE + 1
+            if shingles >= shingles_por_lote or i == len(textos) - 1:
+                self._assinar_lote(palavras, assinaturas[inicio:i + 1], elementos)
+                inicio, palavras, shingles = i + 1, [], 0
+        return assinaturas
+
+
+def _raiz(pais, i):
+    while pais[i] != i:
+        pais[i] = pais[pais[i]]
+        i = pais[i]
+    return i
+
+
+def agrupar_quase_iguais(textos, limiar=None, bandas=BANDAS, assinador=None):
+    """
+    Retorna, para cada texto, o índice do primeiro texto do seu grupo de quase iguais
+    (ele mesmo quando não tem duplicata). Pares candidatos vêm das faixas do LSH e são
+    confirmados pela fração de posições iguais das assinaturas.
+    """
+    limiar = LIMIAR_PADRAO if limiar is None else limiar
+    n = len(textos)
+    pais = list(range(n))
+    if n < 2 or limiar >= 1:
+        return np.arange(n)
+    assinaturas = (assinador or Assinador()).assinar(textos)
+    linhas_por_banda = assinaturas.shape[1] // bandas
+    multiplicadores = np.random.default_rng(2).integers(1, 1 << 63, linhas_por_banda, dtype=np.uint64) | np.uint64(1)
+    for banda in range(bandas):
+        faixa = assinaturas[:, banda * linhas_por_banda:(banda + 1) * linhas_por_banda].astype(np.uint64)
+        chaves = (faixa * multiplicadores).sum(axis=1, dtype=np.uint64)
+        # Os códigos saem na ordem da primeira ocorrência: o primeiro de cada balde é onde o código é novo
+        codigos, _ = pd.factorize(chaves)
+        novos = np.empty(n, dtype=bool)
+        novos[0] = True
+        novos[1:] = codigos[1:] > np.maximum.accumulate(codigos)[:-1]
+        primeiros = np.flatnonzero(novos)[codigos]
+        candidatos = np.flatnonzero(primeiros != np.arange(n))
+        if not len(candidatos):
+            continue
+        similaridades = (assinaturas[candidatos] == assinaturas[primeiros[candidatos]]).mean(axis=1)
+        for i, j in zip(candidatos[similaridades >= limiar], primeiros[candidatos[similaridades >= limiar]]):
+            raiz_i, raiz_j = _raiz(pais, int(i)), _raiz(pais, int(j))
+            if raiz_i != raiz_j:
+                pais[max(raiz_i, raiz_j)] = min(raiz_i, raiz_j)
+    return np.array([_raiz(pais, i) for i in range(n)])
+
+
+def _separar_aliases(valor):
+    return [codigo for codigo in str(valor).split(";") if codigo] if pd.notna(valor) else []
+
+
+def deduplicar_quase_iguais(df, limiar=None, coluna_texto='texto_para_busca'):
+    """
+    Mantém uma linha por grupo de quase iguais, a de texto mais longo, com os outros
+    códigos do grupo em `codigos_alias`. Retorna (DataFrame, estatísticas da redução).
+    """
+    inicio = time.perf_counter()
+    df = df.reset_index(drop=True)
+    textos = df[coluna_texto].astype(str).tolist()
+    grupos = agrupar_quase_iguais(textos, limiar)
+    tamanhos = np.fromiter((len(texto) for texto in textos), dtype=np.int64, count=len(textos))
+
+    # Canônica: o maior texto do grupo; no empate, a primeira linha
+    ordem = np.lexsort((np.arange(len(df)), -tamanhos, grupos))
+    canonicas = np.sort(ordem[np.r_[True, grupos[ordem][1:] != grupos[ordem][:-1]]]) if len(df) else ordem
+    canonica_do_grupo = np.empty(len(df), dtype=np.int64)
+    canonica_do_grupo[grupos[canonicas]] = canonicas
+    canonica_de = canonica_do_grupo[grupos]
+
+    # Códigos das linhas removidas (e os aliases que elas já tinham, de uma deduplicação anterior)
+    codigos = df['codigo_artigo'].astype(str).tolist()
+    anteriores = df['codigos_alias'].tolist() if 'codigos_alias' in df else [None] * len(df)
+    aliases = {int(i): _separar_aliases(anteriores[i]) for i in canonicas}
+    for i in np.flatnonzero(canonica_de != np.arange(len(df))):
+        canonica = int(canonica_de[i])
+        for codigo in [codigos[i]] + _separar_aliases(anteriores[i]):
+            if codigo.isdigit() and codigo != codigos[canonica] and codigo not in aliases[canonica]:
+                aliases[canonica].append(codigo)
+
+    resultado = df.iloc[canonicas].copy()
+    resultado['codigos_alias'] = [";".join(aliases[int(i)]) for i in canonicas]
+    estatisticas = {
+        'linhas_antes': len(df),
+        'linhas_depois': len(resultado),
+        'grupos_com_duplicatas': int(np.count_nonzero(np.bincount(grupos, minlength=len(df)) > 1)) if len(df) else 0,
+        'caracteres_antes': int(tamanhos.sum()),
+        'caracteres_depois': int(tamanhos[canonicas].sum()),
+        'segundos': time.perf_counter() - inicio,
+    }
+    return resultado, estatisticas
+
+
+def resumo(estatisticas):
+    """Linha de log com a redução do índice: cada linha removida é um vetor a menos no FAISS."""
+    antes, depois = estatisticas['linhas_antes'], estatisticas['linhas_depois']
+    removidas = antes - depois
+    texto_removido = estatisticas['caracteres_antes'] - estatisticas['caracteres_depois']
+    return (f"{removidas} quase duplicatas removidas em {estatisticas['grupos_com_duplicatas']} grupos: "
+            f"{antes} -> {depois} artigos ({removidas / max(antes, 1):.1%} a menos no índice), "
+            f"{texto_removido / 1e6:.1f} MB de texto a menos, em {estatisticas['segundos']:.1f}s")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Uso: python scripts/duplicatas.py entrada.csv [saida.csv]")
+        sys.exit(1)
+    entrada = sys.argv[1]
+    saida = sys.argv[2] if len(sys.argv) > 2 else entrada
+    df_entrada = pd.read_csv(entrada, dtype={'codigo_artigo': str, 'codigos_alias': str}).dropna(subset=['texto_para_busca'])
+    df_saida, estatisticas_dedup = deduplicar_quase_iguais(df_entrada)
+    df_saida.to_csv(saida, index=False, encoding='utf-8-sig')
+    print(resumo(estatisticas_dedup))
+    print(f"Salvo em: {saida}")
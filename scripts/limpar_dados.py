@@ -1,9 +1,100 @@
 import pandas as pd
 import os
+import sys
+import csv
+from multiprocessing import Pool
 from bs4 import BeautifulSoup
 import re
 
-def limpar_e_estruturar_csv():
+COLUNAS_SAIDA = ['codigo_artigo', 'titulo_artigo', 'texto_para_busca', 'html_original']
+
+def escolher_parser():
+    """
+    Usa o lxml quando estiver instalado (bem mais rápido que o html.parser
+    em Python puro). A variável LIMPEZA_PARSER força um parser específico.
+    """
+    parser = os.environ.get('LIMPEZA_PARSER')
+    if parser:
+        return parser
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+def encontrar_html(valor_3, valor_0):
+    """Lógica para encontrar o conteúdo HTML na coluna '3' ou '0'."""
+    if isinstance(valor_3, str) and '<p>' in valor_3:
+        return valor_3
+    if isinstance(valor_0, str) and '<p>' in valor_0:
+        return valor_0
+    return None
+
+def extrair_registro(html_content, parser='html.parser'):
+    """Extrai código, título e texto de busca de um artigo em HTML."""
+    soup = BeautifulSoup(html_content, parser)
+
+    # Extrai todo o texto visível do HTML para a busca da IA
+    texto_para_busca = soup.get_text(separator=' ', strip=True)
+
+    # Tenta extrair um título (procura por tags de cabeçalho ou a primeira tag strong)
+    titulo_artigo = soup.find(['h1', 'h2', 'h3', 'strong'])
+    titulo_artigo = titulo_artigo.get_text(strip=True) if titulo_artigo else "Título não encontrado"
+    
+    # Tenta extrair um código de artigo (procura por um número de 4+ dígitos seguido por '-')
+    codigo_match = re.search(r'(\d{4,})\s*-', texto_para_busca)
+    codigo_artigo = codigo_match.group(1) if codigo_match else "Código não encontrado"
+
+    return {
+        'codigo_artigo': codigo_artigo,
+        'titulo_artigo': titulo_artigo,
+        'texto_para_busca': texto_para_busca,
+        'html_original': html_content # Mantemos o original para referência, se necessário
+    }
+
+def _extrair_registro_worker(argumentos):
+    return extrair_registro(*argumentos)
+
+def limpar_csv_streaming(caminho_entrada, caminho_saida, tamanho_chunk=5000, workers=None, parser=None):
+    """
+    Lê o CSV bruto em blocos, processa o HTML de cada bloco em um pool de
+    processos e grava as linhas limpas à medida que ficam prontas. A memória
+    usada depende do tamanho do bloco, não do tamanho do arquivo.
+    Retorna a quantidade de linhas gravadas.
+    """
+    parser = parser or escolher_parser()
+    workers = workers or os.cpu_count() or 1
+    total_gravadas = 0
+
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        with open(caminho_saida, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUNAS_SAIDA)
+            writer.writeheader()
+
+            # Lê as colunas como string para evitar erros de tipo
+            blocos = pd.read_csv(caminho_entrada, dtype={'0': str, '3': str},
+                                 usecols=lambda coluna: coluna in ('0', '3'), chunksize=tamanho_chunk)
+            for bloco in blocos:
+                coluna_3 = bloco['3'] if '3' in bloco else [None] * len(bloco)
+                coluna_0 = bloco['0'] if '0' in bloco else [None] * len(bloco)
+                htmls = [html for html in map(encontrar_html, coluna_3, coluna_0) if html]
+                argumentos = [(html, parser) for html in htmls]
+                if pool is not None:
+                    registros = pool.map(_extrair_registro_worker, argumentos, chunksize=max(1, len(argumentos) // (workers * 4)))
+                else:
+                    registros = map(_extrair_registro_worker, argumentos)
+                for registro in registros:
+                    writer.writerow(registro)
+                    total_gravadas += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return total_gravadas
+
+def limpar_e_estruturar_csv(workers=None):
     """
     Lê o CSV bruto, extrai e limpa os dados da coluna de HTML, 
     e salva um novo CSV estruturado.
@@ -13,64 +104,30 @@ def limpar_e_estruturar_csv():
     caminho_csv_limpo = os.path.join(project_root, 'web_app', 'base_conhecimento_limpa.csv')
 
     print(f"Lendo o arquivo de dados brutos: {caminho_csv_bruto}")
-    try:
-        # Lê as colunas como string para evitar erros de tipo
-        df = pd.read_csv(caminho_csv_bruto, dtype={ '0': str, '3': str })
-    except FileNotFoundError:
+    if not os.path.exists(caminho_csv_bruto):
         print(f"Erro: Arquivo não encontrado. Verifique o caminho: {caminho_csv_bruto}")
         return
 
-    print("Iniciando processo de limpeza e estruturação dos dados...")
-
-    resultados = []
-
-    for index, row in df.iterrows():
-        # Lógica para encontrar o conteúdo HTML na coluna '3' ou '0'
-        html_content = None
-        if isinstance(row.get('3'), str) and '<p>' in row.get('3', ''):
-            html_content = row['3']
-        elif isinstance(row.get('0'), str) and '<p>' in row.get('0', ''):
-            html_content = row['0']
-        
-        # Pula a linha se nenhum conteúdo HTML for encontrado
-        if not html_content:
-            continue
-
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        # Extrai todo o texto visível do HTML para a busca da IA
-        texto_para_busca = soup.get_text(separator=' ', strip=True)
-
-        # Tenta extrair um título (procura por tags de cabeçalho ou a primeira tag strong)
-        titulo_artigo = soup.find(['h1', 'h2', 'h3', 'strong'])
-        titulo_artigo = titulo_artigo.get_text(strip=True) if titulo_artigo else "Título não encontrado"
-        
-        # Tenta extrair um código de artigo (procura por um número de 4+ dígitos seguido por '-')
-        codigo_match = re.search(r'(\d{4,})\s*-', texto_para_busca)
-        codigo_artigo = codigo_match.group(1) if codigo_match else "Código não encontrado"
-
-        resultados.append({
-            'codigo_artigo': codigo_artigo,
-            'titulo_artigo': titulo_artigo,
-            'texto_para_busca': texto_para_busca,
-            'html_original': html_content # Mantemos o original para referência, se necessário
-        })
-
-    if not resultados:
-        print("Nenhum dado válido foi extraído. O arquivo CSV limpo não será criado.")
-        return
-
-    df_limpo = pd.DataFrame(resultados)
-
-    print(f"Processo concluído. {len(df_limpo)} linhas de dados limpos foram geradas.")
+    print(f"Iniciando processo de limpeza e estruturação dos dados (parser: {escolher_parser()})...")
 
     try:
-        df_limpo.to_csv(caminho_csv_limpo, index=False, encoding='utf-8-sig')
-        print("-" * 50)
-        print(f"SUCESSO! Arquivo limpo e estruturado salvo em: {caminho_csv_limpo}")
-        print("-" * 50)
+        total = limpar_csv_streaming(caminho_csv_bruto, caminho_csv_limpo, workers=workers)
     except Exception as e:
         print(f"Erro ao salvar o arquivo CSV limpo: {e}")
+        return
+
+    if not total:
+        os.remove(caminho_csv_limpo)
+        print("Nenhum dado válido foi extraído. O arquivo CSV limpo não será criado.")
+        return
+
+    print(f"Processo concluído. {total} linhas de dados limpos foram geradas.")
+    print("-" * 50)
+    print(f"SUCESSO! Arquivo limpo e estruturado salvo em: {caminho_csv_limpo}")
+    print("-" * 50)
 
 if __name__ == '__main__':
-    limpar_e_estruturar_csv()
+    workers = None
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
+    limpar_e_estruturar_csv(workers)
@@ -1,97 +1,192 @@
 import os
 import pandas as pd
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfReader
 import re
 
+from duplicatas import deduplicar_quase_iguais, resumo
+
+# Quantidade de páginas extraídas por tarefa no modo paralelo
+PAGINAS_POR_TAREFA = 20
+
+def gerar_paginas(pdf_path, inicio=0, fim=None):
+    """
+    Gera o texto das páginas [inicio, fim) de um PDF, uma de cada vez, já com o cabeçalho
+    "--- PÁGINA n ---". Páginas vazias são ignoradas.
+    """
+    reader = PdfReader(pdf_path)
+    fim = len(reader.pages) if fim is None else min(fim, len(reader.pages))
+    for page_num in range(inicio, fim):
+        texto_pagina = reader.pages[page_num].extract_text()
+        if texto_pagina and texto_pagina.strip():
+            yield f"\n--- PÁGINA {page_num + 1} ---\n" + texto_pagina
+
+def extrair_paginas(pdf_path, inicio=0, fim=None):
+    """Lista das páginas de uma faixa, para as tarefas do pool (o resultado volta serializado)."""
+    return list(gerar_paginas(pdf_path, inicio, fim))
+
+def iterar_paginas_pdf(pdf_path):
+    """Gera o texto de cada página de um PDF, sem montar o documento inteiro em memória."""
+    yield from gerar_paginas(pdf_path)
+
+def iterar_paginas_paralelo(arquivos_pdf, executor, paginas_por_tarefa=PAGINAS_POR_TAREFA, max_pendentes=None,
+                            max_paginas=None):
+    """
+    Extrai as páginas de vários PDFs em paralelo, dividindo cada arquivo em faixas
+    de páginas. Gera (pdf_path, texto_pagina) na ordem original dos arquivos e das
+    páginas, mantendo no máximo `max_pendentes` faixas em andamento.
+    """
+    tarefas = []
+    for pdf_path in arquivos_pdf:
+        try:
+            total_paginas = len(PdfReader(pdf_path).pages)
+            if max_paginas is not None:
+                total_paginas = min(total_paginas, max_paginas)
+        except Exception as e:
+            print(f"Erro ao processar {pdf_path}: {e}")
+            continue
+        for inicio in range(0, total_paginas, paginas_por_tarefa):
+            tarefas.append((pdf_path, inicio, min(inicio + paginas_por_tarefa, total_paginas)))
+
+    max_pendentes = max_pendentes or getattr(executor, '_max_workers', 4) * 2
+    pendentes = deque()
+    proxima = 0
+    while proxima < len(tarefas) or pendentes:
+        while proxima < len(tarefas) and len(pendentes) < max_pendentes:
+            pdf_path, inicio, fim = tarefas[proxima]
+            pendentes.append((pdf_path, inicio, fim, executor.submit(extrair_paginas, pdf_path, inicio, fim)))
+            proxima += 1
+        pdf_path, inicio, fim, futuro = pendentes.popleft()
+        try:
+            paginas = futuro.result()
+        except Exception as e:
+            # Uma faixa perdida deixaria a base sem esses artigos sem ninguém perceber:
+            # tenta de novo no processo atual e, se falhar outra vez, interrompe o processamento
+            print(f"Erro ao extrair as páginas {inicio + 1}-{fim} de {pdf_path} no pool: {e}. Tentando de novo...")
+            try:
+                paginas = extrair_paginas(pdf_path, inicio, fim)
+            except Exception as e:
+                raise RuntimeError(f"Falha ao extrair as páginas {inicio + 1}-{fim} de {pdf_path}: {e}") from e
+        for texto_pagina in paginas:
+            yield pdf_path, texto_pagina
+
 def extrair_texto_estruturado_pdf(pdf_path):
     """
     Extrai texto estruturado dos PDFs dos artigos do SalesForce
     com foco em máxima precisão para orientações de franqueados
     """
     try:
-        reader = PdfReader(pdf_path)
-        texto_completo = ""
-        
-        for page_num, page in enumerate(reader.pages):
-            texto_pagina = page.extract_text()
-            if texto_pagina.strip():
-                texto_completo += f"\n--- PÁGINA {page_num + 1} ---\n"
-                texto_completo += texto_pagina
-        
-        return texto_completo
+        return "".join(iterar_paginas_pdf(pdf_path))
     except Exception as e:
         print(f"Erro ao processar {pdf_path}: {e}")
         return None
 
+# Padrões para identificar códigos de artigo
+PADROES_CODIGO = [
+    r'(?:Código|CÓDIGO).*?(\d{3,5})',
+    r'(?:Artigo|ARTIGO).*?(\d{3,5})',
+    r'(?:CSF|Tech).*?(\d{3,5})'
+]
+
+# Padrões para identificar títulos
+PADROES_TITULO = [
+    r'(?:Título|TÍTULO)[:\-\s]+([^\n\r]{10,100})',
+    r'(?:Como|COMO)\s+([^\n\r]{10,100})',
+    r'(?:Procedimento|PROCEDIMENTO)[:\-\s]+([^\n\r]{10,100})'
+]
+
+# Divide o texto em seções; cada página começa com "--- PÁGINA", então uma seção nunca cruza páginas
+PADRAO_SECAO = re.compile(r'(?=\n--- PÁGINA|\n\d+\.|\nArtigo|\nCódigo)')
+
+def estruturar_secao(secao, pdf_path):
+    """Extrai código, título e texto de busca de uma seção, ou None se ela não tiver conteúdo suficiente."""
+    if len(secao.strip()) < 50:  # Ignorar seções muito pequenas
+        return None
+        
+    # Extrair código do artigo
+    codigo_artigo = "Não Encontrado"
+    for padrao in PADROES_CODIGO:
+        match = re.search(padrao, secao, re.IGNORECASE)
+        if match:
+            codigo_artigo = match.group(1)
+            break
+    
+    # Extrair título
+    titulo_artigo = "Não Encontrado"
+    for padrao in PADROES_TITULO:
+        match = re.search(padrao, secao, re.IGNORECASE)
+        if match:
+            titulo_artigo = match.group(1).strip()
+            break
+    
+    # Se não encontrou título por padrão, pegar primeira linha significativa
+    if titulo_artigo == "Não Encontrado":
+        linhas = [l.strip() for l in secao.split('\n') if l.strip() and len(l.strip()) > 10]
+        if linhas:
+            titulo_artigo = linhas[0][:100]
+    
+    # Texto para busca (limpeza básica)
+    texto_busca = re.sub(r'\s+', ' ', secao).strip()
+    texto_busca = re.sub(r'[^\w\s\-\.\,\:\;\!\?\(\)]', '', texto_busca)
+    
+    if len(texto_busca) <= 100:  # Só incluir se tiver conteúdo suficiente
+        return None
+    return {
+        'codigo_artigo': codigo_artigo,
+        'titulo_artigo': titulo_artigo,
+        'texto_para_busca': texto_busca,
+        'fonte_arquivo': os.path.basename(pdf_path)
+    }
+
+def estruturar_artigos_stream(paginas, pdf_path):
+    """
+    Versão em streaming de `estruturar_artigos_salesforce`: consome o texto
+    página a página e gera os artigos conforme são encontrados.
+    """
+    for texto_pagina in paginas:
+        for secao in PADRAO_SECAO.split(texto_pagina):
+            artigo = estruturar_secao(secao, pdf_path)
+            if artigo:
+                yield artigo
+
 def estruturar_artigos_salesforce(texto, pdf_path):
     """
     Estrutura o texto extraído identificando artigos específicos do SalesForce
     """
-    artigos = []
-    
-    # Padrões para identificar códigos de artigo
-    padroes_codigo = [
-        r'(?:Código|CÓDIGO).*?(\d{3,5})',
-        r'(?:Artigo|ARTIGO).*?(\d{3,5})',
-        r'(?:CSF|Tech).*?(\d{3,5})'
-    ]
-    
-    # Padrões para identificar títulos
-    padroes_titulo = [
-        r'(?:Título|TÍTULO)[:\-\s]+([^\n\r]{10,100})',
-        r'(?:Como|COMO)\s+([^\n\r]{10,100})',
-        r'(?:Procedimento|PROCEDIMENTO)[:\-\s]+([^\n\r]{10,100})'
-    ]
-    
-    # Dividir texto em seções
-    secoes = re.split(r'(?=\n--- PÁGINA|\n\d+\.|\nArtigo|\nCódigo)', texto)
-    
-    for secao in secoes:
-        if len(secao.strip()) < 50:  # Ignorar seções muito pequenas
-            continue
-            
-        # Extrair código do artigo
-        codigo_artigo = "Não Encontrado"
-        for padrao in padroes_codigo:
-            match = re.search(padrao, secao, re.IGNORECASE)
-            if match:
-                codigo_artigo = match.group(1)
-                break
-        
-        # Extrair título
-        titulo_artigo = "Não Encontrado"
-        for padrao in padroes_titulo:
-            match = re.search(padrao, secao, re.IGNORECASE)
-            if match:
-                titulo_artigo = match.group(1).strip()
-                break
-        
-        # Se não encontrou título por padrão, pegar primeira linha significativa
-        if titulo_artigo == "Não Encontrado":
-            linhas = [l.strip() for l in secao.split('\n') if l.strip() and len(l.strip()) > 10]
-            if linhas:
-                titulo_artigo = linhas[0][:100]
-        
-        # Texto para busca (limpeza básica)
-        texto_busca = re.sub(r'\s+', ' ', secao).strip()
-        texto_busca = re.sub(r'[^\w\s\-\.\,\:\;\!\?\(\)]', '', texto_busca)
-        
-        if len(texto_busca) > 100:  # Só incluir se tiver conteúdo suficiente
-            artigos.append({
-                'codigo_artigo': codigo_artigo,
-                'titulo_artigo': titulo_artigo,
-                'texto_para_busca': texto_busca,
-                'fonte_arquivo': os.path.basename(pdf_path)
-            })
-    
-    return artigos
+    return list(estruturar_artigos_stream([texto], pdf_path))
+
+def _artigos_serial(arquivos_pdf):
+    """Gera (pdf_path, artigo) arquivo por arquivo, página a página, no processo atual."""
+    for i, pdf_path in enumerate(arquivos_pdf, 1):
+        print(f"\n📄 Processando [{i}/{len(arquivos_pdf)}]: {os.path.basename(pdf_path)}")
+        try:
+            for artigo in estruturar_artigos_stream(iterar_paginas_pdf(pdf_path), pdf_path):
+                yield pdf_path, artigo
+        except Exception as e:
+            print(f"Erro ao processar {pdf_path}: {e}")
+            print(f"❌ FALHA ao extrair texto de {os.path.basename(pdf_path)}")
+
+def _artigos_paralelo(arquivos_pdf, workers):
+    """Extrai as páginas de todos os arquivos em um pool de processos e gera (pdf_path, artigo) em streaming."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        arquivo_atual = None
+        for pdf_path, texto_pagina in iterar_paginas_paralelo(arquivos_pdf, executor):
+            if pdf_path != arquivo_atual:
+                arquivo_atual = pdf_path
+                print(f"\n📄 Processando: {os.path.basename(pdf_path)}")
+            for artigo in estruturar_artigos_stream([texto_pagina], pdf_path):
+                yield pdf_path, artigo
 
-def processar_pdfs_precisao_maxima():
+def processar_pdfs_precisao_maxima(workers=None):
     """
     Processa PDFs dos artigos SalesForce com foco em precisão máxima
-    para orientações críticas de franqueados
+    para orientações críticas de franqueados. Com `workers` > 1 as páginas
+    são extraídas em paralelo por um pool de processos.
     """
+    if workers is None:
+        workers = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     pasta_documentos = os.path.join(project_root, 'chatbot', 'documentos')
     caminho_saida = os.path.join(project_root, 'web_app', 'base_conhecimento_precisao.csv')
@@ -113,18 +208,28 @@ def processar_pdfs_precisao_maxima():
     
     todos_artigos = []
     
-    for i, pdf_path in enumerate(arquivos_pdf, 1):
-        print(f"\n📄 Processando [{i}/{len(arquivos_pdf)}]: {os.path.basename(pdf_path)}")
-        
-        texto_extraido = extrair_texto_estruturado_pdf(pdf_path)
-        if not texto_extraido:
-            print(f"❌ FALHA ao extrair texto de {os.path.basename(pdf_path)}")
-            continue
-        
-        artigos_encontrados = estruturar_artigos_salesforce(texto_extraido, pdf_path)
-        todos_artigos.extend(artigos_encontrados)
-        
-        print(f"✅ Extraídos {len(artigos_encontrados)} artigos")
+    if workers > 1:
+        print(f"⚡ Extração paralela com {workers} processos")
+        artigos_por_arquivo = _artigos_paralelo(arquivos_pdf, workers)
+    else:
+        artigos_por_arquivo = _artigos_serial(arquivos_pdf)
+
+    # Os artigos chegam um a um; só eles ficam em memória, nunca o texto inteiro de um PDF
+    arquivo_atual, extraidos = None, 0
+    try:
+        for pdf_path, artigo in artigos_por_arquivo:
+            if pdf_path != arquivo_atual:
+                if arquivo_atual is not None:
+                    print(f"✅ Extraídos {extraidos} artigos")
+                arquivo_atual, extraidos = pdf_path, 0
+            todos_artigos.append(artigo)
+            extraidos += 1
+    except RuntimeError as e:
+        # Uma faixa de páginas falhou duas vezes: salvar a base sem ela seria pior que não salvar
+        print(f"❌ ERRO CRÍTICO: {e}")
+        return False
+    if arquivo_atual is not None:
+        print(f"✅ Extraídos {extraidos} artigos")
     
     if not todos_artigos:
         print("❌ ERRO CRÍTICO: Nenhum artigo foi extraído dos PDFs!")
@@ -143,6 +248,11 @@ def processar_pdfs_precisao_maxima():
     
     # Filtrar apenas artigos com conteúdo substancial
     df_final = df_limpo[df_limpo['texto_para_busca'].str.len() > 200].copy()
+
+    # Quase duplicatas (MinHash + LSH): o mesmo procedimento com outro código fica uma vez só,
+    # com os outros códigos em `codigos_alias`
+    df_final, estatisticas_dedup = deduplicar_quase_iguais(df_final)
+    print(f"🧬 {resumo(estatisticas_dedup)}")
     
     try:
         df_final.to_csv(caminho_saida, index=False, encoding='utf-8-sig')
@@ -161,7 +271,10 @@ if __name__ == '__main__':
     print("🎯 Exigência: Precisão máxima (100%)")
     print("-" * 60)
     
-    sucesso = processar_pdfs_precisao_maxima()
+    workers = None
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
+    sucesso = processar_pdfs_precisao_maxima(workers)
     
     if sucesso:
         print("\n✅ PROCESSAMENTO CONCLUÍDO COM SUCESSO!")
@@ -1,11 +1,16 @@
 import sys
+import gc
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os
 import json
-import csv
-from datetime import datetime
 from dotenv import load_dotenv
+from feedback import gravar_feedback, obter_gravador
+from autenticacao import emitir_token, usuario_da_requisicao
+from chatbot import metricas
+from chatbot.pesquisa import ler_parametros
+from chatbot.lote import ler_lote, linhas_ndjson
+import inicializacao
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -14,34 +19,6 @@ load_dotenv()
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(project_root)
 
-# Variáveis globais para as funções
-inicializar_chatbot = None
-get_chatbot_answer_stream = None
-criar_e_salvar_indice_estruturado = None
-
-# Importa as funções do chatbot
-try:
-    from chatbot.chatbot import inicializar_chatbot as _inicializar_chatbot, get_chatbot_answer_stream as _get_chatbot_answer_stream
-    inicializar_chatbot = _inicializar_chatbot
-    get_chatbot_answer_stream = _get_chatbot_answer_stream
-    
-    try:
-        from criar_indice_estruturado import criar_e_salvar_indice_estruturado as _criar_e_salvar_indice_estruturado
-        criar_e_salvar_indice_estruturado = _criar_e_salvar_indice_estruturado
-    except ImportError:
-        def criar_e_salvar_indice_estruturado():
-            pass
-
-except ImportError as e:
-    def inicializar_chatbot():
-        return True
-    
-    def get_chatbot_answer_stream(pergunta):
-        yield "data: " + json.dumps({"answer": "Serviço em manutenção. Por favor, tente novamente mais tarde."}) + "\n\n"
-        
-    def criar_e_salvar_indice_estruturado():
-        pass
-
 # Inicializa o Flask
 app = Flask(__name__)
 
@@ -50,24 +27,55 @@ CORS_ORIGIN = os.getenv('CORS_ORIGIN', 'https://projeto-bia.vercel.app')
 CORS(app, resources={r"/*": {
     "origins": [CORS_ORIGIN],
     "methods": ["GET", "POST", "OPTIONS"],
-    "allow_headers": ["Content-Type"]
+    "allow_headers": ["Content-Type", "Authorization", "X-Admin-Token"]
 }})
 
-# Configuração do arquivo de feedback
-FEEDBACK_FILE = os.path.join(os.path.dirname(__file__), 'feedback.csv')
-
-# Função para verificar e processar dados
-def verificar_e_processar_dados():
-    indice_path = os.path.join(os.path.dirname(__file__), '..', 'faiss_index_estruturado')
-    if not os.path.exists(indice_path):
-        criar_e_salvar_indice_estruturado()
+# O chatbot (langchain, Gemini, índice FAISS) carrega em uma thread em segundo plano e o
+# servidor já responde /health/live enquanto isso. O índice não é mais construído aqui:
+# rode criar_indice_estruturado.py antes de subir o servidor (veja railway_start.sh).
+# INICIALIZACAO_SINCRONA=1 volta a carregar tudo antes de aceitar requisições.
+INICIALIZACAO_SINCRONA = os.environ.get('INICIALIZACAO_SINCRONA') == '1'
+
+# Modo preload do gunicorn (PRE_CARREGAR_INDICE=1 gunicorn -c python:app app:app):
+# o master carrega só o índice, mapeado em memória, e os workers criados por fork
+# compartilham essas páginas; a cadeia de QA e os clientes do Gemini são criados
+# em cada worker pelo hook post_fork abaixo.
+PRE_CARREGAR_INDICE = os.environ.get('PRE_CARREGAR_INDICE') == '1'
+preload_app = PRE_CARREGAR_INDICE
+
+# Cada worker atende GUNICORN_THREADS requisições ao mesmo tempo (worker gthread). Com o worker
+# sync, um stream SSE ocupa o worker inteiro: a coalescência de perguntas e a fila do LLM
+# (chatbot/admissao.py) só agem entre requisições simultâneas e não fariam nada.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+# `gunicorn -c python:app` importa este módulo no master como arquivo de configuração, antes de
+# criar o Arbiter (que define SERVER_SOFTWARE). Sem preload, a carga fica só para o post_fork:
+# uma thread iniciada no master seria copiada pelo fork no meio do import do chatbot.
+CONFIGURACAO_GUNICORN = 'gunicorn.app.base' in sys.modules and 'SERVER_SOFTWARE' not in os.environ
+
+def post_fork(server, worker):
+    """Hook do gunicorn, chamado em cada worker logo após o fork."""
+    # Threads não atravessam o fork: a inicialização começa aqui, em cada worker
+    inicializacao.iniciar(em_segundo_plano=not INICIALIZACAO_SINCRONA)
+
+def child_exit(server, worker):
+    """Hook do gunicorn, chamado no master quando um worker termina."""
+    metricas.processo_encerrado(worker.pid)
+
+if PRE_CARREGAR_INDICE:
+    try:
+        inicializacao.carregar_modulo_chatbot().pre_carregar_indice()
+        # Tira os objetos já criados do coletor de lixo para que ele não suje as páginas compartilhadas
+        gc.freeze()
+    except Exception as e:
+        print(f"Não foi possível pré-carregar o índice: {e}")
+elif not CONFIGURACAO_GUNICORN:
+    inicializacao.iniciar(em_segundo_plano=not INICIALIZACAO_SINCRONA)
 
-# Tenta inicializar o chatbot
-try:
-    verificar_e_processar_dados()
-    chatbot_pronto = inicializar_chatbot()
-except Exception as e:
-    chatbot_pronto = True
+# Cria o gravador de feedback (e importa o feedback.csv antigo) na partida, não no primeiro POST /feedback.
+# A thread de gravação só nasce no primeiro registro de cada processo, então isto vale também no master.
+obter_gravador()
 
 @app.route('/')
 def home():
@@ -79,8 +87,34 @@ def home():
 
 @app.route('/health', methods=['GET'])
 def health():
+    modulo = inicializacao.modulo_chatbot if inicializacao.pronto() else None
+    return jsonify({
+        "status": "ok",
+        "inicializacao": inicializacao.status(),
+        "indice": inicializacao.status_indice(),
+        "cache": modulo.obter_estatisticas_cache() if modulo else {},
+        "rotas": modulo.obter_metricas_rotas() if modulo else {},
+        "fila_llm": modulo.obter_estatisticas_fila() if modulo else {}
+    }), 200
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness: o processo está de pé e atendendo, mesmo que o chatbot ainda esteja carregando."""
     return jsonify({"status": "ok"}), 200
 
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: 200 só depois que o índice e a cadeia de QA estão carregados."""
+    return jsonify(inicializacao.status()), 200 if inicializacao.pronto() else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas no formato do Prometheus, somadas entre os workers com PROMETHEUS_MULTIPROC_DIR."""
+    corpo, tipo = metricas.gerar_metricas()
+    if corpo is None:
+        return jsonify({"status": "error", "message": "Métricas indisponíveis (prometheus_client não instalado)."}), 503
+    return Response(corpo, content_type=tipo)
+
 @app.route('/chat', methods=['GET'])
 def chat():
     pergunta = request.args.get('message')
@@ -91,7 +125,66 @@ def chat():
             yield "data: " + json.dumps(error_data) + "\n\n"
         return Response(error_stream(), mimetype='text/event-stream')
 
-    return Response(get_chatbot_answer_stream(pergunta), mimetype='text/event-stream')
+    if not inicializacao.pronto():
+        return Response(inicializacao.frame_indisponivel(), status=503, mimetype='text/event-stream',
+                        headers={"Retry-After": "5"})
+
+    # Com a fila do LLM cheia, recusa antes de abrir o stream em vez de esperar um erro de cota do Gemini
+    usuario = usuario_da_requisicao(request.headers, request.remote_addr)
+    retry_after = inicializacao.modulo_chatbot.verificar_admissao(pergunta, usuario)
+    if retry_after is not None:
+        erro = {"error": f"Muitas perguntas em andamento. Tente novamente em {retry_after} s."}
+        return Response("data: " + json.dumps(erro) + "\n\n", status=429, mimetype='text/event-stream',
+                        headers={"Retry-After": str(retry_after)})
+
+    return Response(inicializacao.modulo_chatbot.get_chatbot_answer_stream(pergunta, usuario),
+                    mimetype='text/event-stream')
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Várias perguntas de uma vez ({"questions": [texto ou {"id", "question"}]}): uma recuperação
+    em lote e as gerações em um pool limitado. Responde NDJSON, uma linha por pergunta na
+    ordem em que ficam prontas e uma linha final com o resumo.
+    """
+    try:
+        perguntas, ids = ler_lote(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not inicializacao.pronto():
+        return jsonify({"status": "error", "message": "O chatbot ainda está sendo inicializado."}), 503, \
+            {"Retry-After": "5"}
+    usuario = usuario_da_requisicao(request.headers, request.remote_addr)
+    resultados = inicializacao.modulo_chatbot.responder_lote(perguntas, usuario)
+    return Response(linhas_ndjson(resultados, ids), mimetype='application/x-ndjson')
+
+@app.route('/search', methods=['GET'])
+def search():
+    """
+    Só a recuperação, sem o LLM: artigos ordenados com código, título, arquivo, score e um
+    trecho com os termos destacados. Parâmetros: q, pagina, por_pagina e modo (auto, lexical,
+    hibrido ou vetorial).
+    """
+    try:
+        consulta, pagina, por_pagina, modo = ler_parametros(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not inicializacao.pronto():
+        return jsonify({"status": "error", "message": "O chatbot ainda está sendo inicializado."}), 503, \
+            {"Retry-After": "5"}
+    return jsonify(inicializacao.modulo_chatbot.pesquisar_artigos(consulta, pagina, por_pagina, modo))
+
+@app.route('/admin/recarregar-indice', methods=['POST'])
+def recarregar_indice():
+    """
+    Carrega em segundo plano a versão publicada do índice e troca a ativa deste worker.
+    Com vários workers, use INDICE_VIGIAR_SEGUNDOS para que todos acompanhem a publicação.
+    """
+    if not inicializacao.token_admin_valido(request.headers.get('X-Admin-Token')):
+        return jsonify({"status": "error", "message": "Não autorizado."}), 403
+    if not inicializacao.recarregar():
+        return jsonify({"status": "error", "message": "Chatbot não está pronto ou já há uma recarga em andamento."}), 409
+    return jsonify({"status": "accepted", "indice": inicializacao.status_indice()}), 202
 
 @app.route('/api/auth', methods=['POST'])
 def login():
@@ -106,7 +199,9 @@ def login():
         return jsonify({
             "status": "success",
             "message": "Login realizado com sucesso!",
-            "user": {"username": username, "role": "admin"}
+            "user": {"username": username, "role": "admin"},
+            # Enviado no /chat como `Authorization: Bearer <token>` para a fila do LLM identificar o usuário
+            "token": emitir_token(username)
         })
     else:
         return jsonify({
@@ -125,15 +220,7 @@ def salvar_feedback():
         if not all([question, answer, feedback_type]):
             return jsonify({"status": "error", "message": "Dados incompletos."}, 400)
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        row = [timestamp, question, answer, feedback_type]
-
-        file_exists = os.path.isfile(FEEDBACK_FILE)
-        with open(FEEDBACK_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Question", "Answer", "Feedback"])
-            writer.writerow(row)
+        gravar_feedback(question, answer, feedback_type)
 
         return jsonify({"status": "success", "message": "Feedback recebido com sucesso!"})
     except Exception as e:
@@ -0,0 +1,205 @@
+"""
+Servidor assíncrono (ASGI) com o mesmo contrato de /chat, /chat/batch, /search, /feedback e /health do app.py.
+Cada stream SSE é uma corrotina no event loop em vez de um worker síncrono preso
+durante toda a geração, então um processo atende centenas de conexões abertas.
+
+Uso: uvicorn app_async:app --host 0.0.0.0 --port $PORT
+"""
+import sys
+import os
+import json
+import asyncio
+import contextlib
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from feedback import gravar_feedback, obter_gravador
+from autenticacao import emitir_token, usuario_da_requisicao
+from chatbot import metricas
+from chatbot.pesquisa import ler_parametros
+from chatbot.lote import ler_lote, linhas_ndjson
+import inicializacao
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+# Configura o PYTHONPATH
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+
+async def home(request):
+    return JSONResponse({
+        "status": "online",
+        "message": "Backend do Chatbot está funcionando!",
+        "version": "1.0.0"
+    })
+
+
+async def health(request):
+    modulo = inicializacao.modulo_chatbot if inicializacao.pronto() else None
+    return JSONResponse({
+        "status": "ok",
+        "inicializacao": inicializacao.status(),
+        "indice": inicializacao.status_indice(),
+        "cache": modulo.obter_estatisticas_cache() if modulo else {},
+        "rotas": modulo.obter_metricas_rotas() if modulo else {},
+        "fila_llm": modulo.obter_estatisticas_fila() if modulo else {}
+    })
+
+
+async def health_live(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def health_ready(request):
+    return JSONResponse(inicializacao.status(), status_code=200 if inicializacao.pronto() else 503)
+
+
+async def metrics(request):
+    corpo, tipo = metricas.gerar_metricas()
+    if corpo is None:
+        return JSONResponse({"status": "error", "message": "Métricas indisponíveis (prometheus_client não instalado)."},
+                            status_code=503)
+    return Response(corpo, headers={"Content-Type": tipo})
+
+
+async def chat(request):
+    pergunta = request.query_params.get('message')
+
+    if not pergunta:
+        async def error_stream():
+            error_data = {"error": "Nenhuma mensagem foi fornecida."}
+            yield "data: " + json.dumps(error_data) + "\n\n"
+        return StreamingResponse(error_stream(), media_type='text/event-stream')
+
+    if not inicializacao.pronto():
+        return StreamingResponse(iter([inicializacao.frame_indisponivel()]), status_code=503,
+                                 media_type='text/event-stream', headers={"Retry-After": "5"})
+
+    usuario = usuario_da_requisicao(request.headers, request.client.host if request.client else None)
+    retry_after = inicializacao.modulo_chatbot.verificar_admissao(pergunta, usuario)
+    if retry_after is not None:
+        erro = {"error": f"Muitas perguntas em andamento. Tente novamente em {retry_after} s."}
+        return StreamingResponse(iter(["data: " + json.dumps(erro) + "\n\n"]), status_code=429,
+                                 media_type='text/event-stream', headers={"Retry-After": str(retry_after)})
+
+    return StreamingResponse(inicializacao.modulo_chatbot.get_chatbot_answer_astream(pergunta, usuario),
+                             media_type='text/event-stream')
+
+
+async def chat_batch(request):
+    try:
+        corpo = await request.json()
+    except ValueError:
+        corpo = None
+    try:
+        perguntas, ids = ler_lote(corpo)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    if not inicializacao.pronto():
+        return JSONResponse({"status": "error", "message": "O chatbot ainda está sendo inicializado."},
+                            status_code=503, headers={"Retry-After": "5"})
+    usuario = usuario_da_requisicao(request.headers, request.client.host if request.client else None)
+    resultados = inicializacao.modulo_chatbot.responder_lote(perguntas, usuario)
+    # O lote é síncrono (pool de threads do LLM): o Starlette itera o gerador fora do event loop
+    return StreamingResponse(linhas_ndjson(resultados, ids), media_type='application/x-ndjson')
+
+
+async def search(request):
+    try:
+        consulta, pagina, por_pagina, modo = ler_parametros(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    if not inicializacao.pronto():
+        return JSONResponse({"status": "error", "message": "O chatbot ainda está sendo inicializado."},
+                            status_code=503, headers={"Retry-After": "5"})
+    pesquisar = inicializacao.modulo_chatbot.pesquisar_artigos
+    if modo in ("hibrido", "vetorial"):
+        # Podem chamar a API de embeddings: fora do event loop
+        return JSONResponse(await asyncio.to_thread(pesquisar, consulta, pagina, por_pagina, modo))
+    # auto e lexical não saem do processo e levam milissegundos, menos que passar para uma thread
+    return JSONResponse(pesquisar(consulta, pagina, por_pagina, modo))
+
+
+async def recarregar_indice(request):
+    """Carrega a versão publicada do índice em segundo plano; os streams abertos terminam na versão antiga."""
+    if not inicializacao.token_admin_valido(request.headers.get('X-Admin-Token')):
+        return JSONResponse({"status": "error", "message": "Não autorizado."}, status_code=403)
+    if not inicializacao.recarregar():
+        return JSONResponse({"status": "error", "message": "Chatbot não está pronto ou já há uma recarga em andamento."},
+                            status_code=409)
+    return JSONResponse({"status": "accepted", "indice": inicializacao.status_indice()}, status_code=202)
+
+
+async def login(request):
+    data = await request.json()
+    username = data.get('username')
+    password = data.get('password')
+
+    admin_username = os.getenv('ADMIN_USERNAME', 'admin')
+    admin_password = os.getenv('ADMIN_PASSWORD', 'admin123')
+
+    if username == admin_username and password == admin_password:
+        return JSONResponse({
+            "status": "success",
+            "message": "Login realizado com sucesso!",
+            "user": {"username": username, "role": "admin"},
+            "token": emitir_token(username)
+        })
+    return JSONResponse({"status": "error", "message": "Credenciais inválidas."}, status_code=401)
+
+
+async def salvar_feedback(request):
+    try:
+        data = await request.json()
+        question = data.get('question')
+        answer = data.get('answer')
+        feedback_type = data.get('feedback')
+
+        if not all([question, answer, feedback_type]):
+            return JSONResponse({"status": "error", "message": "Dados incompletos."}, status_code=400)
+
+        # Só enfileira; a gravação no SQLite é feita em lotes por uma thread do gravador
+        gravar_feedback(question, answer, feedback_type)
+        return JSONResponse({"status": "success", "message": "Feedback recebido com sucesso!"})
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": "Erro interno ao salvar feedback."}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Começa a carregar o chatbot em segundo plano; o servidor aceita conexões logo em seguida."""
+    inicializacao.iniciar()
+    # Cria o gravador de feedback (e importa o feedback.csv antigo) antes da primeira requisição
+    await asyncio.to_thread(obter_gravador)
+    yield
+
+
+CORS_ORIGIN = os.getenv('CORS_ORIGIN', 'https://projeto-bia.vercel.app')
+
+app = Starlette(
+    routes=[
+        Route('/', home),
+        Route('/health', health, methods=['GET']),
+        Route('/health/live', health_live, methods=['GET']),
+        Route('/health/ready', health_ready, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/chat', chat, methods=['GET']),
+        Route('/chat/batch', chat_batch, methods=['POST']),
+        Route('/search', search, methods=['GET']),
+        Route('/admin/recarregar-indice', recarregar_indice, methods=['POST']),
+        Route('/api/auth', login, methods=['POST']),
+        Route('/feedback', salvar_feedback, methods=['POST']),
+    ],
+    middleware=[Middleware(
+        CORSMiddleware,
+        allow_origins=[CORS_ORIGIN],
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization", "X-Admin-Token"],
+    )],
+    lifespan=lifespan,
+)
@@ -0,0 +1,79 @@
+"""
+Token de sessão emitido pelo /api/auth e usado para identificar o usuário no /chat.
+
+O token é `base64(usuario:emitido_em).assinatura`, assinado com HMAC-SHA256 usando
+AUTH_SECRET. Sem AUTH_SECRET a chave é sorteada na importação (com um aviso): os workers
+que herdam o módulo do master do gunicorn compartilham a chave, mas os tokens deixam de
+valer a cada partida. Hoje ele só serve para a fila do LLM atender os usuários de forma alternada;
+nenhuma rota exige o token. Sem token válido, o usuário é o IP do cliente.
+"""
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+
+VALIDADE_SEGUNDOS = float(os.environ.get("AUTH_TOKEN_VALIDADE_HORAS", "12")) * 3600
+# Proxies à frente do servidor que acrescentam o IP de quem os chamou ao X-Forwarded-For
+# (1 no Railway). Com 0 o cabeçalho é ignorado.
+PROXIES_CONFIAVEIS = int(os.environ.get("PROXIES_CONFIAVEIS", "1"))
+
+# Sorteada na importação: o master do gunicorn importa o app (e este módulo) antes do fork
+_CHAVE_ALEATORIA = secrets.token_bytes(32)
+_avisou_sem_segredo = False
+
+
+def _chave():
+    global _avisou_sem_segredo
+    segredo = os.environ.get("AUTH_SECRET")
+    if segredo:
+        return segredo.encode("utf-8")
+    # Nunca uma chave derivada de valores conhecidos (as credenciais padrão): qualquer um forjaria tokens
+    if not _avisou_sem_segredo:
+        _avisou_sem_segredo = True
+        print("⚠️ AUTH_SECRET não definida: usando uma chave aleatória deste processo para os tokens de sessão.")
+    return _CHAVE_ALEATORIA
+
+
+def _assinar(conteudo):
+    return hmac.new(_chave(), conteudo.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def emitir_token(usuario):
+    conteudo = base64.urlsafe_b64encode(f"{usuario}:{int(time.time())}".encode("utf-8")).decode("ascii")
+    return f"{conteudo}.{_assinar(conteudo)}"
+
+
+def usuario_do_token(token):
+    """Retorna o usuário de um token válido e dentro da validade, ou None."""
+    try:
+        conteudo, assinatura = token.rsplit(".", 1)
+        if not hmac.compare_digest(assinatura, _assinar(conteudo)):
+            return None
+        usuario, emitido_em = base64.urlsafe_b64decode(conteudo).decode("utf-8").rsplit(":", 1)
+        emitido_em = int(emitido_em)
+    except (AttributeError, ValueError, UnicodeError):
+        return None
+    if time.time() - emitido_em > VALIDADE_SEGUNDOS:
+        return None
+    return usuario
+
+
+def usuario_da_requisicao(cabecalhos, ip_cliente):
+    """
+    Chave de justiça da fila: o usuário do cabeçalho `Authorization: Bearer <token>` ou,
+    sem token, o IP do cliente. O X-Forwarded-For só é lido da direita para a esquerda: as
+    entradas à esquerda vêm do próprio cliente e trocá-las daria uma vaga nova na fila a
+    cada requisição; vale a acrescentada pelo proxy confiável mais externo.
+    """
+    autorizacao = cabecalhos.get("Authorization") or ""
+    if autorizacao.startswith("Bearer "):
+        usuario = usuario_do_token(autorizacao[len("Bearer "):].strip())
+        if usuario:
+            return f"usuario:{usuario}"
+    encaminhado = cabecalhos.get("X-Forwarded-For")
+    if encaminhado and PROXIES_CONFIAVEIS > 0:
+        saltos = [salto.strip() for salto in encaminhado.split(",")]
+        ip_cliente = saltos[-min(PROXIES_CONFIAVEIS, len(saltos))] or ip_cliente
+    return f"ip:{ip_cliente or 'desconhecido'}"
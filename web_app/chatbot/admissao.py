@@ -0,0 +1,224 @@
+"""
+Controle de admissão da etapa do LLM: no máximo LLM_MAX_CONCORRENTES gerações do
+Gemini ao mesmo tempo por processo, uma fila limitada para as demais e atendimento
+alternado entre usuários, para que um usuário com várias perguntas não ocupe a fila
+inteira. Com a fila cheia a pergunta é recusada na hora (429 com Retry-After) em vez
+de chegar ao Gemini e voltar como erro de cota.
+
+A mesma instância atende as threads do app.py e as tasks do app_async.py: o estado fica
+sob um threading.Lock e quem espera em um event loop é acordado por call_soon_threadsafe.
+"""
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+from chatbot import metricas
+
+
+class FilaCheia(Exception):
+    """A fila do LLM (total ou do usuário) está cheia; `retry_after` em segundos."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Muitas perguntas em andamento. Tente novamente em {retry_after} s.")
+        self.retry_after = retry_after
+
+
+class EsperaEsgotada(Exception):
+    """A pergunta passou mais que o tempo máximo na fila do LLM."""
+
+
+class Senha:
+    """Lugar de uma geração no controle: na fila até `liberada`, depois ocupando uma vaga."""
+
+    __slots__ = ("usuario", "chegada", "inicio", "liberada", "encerrada", "laco", "evento")
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self.chegada = time.perf_counter()
+        self.inicio = None
+        self.liberada = False
+        self.encerrada = False
+        self.laco = None
+        self.evento = None
+
+
+class ControleAdmissao:
+    def __init__(self, max_concorrentes=8, fila_maxima=32, fila_por_usuario=4, espera_maxima=60.0,
+                 intervalo_aviso=2.0):
+        self.max_concorrentes = max(1, max_concorrentes)
+        self.fila_maxima = fila_maxima
+        self.fila_por_usuario = fila_por_usuario
+        self.espera_maxima = espera_maxima
+        # A posição é reenviada a cada `intervalo_aviso` s mesmo sem mudar: mantém a conexão
+        # SSE ativa em proxies e deixa o produtor perceber que todos os inscritos saíram
+        self.intervalo_aviso = intervalo_aviso
+        self._lock = threading.Lock()
+        self._condicao = threading.Condition(self._lock)
+        self._em_execucao = 0
+        # Uma fila por usuário; a ordem do dicionário é a vez de cada um (o atendido vai para o fim)
+        self._filas = OrderedDict()
+        self._na_fila = 0
+        # Média móvel da duração de uma geração, para estimar o Retry-After
+        self._duracao_media = 5.0
+        self.admitidas = 0
+        self.recusadas = 0
+        self.esgotadas = 0
+
+    def _retry_after(self):
+        rodadas = (self._na_fila + 1) / self.max_concorrentes
+        return max(1, math.ceil(self._duracao_media * rodadas))
+
+    def _recusa(self, usuario):
+        if self._em_execucao < self.max_concorrentes and not self._na_fila:
+            return None
+        fila = self._filas.get(usuario)
+        if self._na_fila >= self.fila_maxima or (fila is not None and len(fila) >= self.fila_por_usuario):
+            return self._retry_after()
+        return None
+
+    def verificar(self, usuario):
+        """Sem reservar nada: None se o usuário pode entrar agora ou na fila; senão os segundos do Retry-After."""
+        with self._lock:
+            return self._recusa(usuario)
+
+    def entrar(self, usuario):
+        """Reserva uma vaga ou um lugar na fila e retorna a `Senha`; lança `FilaCheia`."""
+        with self._lock:
+            retry_after = self._recusa(usuario)
+            if retry_after is not None:
+                self.recusadas += 1
+                metricas.RECUSAS_LLM.labels("fila_cheia").inc()
+                raise FilaCheia(retry_after)
+            senha = Senha(usuario)
+            if self._em_execucao < self.max_concorrentes and not self._na_fila:
+                self._liberar(senha)
+            else:
+                self._filas.setdefault(usuario, deque()).append(senha)
+                self._na_fila += 1
+                metricas.FILA_LLM.set(self._na_fila)
+            return senha
+
+    def _liberar(self, senha):
+        senha.liberada = True
+        senha.inicio = time.perf_counter()
+        self._em_execucao += 1
+        self.admitidas += 1
+        metricas.ESPERA_LLM.observe(senha.inicio - senha.chegada)
+        metricas.LLM_EM_EXECUCAO.set(self._em_execucao)
+
+    def _chamar_proximos(self):
+        while self._em_execucao < self.max_concorrentes and self._filas:
+            usuario, fila = next(iter(self._filas.items()))
+            self._liberar(fila.popleft())
+            self._na_fila -= 1
+            if fila:
+                self._filas.move_to_end(usuario)
+            else:
+                del self._filas[usuario]
+        metricas.FILA_LLM.set(self._na_fila)
+
+    def _avisar(self, liberadas=()):
+        # Qualquer mudança pode alterar a posição de todos na fila
+        self._condicao.notify_all()
+        for senha in (*liberadas, *(s for fila in self._filas.values() for s in fila)):
+            if senha.laco is not None:
+                try:
+                    senha.laco.call_soon_threadsafe(senha.evento.set)
+                except RuntimeError:
+                    # O event loop dessa senha já foi fechado
+                    pass
+
+    def _posicao(self, senha):
+        """Posição (1 = próxima) no atendimento alternado entre usuários."""
+        ordem = list(self._filas)
+        vez = ordem.index(senha.usuario)
+        indice = self._filas[senha.usuario].index(senha)
+        antes = indice
+        for i, usuario in enumerate(ordem):
+            if usuario != senha.usuario:
+                tamanho = len(self._filas[usuario])
+                antes += min(tamanho, indice + (1 if i < vez else 0))
+        return antes + 1
+
+    def _remover_da_fila(self, senha):
+        fila = self._filas.get(senha.usuario)
+        if fila is not None and senha in fila:
+            fila.remove(senha)
+            self._na_fila -= 1
+            if not fila:
+                del self._filas[senha.usuario]
+
+    def _estado_espera(self, senha):
+        """Sob o lock: None se a senha foi liberada, senão a posição; lança `EsperaEsgotada` após o limite."""
+        if senha.liberada:
+            return None
+        if time.perf_counter() - senha.chegada >= self.espera_maxima:
+            self._remover_da_fila(senha)
+            senha.encerrada = True
+            self.esgotadas += 1
+            metricas.RECUSAS_LLM.labels("espera_esgotada").inc()
+            self._avisar()
+            raise EsperaEsgotada(f"A pergunta esperou mais de {self.espera_maxima:g} s na fila. Tente novamente.")
+        return self._posicao(senha)
+
+    def aguardar(self, senha):
+        """Gera a posição na fila quando ela muda (e a cada `intervalo_aviso` s) até a vez da senha."""
+        ultima, avisado_em = None, 0.0
+        while True:
+            with self._lock:
+                posicao = self._estado_espera(senha)
+                proximo_aviso = avisado_em + self.intervalo_aviso
+                while posicao is not None and posicao == ultima and time.perf_counter() < proximo_aviso:
+                    limite = min(proximo_aviso, senha.chegada + self.espera_maxima)
+                    self._condicao.wait(max(0.0, limite - time.perf_counter()))
+                    posicao = self._estado_espera(senha)
+            if posicao is None:
+                return
+            ultima, avisado_em = posicao, time.perf_counter()
+            yield posicao
+
+    async def aaguardar(self, senha):
+        """Versão de `aguardar` para o event loop: espera um asyncio.Event acordado pelas outras threads."""
+        senha.laco = asyncio.get_running_loop()
+        senha.evento = asyncio.Event()
+        ultima, avisado_em = None, 0.0
+        while True:
+            with self._lock:
+                posicao = self._estado_espera(senha)
+                senha.evento.clear()
+            if posicao is None:
+                return
+            if posicao != ultima or time.perf_counter() - avisado_em >= self.intervalo_aviso:
+                ultima, avisado_em = posicao, time.perf_counter()
+                yield posicao
+            limite = min(avisado_em + self.intervalo_aviso, senha.chegada + self.espera_maxima)
+            try:
+                await asyncio.wait_for(senha.evento.wait(), max(0.0, limite - time.perf_counter()))
+            except asyncio.TimeoutError:
+                pass
+
+    def sair(self, senha):
+        """Devolve a vaga (ou o lugar na fila) da senha e chama os próximos. Pode ser chamado mais de uma vez."""
+        with self._lock:
+            if senha.encerrada:
+                return
+            senha.encerrada = True
+            if senha.liberada:
+                self._em_execucao -= 1
+                self._duracao_media = 0.8 * self._duracao_media + 0.2 * (time.perf_counter() - senha.inicio)
+                metricas.LLM_EM_EXECUCAO.set(self._em_execucao)
+            else:
+                self._remover_da_fila(senha)
+            # Quem foi liberado agora já saiu do dicionário de filas, então é avisado à parte
+            antes = [s for fila in self._filas.values() for s in fila]
+            self._chamar_proximos()
+            self._avisar([s for s in antes if s.liberada])
+
+    def estatisticas(self):
+        with self._lock:
+            return {"max_concorrentes": self.max_concorrentes, "em_execucao": self._em_execucao,
+                    "na_fila": self._na_fila, "usuarios_na_fila": len(self._filas),
+                    "admitidas": self.admitidas, "recusadas": self.recusadas, "esperas_esgotadas": self.esgotadas,
+                    "duracao_media_s": round(self._duracao_media, 3)}
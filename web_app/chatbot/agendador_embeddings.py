@@ -0,0 +1,165 @@
+import os
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+
+class BaldeDeTokens:
+    """Limitador de taxa do tipo token bucket, seguro para uso entre threads."""
+
+    def __init__(self, taxa_por_segundo, capacidade=None):
+        self.taxa_por_segundo = taxa_por_segundo
+        self.capacidade = capacidade or max(1.0, taxa_por_segundo)
+        self._tokens = self.capacidade
+        self._ultima_recarga = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self, quantidade=1.0):
+        """Bloqueia até haver `quantidade` tokens disponíveis no balde."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultima_recarga) * self.taxa_por_segundo)
+                self._ultima_recarga = agora
+                if self._tokens >= quantidade:
+                    self._tokens -= quantidade
+                    return
+                espera = (quantidade - self._tokens) / self.taxa_por_segundo
+            time.sleep(espera)
+
+
+class AgendadorEmbeddings:
+    """
+    Gera embeddings em lotes, com um pool limitado de threads, limite de requisições
+    por segundo, novas tentativas com backoff exponencial e checkpoints por lote.
+    Se a construção do índice cair no meio, a próxima execução reaproveita os lotes
+    já salvos em `caminho_checkpoint`.
+    """
+
+    def __init__(self, embeddings, tamanho_lote=64, max_workers=4, requisicoes_por_segundo=None,
+                 max_tentativas=5, espera_inicial=1.0, caminho_checkpoint=None, mostrar_progresso=True):
+        self.embeddings = embeddings
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.max_workers = max(1, max_workers)
+        self.balde = BaldeDeTokens(requisicoes_por_segundo) if requisicoes_por_segundo else None
+        self.max_tentativas = max_tentativas
+        self.espera_inicial = espera_inicial
+        self.caminho_checkpoint = caminho_checkpoint
+        self.mostrar_progresso = mostrar_progresso
+        self.tentativas_extras = 0
+        self.lotes_do_checkpoint = 0
+
+    def _caminho_lote(self, lote):
+        hash_lote = hashlib.sha256("\x00".join(lote).encode("utf-8")).hexdigest()
+        return os.path.join(self.caminho_checkpoint, f"lote_{hash_lote}.npy")
+
+    def _carregar_checkpoint(self, lote):
+        if not self.caminho_checkpoint:
+            return None
+        caminho = self._caminho_lote(lote)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            return np.load(caminho).tolist()
+        except (OSError, ValueError):
+            return None
+
+    def _salvar_checkpoint(self, lote, vetores):
+        if not self.caminho_checkpoint:
+            return
+        caminho = self._caminho_lote(lote)
+        temporario = caminho + ".tmp"
+        with open(temporario, "wb") as f:
+            np.save(f, np.asarray(vetores, dtype=np.float32))
+        os.replace(temporario, caminho)
+
+    def _embeddar_lote(self, lote):
+        """
+        Chama a API para um lote, repetindo com backoff exponencial em caso de erro.
+        Retorna (vetores, novas tentativas); quem soma as tentativas é a thread que chamou `embeddar`.
+        """
+        for tentativa in range(self.max_tentativas):
+            if self.balde is not None:
+                self.balde.adquirir()
+            try:
+                vetores = self.embeddings.embed_documents(lote)
+                self._salvar_checkpoint(lote, vetores)
+                return vetores, tentativa
+            except Exception:
+                if tentativa == self.max_tentativas - 1:
+                    raise
+                # Backoff exponencial com jitter para não sincronizar as threads
+                time.sleep(self.espera_inicial * (2 ** tentativa) * (0.5 + random.random()))
+
+    def embeddar(self, textos):
+        """Retorna os embeddings de `textos`, na mesma ordem."""
+        textos = list(textos)
+        lotes = [textos[i:i + self.tamanho_lote] for i in range(0, len(textos), self.tamanho_lote)]
+        resultados = [None] * len(lotes)
+        if self.caminho_checkpoint:
+            os.makedirs(self.caminho_checkpoint, exist_ok=True)
+
+        pendentes = []
+        for i, lote in enumerate(lotes):
+            vetores = self._carregar_checkpoint(lote)
+            if vetores is not None and len(vetores) == len(lote):
+                resultados[i] = vetores
+                self.lotes_do_checkpoint += 1
+            else:
+                pendentes.append(i)
+
+        if self.mostrar_progresso and self.lotes_do_checkpoint:
+            print(f"Retomando do checkpoint: {self.lotes_do_checkpoint}/{len(lotes)} lotes já processados.")
+
+        inicio = time.time()
+        concluidos = 0
+        documentos = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futuros = {executor.submit(self._embeddar_lote, lotes[i]): i for i in pendentes}
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]], tentativas = futuro.result()
+                self.tentativas_extras += tentativas
+                concluidos += 1
+                documentos += len(lotes[futuros[futuro]])
+                if self.mostrar_progresso:
+                    decorrido = time.time() - inicio
+                    print(f"  Embeddings: lote {concluidos}/{len(pendentes)} "
+                          f"({documentos / decorrido if decorrido else 0:.1f} docs/s)")
+
+        return [vetor for vetores in resultados for vetor in vetores]
+
+    def limpar_checkpoint(self):
+        """Apaga os lotes salvos depois que o índice foi gravado com sucesso."""
+        if not self.caminho_checkpoint or not os.path.isdir(self.caminho_checkpoint):
+            return
+        for nome in os.listdir(self.caminho_checkpoint):
+            if nome.startswith("lote_"):
+                os.remove(os.path.join(self.caminho_checkpoint, nome))
+        try:
+            os.rmdir(self.caminho_checkpoint)
+        except OSError:
+            pass
+
+
+def criar_agendador(embeddings, caminho_checkpoint=None):
+    """
+    Cria o agendador com a configuração das variáveis de ambiente EMBEDDINGS_*.
+    Com o cache de embeddings em disco (EmbeddingsComCache com EMBEDDINGS_CACHE_DB), cada
+    lote concluído já fica no SQLite e uma construção retomada o lê de lá sem chamar a API:
+    os checkpoints .npy só são gravados quando não há esse cache.
+    """
+    if getattr(embeddings, "caminho_db", None):
+        caminho_checkpoint = None
+    rps = os.environ.get("EMBEDDINGS_REQUISICOES_POR_SEGUNDO")
+    return AgendadorEmbeddings(
+        embeddings,
+        tamanho_lote=int(os.environ.get("EMBEDDINGS_TAMANHO_LOTE", "64")),
+        max_workers=int(os.environ.get("EMBEDDINGS_WORKERS", "4")),
+        requisicoes_por_segundo=float(rps) if rps else None,
+        max_tentativas=int(os.environ.get("EMBEDDINGS_MAX_TENTATIVAS", "5")),
+        caminho_checkpoint=caminho_checkpoint,
+    )
@@ -0,0 +1,168 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalizar_pergunta(pergunta):
+    """Normaliza a pergunta para usar como chave do cache (caixa, acentos, pontuação e espaços)."""
+    texto = unicodedata.normalize("NFKD", str(pergunta).lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def assinatura_indice(caminho_indice):
+    """
+    Retorna uma assinatura (mtime e tamanho dos arquivos) do índice FAISS.
+    Qualquer reconstrução do índice muda a assinatura e invalida o cache.
+    """
+    if not caminho_indice or not os.path.isdir(caminho_indice):
+        return None
+    assinatura = []
+    for nome in ("index.faiss", "index.pkl"):
+        caminho = os.path.join(caminho_indice, nome)
+        try:
+            stat = os.stat(caminho)
+            assinatura.append((nome, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            assinatura.append((nome, None, None))
+    return tuple(assinatura)
+
+
+class CacheRespostas:
+    """
+    Cache LRU/TTL das respostas do chatbot, guardadas como os mesmos frames SSE
+    enviados ao cliente. A busca é feita pela pergunta normalizada e, se
+    `similaridade_minima` estiver definida, pela similaridade do embedding da pergunta.
+    """
+
+    def __init__(self, tamanho_maximo=256, ttl_segundos=3600, similaridade_minima=None):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_segundos = ttl_segundos
+        self.similaridade_minima = similaridade_minima
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._assinatura_indice = None
+        self.hits = 0
+        self.hits_semanticos = 0
+        self.misses = 0
+        self.invalidacoes = 0
+
+    def _expirada(self, entrada, agora):
+        return self.ttl_segundos is not None and agora - entrada["criado_em"] > self.ttl_segundos
+
+    def _entrada_valida(self, chave, agora):
+        """Entrada da chave; uma expirada sai do cache aqui, quando é encontrada."""
+        entrada = self._entradas.get(chave)
+        if entrada is not None and self._expirada(entrada, agora):
+            del self._entradas[chave]
+            return None
+        return entrada
+
+    def _buscar_semantica(self, embedding, agora):
+        """Retorna a chave da entrada mais similar ao embedding, se passar do limiar."""
+        # A busca já percorre todas as entradas: as expiradas encontradas no caminho saem do cache
+        for chave in [c for c, e in self._entradas.items() if self._expirada(e, agora)]:
+            del self._entradas[chave]
+        candidatos = [(c, e["embedding"]) for c, e in self._entradas.items() if e["embedding"] is not None]
+        if not candidatos:
+            return None
+        matriz = np.vstack([emb for _, emb in candidatos])
+        similaridades = matriz @ embedding
+        melhor = int(np.argmax(similaridades))
+        if similaridades[melhor] >= self.similaridade_minima:
+            return candidatos[melhor][0]
+        return None
+
+    @staticmethod
+    def _normalizar_embedding(embedding):
+        if embedding is None:
+            return None
+        vetor = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(vetor)
+        return vetor / norma if norma else None
+
+    def verificar_indice(self, assinatura):
+        """Limpa o cache se a assinatura do índice FAISS mudou desde a última verificação."""
+        with self._lock:
+            if assinatura != self._assinatura_indice:
+                if self._assinatura_indice is not None:
+                    self._entradas.clear()
+                    self.invalidacoes += 1
+                self._assinatura_indice = assinatura
+
+    def buscar_exata(self, pergunta):
+        """
+        Frames guardados para a pergunta exata, ou None sem contar miss: quem chama calcula o
+        embedding só agora e tenta `buscar`, então um hit exato não paga o embedding.
+        """
+        chave = normalizar_pergunta(pergunta)
+        with self._lock:
+            entrada = self._entrada_valida(chave, time.monotonic())
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return list(entrada["frames"])
+
+    def buscar(self, pergunta, embedding=None):
+        """Retorna a lista de frames SSE guardada para a pergunta, ou None."""
+        chave = normalizar_pergunta(pergunta)
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entrada_valida(chave, agora)
+            if entrada is None and self.similaridade_minima is not None:
+                embedding = self._normalizar_embedding(embedding)
+                chave_similar = self._buscar_semantica(embedding, agora) if embedding is not None else None
+                if chave_similar is not None:
+                    chave, entrada = chave_similar, self._entradas[chave_similar]
+                    self.hits_semanticos += 1
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return list(entrada["frames"])
+
+    def contem(self, pergunta):
+        """Se há resposta guardada para a pergunta exata (sem contar hit nem miss)."""
+        chave = normalizar_pergunta(pergunta)
+        with self._lock:
+            return self._entrada_valida(chave, time.monotonic()) is not None
+
+    def guardar(self, pergunta, frames, embedding=None):
+        """Guarda os frames SSE de uma resposta completa, removendo a entrada menos usada se cheio."""
+        chave = normalizar_pergunta(pergunta)
+        if not chave or not frames:
+            return
+        with self._lock:
+            self._entradas[chave] = {
+                "frames": tuple(frames),
+                "embedding": self._normalizar_embedding(embedding) if self.similaridade_minima is not None else None,
+                "criado_em": time.monotonic(),
+            }
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "tamanho": len(self._entradas),
+                "tamanho_maximo": self.tamanho_maximo,
+                "hits": self.hits,
+                "hits_semanticos": self.hits_semanticos,
+                "misses": self.misses,
+                "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+                "invalidacoes": self.invalidacoes,
+            }
@@ -0,0 +1,193 @@
+"""
+Coalescência (single-flight) de perguntas iguais feitas ao mesmo tempo.
+
+A primeira requisição de uma chave inicia a geração (recuperação + Gemini); as que
+chegam enquanto ela está em andamento se inscrevem na mesma geração e recebem os
+frames já produzidos e, depois, cada frame novo. A geração só é interrompida se todos
+os inscritos desconectarem. Ao terminar, a chave sai do mapa e a pergunta passa a ser
+atendida pelo cache de respostas.
+
+`Coalescedor` é para servidores com threads (app.py); `CoalescedorAsync` para o
+event loop do app_async.py.
+"""
+import asyncio
+import threading
+
+
+class _Geracao:
+    def __init__(self, condicao):
+        self.frames = []
+        self.concluida = False
+        self.erro = None
+        self.assinantes = 0
+        self.condicao = condicao
+
+
+class Coalescedor:
+    """Single-flight com uma thread produtora por geração e inscritos esperando em uma Condition."""
+
+    def __init__(self):
+        self._geracoes = {}
+        self._lock = threading.Lock()
+        self.geracoes = 0
+        self.assinaturas = 0
+
+    def assinar(self, chave, produtor, ao_concluir=None):
+        """
+        Gera os frames da chave. `produtor()` retorna o gerador de frames e só é chamado
+        se não houver geração em andamento; `ao_concluir(frames)` roda uma vez, se a
+        geração terminar sem erro. Um erro do produtor é relançado para cada inscrito.
+        """
+        with self._lock:
+            geracao = self._geracoes.get(chave)
+            nova = geracao is None
+            if nova:
+                geracao = self._geracoes[chave] = _Geracao(threading.Condition())
+                self.geracoes += 1
+            self.assinaturas += 1
+            with geracao.condicao:
+                geracao.assinantes += 1
+        if nova:
+            threading.Thread(target=self._produzir, args=(chave, geracao, produtor, ao_concluir),
+                             name="geracao-compartilhada", daemon=True).start()
+
+        enviados = 0
+        try:
+            while True:
+                with geracao.condicao:
+                    geracao.condicao.wait_for(lambda: enviados < len(geracao.frames) or geracao.concluida)
+                    novos = geracao.frames[enviados:]
+                    concluida = geracao.concluida
+                for frame in novos:
+                    yield frame
+                enviados += len(novos)
+                if concluida:
+                    if geracao.erro is not None:
+                        raise geracao.erro
+                    return
+        finally:
+            with geracao.condicao:
+                geracao.assinantes -= 1
+
+    def _abandonar_se_sem_assinantes(self, chave, geracao):
+        # Mesma ordem de locks do `assinar`: ninguém entra entre a verificação e a remoção
+        with self._lock, geracao.condicao:
+            if geracao.assinantes > 0:
+                return False
+            if self._geracoes.get(chave) is geracao:
+                del self._geracoes[chave]
+            return True
+
+    def _produzir(self, chave, geracao, produtor, ao_concluir):
+        completa = False
+        gerador = None
+        try:
+            gerador = produtor()
+            for frame in gerador:
+                with geracao.condicao:
+                    geracao.frames.append(frame)
+                    geracao.condicao.notify_all()
+                if geracao.assinantes == 0 and self._abandonar_se_sem_assinantes(chave, geracao):
+                    break
+            else:
+                completa = True
+        except Exception as e:
+            geracao.erro = e
+        finally:
+            if gerador is not None:
+                gerador.close()
+            if completa and ao_concluir is not None:
+                try:
+                    ao_concluir(list(geracao.frames))
+                except Exception as e:
+                    print(f"Erro ao concluir a geração compartilhada: {e}")
+            with self._lock:
+                if self._geracoes.get(chave) is geracao:
+                    del self._geracoes[chave]
+            with geracao.condicao:
+                geracao.concluida = True
+                geracao.condicao.notify_all()
+
+    def em_andamento(self, chave):
+        with self._lock:
+            return chave in self._geracoes
+
+    def estatisticas(self):
+        with self._lock:
+            return {"geracoes": self.geracoes, "assinaturas": self.assinaturas,
+                    "compartilhadas": self.assinaturas - self.geracoes, "em_andamento": len(self._geracoes)}
+
+
+class CoalescedorAsync:
+    """A mesma coalescência para um único event loop: a geração é uma task e os inscritos esperam uma Condition."""
+
+    def __init__(self):
+        self._geracoes = {}
+        self.geracoes = 0
+        self.assinaturas = 0
+
+    async def assinar(self, chave, produtor, ao_concluir=None):
+        """Versão assíncrona de `Coalescedor.assinar`; `produtor()` retorna um gerador assíncrono."""
+        geracao = self._geracoes.get(chave)
+        if geracao is None:
+            geracao = self._geracoes[chave] = _Geracao(asyncio.Condition())
+            self.geracoes += 1
+            # A task só roda no próximo await, depois que este inscrito já foi contado
+            asyncio.get_running_loop().create_task(self._produzir(chave, geracao, produtor, ao_concluir))
+        self.assinaturas += 1
+        geracao.assinantes += 1
+
+        enviados = 0
+        try:
+            while True:
+                async with geracao.condicao:
+                    await geracao.condicao.wait_for(lambda: enviados < len(geracao.frames) or geracao.concluida)
+                    novos = geracao.frames[enviados:]
+                    concluida = geracao.concluida
+                for frame in novos:
+                    yield frame
+                enviados += len(novos)
+                if concluida:
+                    if geracao.erro is not None:
+                        raise geracao.erro
+                    return
+        finally:
+            geracao.assinantes -= 1
+
+    async def _produzir(self, chave, geracao, produtor, ao_concluir):
+        completa = False
+        gerador = None
+        try:
+            gerador = produtor()
+            async for frame in gerador:
+                async with geracao.condicao:
+                    geracao.frames.append(frame)
+                    geracao.condicao.notify_all()
+                if geracao.assinantes == 0:
+                    # Sai do mapa antes do próximo await, para ninguém se inscrever em uma geração abandonada
+                    del self._geracoes[chave]
+                    break
+            else:
+                completa = True
+        except Exception as e:
+            geracao.erro = e
+        finally:
+            if gerador is not None:
+                await gerador.aclose()
+            if completa and ao_concluir is not None:
+                try:
+                    ao_concluir(list(geracao.frames))
+                except Exception as e:
+                    print(f"Erro ao concluir a geração compartilhada: {e}")
+            if self._geracoes.get(chave) is geracao:
+                del self._geracoes[chave]
+            async with geracao.condicao:
+                geracao.concluida = True
+                geracao.condicao.notify_all()
+
+    def em_andamento(self, chave):
+        return chave in self._geracoes
+
+    def estatisticas(self):
+        return {"geracoes": self.geracoes, "assinaturas": self.assinaturas,
+                "compartilhadas": self.assinaturas - self.geracoes, "em_andamento": len(self._geracoes)}
@@ -0,0 +1,147 @@
+"""
+Layout de índice "secoes" (INDICE_LAYOUT=secoes): cada artigo, o documento pai, é dividido
+em trechos pequenos que começam em inícios de seção sempre que possível (itens numerados,
+"1ª Situação", "Passo 2", fim de frase) e só os trechos vão para o FAISS e para o BM25.
+O id de um trecho é "<chave do pai>/<ordem da seção>" e o mapa trecho -> (pai, seção), um
+par de int32 por posição do FAISS, fica em pais.npy, ao lado do índice.
+
+Na consulta, os trechos encontrados são agrupados por artigo na ordem do ranking e cada
+artigo vira um único documento só com as seções encontradas (até PAIS_SECOES_MAXIMAS), em
+ordem. Só essas seções são lidas do docstore. O vetor de uma seção não se dilui no artigo
+inteiro e o contexto fica limitado a k artigos x PAIS_SECOES_MAXIMAS seções.
+"""
+import os
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+LAYOUTS = ("artigo", "secoes")
+NOME_ARQUIVO_PAIS = "pais.npy"
+SEPARADOR_ID = "/"
+# Tamanho máximo de uma seção indexada (INDICE_SECAO_CARACTERES)
+TAMANHO_SECAO = int(os.environ.get("INDICE_SECAO_CARACTERES", "600"))
+
+# Onde começa uma seção no texto já sem quebras de linha: "2.1 ", "3) ", "1ª Situação", "Passo 2"
+_INICIO_SECAO = re.compile(r"\s+(?=(?:\d{1,2}(?:\.\d{1,2})+|\d{1,2}[.)ªº])\s|Passo \d|Situação|Cenário)")
+_FIM_FRASE = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def layout_configurado():
+    layout = os.environ.get("INDICE_LAYOUT", "artigo")
+    if layout not in LAYOUTS:
+        raise ValueError(f"INDICE_LAYOUT inválido: {layout}. Use um de {LAYOUTS}.")
+    return layout
+
+
+def id_trecho(chave_pai, secao):
+    return f"{chave_pai}{SEPARADOR_ID}{secao}"
+
+
+def chave_pai(id_do_trecho):
+    return id_do_trecho.rsplit(SEPARADOR_ID, 1)[0]
+
+
+def dividir_em_secoes(texto, tamanho=None):
+    """
+    Trechos de até `tamanho` caracteres. Seções pequenas vizinhas são juntadas; um trecho
+    já com metade do tamanho termina no próximo início de seção; seções longas são cortadas
+    entre frases e, em último caso, entre palavras.
+    """
+    tamanho = tamanho or TAMANHO_SECAO
+    pedacos = []  # (texto, começa uma seção)
+    for secao in _INICIO_SECAO.split(texto.strip()):
+        if len(secao) <= tamanho:
+            pedacos.append((secao, True))
+            continue
+        for i, frase in enumerate(_FIM_FRASE.split(secao)):
+            if len(frase) <= tamanho:
+                pedacos.append((frase, i == 0))
+            else:
+                pedacos.extend((palavra, i == 0 and j == 0) for j, palavra in enumerate(frase.split()))
+
+    trechos, atual = [], ""
+    for pedaco, inicio_secao in pedacos:
+        if atual and (len(atual) + 1 + len(pedaco) > tamanho or (inicio_secao and len(atual) >= tamanho // 2)):
+            trechos.append(atual)
+            atual = ""
+        atual = f"{atual} {pedaco}" if atual else pedaco
+    if atual:
+        trechos.append(atual)
+    return trechos
+
+
+def documentos_secoes(documento, chave, tamanho=None):
+    """(ids, documentos) das seções de um documento pai, com a ordem da seção em `metadata["secao"]`."""
+    secoes = dividir_em_secoes(documento.page_content, tamanho)
+    return ([id_trecho(chave, secao) for secao in range(len(secoes))],
+            [Document(page_content=texto, metadata={**documento.metadata, "secao": secao})
+             for secao, texto in enumerate(secoes)])
+
+
+def salvar_mapa_pais(vectorstore, caminho_indice):
+    """Grava o pai e a seção de cada posição do FAISS, lidos dos ids dos trechos (sem abrir o docstore)."""
+    ids = vectorstore.index_to_docstore_id
+    mapa = np.empty((len(ids), 2), dtype=np.int32)
+    pais = {}
+    for posicao in range(len(ids)):
+        chave, _, secao = ids[posicao].rpartition(SEPARADOR_ID)
+        mapa[posicao] = (pais.setdefault(chave, len(pais)), int(secao))
+    np.save(os.path.join(caminho_indice, NOME_ARQUIVO_PAIS), mapa)
+
+
+class MapaPais:
+    """Mapa trecho -> artigo de um índice "secoes", aberto com mmap e compartilhado entre os workers."""
+
+    def __init__(self, mapa, posicoes):
+        self.mapa = mapa
+        self.posicoes = posicoes
+
+    @classmethod
+    def carregar(cls, caminho_indice, vectorstore):
+        """O mapa salvo com o índice, ou None se o índice tem um documento por artigo."""
+        caminho = os.path.join(caminho_indice, NOME_ARQUIVO_PAIS)
+        if not os.path.exists(caminho):
+            return None
+        # O docstore mapeado já tem o dicionário id -> posição; o do pickle não
+        posicoes = getattr(vectorstore.docstore, "posicoes", None)
+        if posicoes is None:
+            posicoes = {doc_id: posicao for posicao, doc_id in vectorstore.index_to_docstore_id.items()}
+        return cls(np.load(caminho, mmap_mode="r"), posicoes)
+
+    def agrupar(self, pares, docstore, k, secoes_maximas):
+        """
+        Agrupa [(id do trecho, pontuação)] por artigo, na ordem do ranking, e retorna até k
+        Documents, um por artigo, com a pontuação do melhor trecho e até `secoes_maximas`
+        seções em ordem; seções não consecutivas são separadas por "[…]".
+        """
+        grupos = {}
+        for doc_id, pontuacao in pares:
+            posicao = self.posicoes.get(doc_id)
+            if posicao is None:
+                continue
+            pai, secao = (int(valor) for valor in self.mapa[posicao])
+            if pai not in grupos:
+                if len(grupos) == k:
+                    continue
+                grupos[pai] = (pontuacao, [])
+            secoes = grupos[pai][1]
+            if len(secoes) < secoes_maximas:
+                secoes.append((secao, doc_id))
+
+        documentos = []
+        for pontuacao, secoes in grupos.values():
+            secoes.sort()
+            partes, anterior, metadata = [], None, None
+            for secao, doc_id in secoes:
+                documento = docstore.search(doc_id)
+                metadata = metadata or documento.metadata
+                if anterior is not None and secao != anterior + 1:
+                    partes.append("[…]")
+                partes.append(documento.page_content)
+                anterior = secao
+            metadata = {chave: valor for chave, valor in metadata.items() if chave != "secao"}
+            documentos.append(Document(page_content="\n".join(partes), metadata={
+                **metadata, "doc_id": chave_pai(secoes[0][1]), "score": pontuacao,
+                "secoes": [secao for secao, _ in secoes]}))
+        return documentos
@@ -0,0 +1,166 @@
+import os
+import hashlib
+import inspect
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODELO_EMBEDDINGS_PADRAO = "models/embedding-001"
+CAMINHO_DB_PADRAO = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "embeddings_cache.sqlite3"))
+
+
+class EmbeddingsComCache(Embeddings):
+    """
+    Envolve um modelo de embeddings com duas camadas de cache: um LRU em memória
+    e um banco SQLite em disco. A chave é o nome do modelo, o tipo (documento ou
+    consulta) e o hash SHA-256 do texto, então perguntas repetidas e reconstruções
+    do índice não chamam a API de embeddings.
+    """
+
+    def __init__(self, base, nome_modelo, caminho_db=CAMINHO_DB_PADRAO, tamanho_lru=4096):
+        self.base = base
+        self.nome_modelo = nome_modelo
+        self.caminho_db = caminho_db
+        self.tamanho_lru = tamanho_lru
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self._conexao = None
+        # Volume do disco mantido a cada inserção: o /health não varre a tabela
+        self.entradas_disco = 0
+        self.bytes_disco = 0
+        if caminho_db:
+            os.makedirs(os.path.dirname(os.path.abspath(caminho_db)), exist_ok=True)
+            self._conexao = sqlite3.connect(caminho_db, check_same_thread=False)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (chave TEXT PRIMARY KEY, vetor BLOB NOT NULL)"
+            )
+            self._conexao.commit()
+            # Uma contagem só, na abertura; as inserções de outros processos depois disso não entram
+            self.entradas_disco, self.bytes_disco = self._conexao.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(chave) + LENGTH(vetor)), 0) FROM embeddings"
+            ).fetchone()
+
+    def _chave(self, texto, tipo):
+        hash_texto = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+        return f"{self.nome_modelo}:{tipo}:{hash_texto}"
+
+    def _guardar_lru(self, chave, vetor):
+        self._lru[chave] = vetor
+        self._lru.move_to_end(chave)
+        while len(self._lru) > self.tamanho_lru:
+            self._lru.popitem(last=False)
+
+    def _buscar(self, chaves):
+        """Retorna {chave: vetor} para as chaves encontradas na memória ou no disco."""
+        encontrados = {}
+        faltando = []
+        with self._lock:
+            for chave in chaves:
+                if chave in self._lru:
+                    self._lru.move_to_end(chave)
+                    encontrados[chave] = self._lru[chave]
+                    self.hits_memoria += 1
+                else:
+                    faltando.append(chave)
+            if faltando and self._conexao is not None:
+                # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+                for inicio in range(0, len(faltando), 500):
+                    bloco = faltando[inicio:inicio + 500]
+                    marcadores = ",".join("?" * len(bloco))
+                    linhas = self._conexao.execute(
+                        f"SELECT chave, vetor FROM embeddings WHERE chave IN ({marcadores})", bloco
+                    ).fetchall()
+                    for chave, blob in linhas:
+                        vetor = np.frombuffer(blob, dtype=np.float32).tolist()
+                        encontrados[chave] = vetor
+                        self._guardar_lru(chave, vetor)
+                        self.hits_disco += 1
+        return encontrados
+
+    def _guardar(self, itens):
+        with self._lock:
+            for chave, vetor in itens:
+                self._guardar_lru(chave, vetor)
+            if self._conexao is not None and itens:
+                # A mesma chave tem sempre o mesmo vetor: uma já gravada (por outro worker) fica como está
+                for chave, vetor in itens:
+                    blob = np.asarray(vetor, dtype=np.float32).tobytes()
+                    cursor = self._conexao.execute(
+                        "INSERT OR IGNORE INTO embeddings (chave, vetor) VALUES (?, ?)", (chave, blob))
+                    if cursor.rowcount > 0:
+                        self.entradas_disco += 1
+                        self.bytes_disco += len(chave.encode("utf-8")) + len(blob)
+                self._conexao.commit()
+
+    def _embed(self, textos, tipo, funcao_base):
+        chaves = [self._chave(texto, tipo) for texto in textos]
+        encontrados = self._buscar(dict.fromkeys(chaves))
+        # Textos repetidos na mesma chamada são enviados à API uma única vez
+        pendentes = {chave: texto for chave, texto in zip(chaves, textos) if chave not in encontrados}
+        if pendentes:
+            with self._lock:
+                self.misses += len(pendentes)
+            vetores = funcao_base(list(pendentes.values()))
+            # Converte para float32 para que a resposta seja igual à lida do disco depois
+            novos = [(chave, np.asarray(vetor, dtype=np.float32).tolist()) for chave, vetor in zip(pendentes, vetores)]
+            self._guardar(novos)
+            encontrados.update(novos)
+        return [list(encontrados[chave]) for chave in chaves]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), "documento", self.base.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], "consulta", lambda textos: [self.base.embed_query(textos[0])])[0]
+
+    def embed_queries(self, texts):
+        """
+        Embeddings de várias consultas com uma chamada à API (as que faltam no cache), com as
+        mesmas chaves do `embed_query`: perguntas do lote (/chat/batch) alimentam o cache do /chat.
+        """
+        return self._embed(list(texts), "consulta", self._consultas_base)
+
+    def _consultas_base(self, textos):
+        # O endpoint em lote do Google aceita o tipo da tarefa; sem ele, uma chamada por consulta
+        if "task_type" in inspect.signature(self.base.embed_documents).parameters:
+            return self.base.embed_documents(textos, task_type="RETRIEVAL_QUERY")
+        return [self.base.embed_query(texto) for texto in textos]
+
+    def consulta_em_cache(self, text):
+        """Embedding de consulta já guardado (memória ou disco), ou None; nunca chama a API."""
+        chave = self._chave(text, "consulta")
+        return self._buscar([chave]).get(chave)
+
+    def estatisticas(self):
+        """Retorna a taxa de acerto das duas camadas e o volume armazenado em disco (sem consultar o SQLite)."""
+        with self._lock:
+            total = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "taxa_acerto": round((self.hits_memoria + self.hits_disco) / total, 4) if total else 0.0,
+                "entradas_memoria": len(self._lru),
+                "entradas_disco": self.entradas_disco,
+                "bytes_armazenados": self.bytes_disco,
+            }
+
+
+def criar_embeddings(modelo=MODELO_EMBEDDINGS_PADRAO):
+    """Cria o modelo de embeddings do Google já envolvido pelo cache em memória e em disco."""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    caminho_db = os.environ.get("EMBEDDINGS_CACHE_DB", CAMINHO_DB_PADRAO)
+    return EmbeddingsComCache(
+        GoogleGenerativeAIEmbeddings(model=modelo),
+        nome_modelo=modelo,
+        caminho_db=caminho_db or None,
+        tamanho_lru=int(os.environ.get("EMBEDDINGS_CACHE_LRU", "4096")),
+    )
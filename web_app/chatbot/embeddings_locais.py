@@ -0,0 +1,127 @@
+"""
+Embeddings locais, sem rede: TF-IDF + SVD (LSA) ajustados sobre os textos da base na
+construção do índice e salvos dentro da versão do índice, ao lado do FAISS.
+
+EMBEDDINGS_BACKEND escolhe o modelo nos construtores de índice ("google", o padrão, ou
+"lsa"). O servidor usa sempre o modelo salvo com a versão carregada: um índice LSA só
+pode ser consultado com o mesmo vocabulário e os mesmos componentes que geraram os vetores.
+
+O scikit-learn só é usado no ajuste. O embedding de uma consulta é numpy puro: os pesos
+TF-IDF dos termos da consulta vezes as linhas correspondentes da matriz de componentes,
+dezenas de microssegundos e nenhuma chamada à API.
+"""
+import os
+import math
+from collections import Counter
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from chatbot.indice_lexical import tokenizar
+
+BACKENDS = ("google", "lsa")
+NOME_ARQUIVO_LSA = "embeddings_lsa.npz"
+# Matriz termo x dimensão em um .npy separado, aberta com mmap e compartilhada entre os workers
+NOME_ARQUIVO_COMPONENTES = "embeddings_lsa_componentes.npy"
+
+
+def backend_configurado():
+    backend = os.environ.get("EMBEDDINGS_BACKEND", "google")
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBEDDINGS_BACKEND inválido: {backend}. Use um de {BACKENDS}.")
+    return backend
+
+
+def termos_lsa(texto):
+    """Termos do TF-IDF: as palavras da `tokenizar` e os pares de palavras vizinhas."""
+    palavras = tokenizar(texto)
+    return palavras + [f"{a} {b}" for a, b in zip(palavras, palavras[1:])]
+
+
+class EmbeddingsLSA(Embeddings):
+    """
+    TF-IDF (tf sublinear, idf suavizado) projetado nos componentes de uma SVD truncada e
+    normalizado, então a distância L2 do FAISS ordena como a similaridade de cosseno.
+    """
+
+    nome_modelo = "lsa"
+
+    def __init__(self, vocabulario, idf, componentes):
+        self.vocabulario = vocabulario
+        self.termos = {termo: i for i, termo in enumerate(vocabulario)}
+        self.idf = idf
+        self.componentes = componentes
+        self.dimensao = componentes.shape[1]
+
+    @classmethod
+    def ajustar(cls, textos, dimensao=None, vocabulario_maximo=None):
+        """Ajusta o TF-IDF e a SVD sobre os textos da base (EMBEDDINGS_LSA_DIMENSAO, EMBEDDINGS_LSA_VOCABULARIO)."""
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        dimensao = dimensao or int(os.environ.get("EMBEDDINGS_LSA_DIMENSAO", "256"))
+        vocabulario_maximo = vocabulario_maximo or int(os.environ.get("EMBEDDINGS_LSA_VOCABULARIO", "100000"))
+        # Termos de um único documento só entram em bases pequenas: nas grandes são ruído (e memória)
+        vetorizador = TfidfVectorizer(analyzer=termos_lsa, sublinear_tf=True, dtype=np.float32,
+                                      min_df=2 if len(textos) >= 200 else 1, max_features=vocabulario_maximo)
+        matriz = vetorizador.fit_transform(textos)
+        dimensao = max(1, min(dimensao, matriz.shape[0] - 1, matriz.shape[1] - 1))
+        svd = TruncatedSVD(n_components=dimensao, random_state=0).fit(matriz)
+        vocabulario = [None] * len(vetorizador.vocabulary_)
+        for termo, indice in vetorizador.vocabulary_.items():
+            vocabulario[indice] = termo
+        return cls(vocabulario, vetorizador.idf_.astype(np.float32),
+                   np.ascontiguousarray(svd.components_.T, dtype=np.float32))
+
+    def salvar(self, caminho_indice):
+        np.savez(
+            os.path.join(caminho_indice, NOME_ARQUIVO_LSA),
+            vocabulario=np.frombuffer("\n".join(self.vocabulario).encode("utf-8"), dtype=np.uint8),
+            idf=self.idf,
+        )
+        np.save(os.path.join(caminho_indice, NOME_ARQUIVO_COMPONENTES), self.componentes)
+
+    @classmethod
+    def carregar(cls, caminho_indice):
+        with np.load(os.path.join(caminho_indice, NOME_ARQUIVO_LSA)) as dados:
+            vocabulario = dados["vocabulario"].tobytes().decode("utf-8").split("\n")
+            idf = dados["idf"]
+        componentes = np.load(os.path.join(caminho_indice, NOME_ARQUIVO_COMPONENTES), mmap_mode="r")
+        return cls(vocabulario, idf, componentes)
+
+    def _vetor(self, texto):
+        contagem = Counter(termos_lsa(texto))
+        posicoes, pesos = [], []
+        for termo, tf in contagem.items():
+            t = self.termos.get(termo)
+            if t is not None:
+                posicoes.append(t)
+                pesos.append(1.0 + math.log(tf))
+        vetor = np.zeros(self.dimensao, dtype=np.float32)
+        if posicoes:
+            pesos = np.asarray(pesos, dtype=np.float32) * self.idf[posicoes]
+            vetor = (pesos / np.linalg.norm(pesos)) @ self.componentes[posicoes]
+            norma = np.linalg.norm(vetor)
+            if norma > 0:
+                vetor /= norma
+        return vetor.tolist()
+
+    def embed_documents(self, texts):
+        return [self._vetor(texto) for texto in texts]
+
+    def embed_query(self, text):
+        return self._vetor(text)
+
+    def embed_queries(self, texts):
+        return self.embed_documents(texts)
+
+    def consulta_em_cache(self, text):
+        # Sem API para esperar: no modo "auto" do /search, toda consulta vai para a busca híbrida
+        return self._vetor(text)
+
+
+def carregar_embeddings_locais(caminho_indice):
+    """O modelo local salvo com a versão do índice, ou None se o índice usa os embeddings do Google."""
+    if not os.path.exists(os.path.join(caminho_indice, NOME_ARQUIVO_LSA)):
+        return None
+    return EmbeddingsLSA.carregar(caminho_indice)
@@ -0,0 +1,129 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+NOME_ARQUIVO_BM25 = "bm25.npz"
+_PADRAO_TOKEN = re.compile(r"\w+")
+
+
+def tokenizar(texto):
+    """Quebra o texto em termos minúsculos e sem acentos; números e modelos ("4200", "th") são mantidos."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _PADRAO_TOKEN.findall(texto)
+
+
+def texto_para_indexar(documento):
+    """Texto usado no índice lexical: título do artigo seguido do conteúdo."""
+    titulo = documento.metadata.get("article_title") or documento.metadata.get("titulo_artigo") or ""
+    return f"{titulo} {documento.page_content}"
+
+
+class IndiceBM25:
+    """
+    Índice invertido BM25 guardado em formato CSR: para cada termo do vocabulário,
+    `offsets[t]:offsets[t + 1]` delimita as posições em `docs` e `tfs`.
+    Tudo fica em arrays numpy salvos com `np.savez`, que carregam em milissegundos.
+    """
+
+    def __init__(self, vocabulario, offsets, docs, tfs, tamanhos_docs, ids, k1=1.5, b=0.75):
+        self.vocabulario = vocabulario
+        self.termos = {termo: i for i, termo in enumerate(vocabulario)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.tamanhos_docs = tamanhos_docs
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        total_docs = len(ids)
+        frequencia_docs = np.diff(offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (total_docs - frequencia_docs + 0.5) / (frequencia_docs + 0.5)).astype(np.float32)
+        media = float(tamanhos_docs.mean()) if total_docs else 1.0
+        # Parte do denominador do BM25 que só depende do documento
+        self._normalizacao = (k1 * (1 - b + b * tamanhos_docs / (media or 1.0))).astype(np.float32)
+
+    @classmethod
+    def construir(cls, ids, textos):
+        """Constrói o índice a partir de ids do docstore e dos textos correspondentes."""
+        postings = {}
+        tamanhos = np.zeros(len(ids), dtype=np.float32)
+        for posicao, texto in enumerate(textos):
+            contagem = Counter(tokenizar(texto))
+            tamanhos[posicao] = sum(contagem.values())
+            for termo, tf in contagem.items():
+                postings.setdefault(termo, []).append((posicao, tf))
+
+        vocabulario = sorted(postings)
+        offsets = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+        for i, termo in enumerate(vocabulario):
+            offsets[i + 1] = offsets[i] + len(postings[termo])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for i, termo in enumerate(vocabulario):
+            lista = postings[termo]
+            docs[offsets[i]:offsets[i + 1]] = [posicao for posicao, _ in lista]
+            tfs[offsets[i]:offsets[i + 1]] = [tf for _, tf in lista]
+        return cls(vocabulario, offsets, docs, tfs, tamanhos, list(ids))
+
+    @classmethod
+    def construir_de_vectorstore(cls, vectorstore):
+        """Indexa todos os documentos do docstore de um FAISS do LangChain."""
+        ids = list(vectorstore.index_to_docstore_id.values())
+        documentos = [vectorstore.docstore.search(doc_id) for doc_id in ids]
+        return cls.construir(ids, [texto_para_indexar(doc) for doc in documentos])
+
+    def salvar(self, caminho_indice):
+        np.savez(
+            os.path.join(caminho_indice, NOME_ARQUIVO_BM25),
+            vocabulario=np.frombuffer("\n".join(self.vocabulario).encode("utf-8"), dtype=np.uint8),
+            ids=np.frombuffer("\n".join(self.ids).encode("utf-8"), dtype=np.uint8),
+            offsets=self.offsets,
+            docs=self.docs,
+            tfs=self.tfs,
+            tamanhos_docs=self.tamanhos_docs,
+        )
+
+    @classmethod
+    def carregar(cls, caminho_indice):
+        """Carrega o índice salvo ao lado do FAISS, ou retorna None se ele não existir."""
+        caminho = os.path.join(caminho_indice, NOME_ARQUIVO_BM25)
+        if not os.path.exists(caminho):
+            return None
+        with np.load(caminho) as dados:
+            vocabulario = dados["vocabulario"].tobytes().decode("utf-8").split("\n")
+            ids = dados["ids"].tobytes().decode("utf-8").split("\n")
+            return cls(vocabulario, dados["offsets"], dados["docs"], dados["tfs"], dados["tamanhos_docs"], ids)
+
+    def pontuar(self, consulta):
+        """Retorna o vetor de pontuações BM25 de todos os documentos para a consulta."""
+        pontuacoes = np.zeros(len(self.ids), dtype=np.float32)
+        for termo in set(tokenizar(consulta)):
+            t = self.termos.get(termo)
+            if t is None:
+                continue
+            inicio, fim = self.offsets[t], self.offsets[t + 1]
+            docs = self.docs[inicio:fim]
+            tfs = self.tfs[inicio:fim]
+            pontuacoes[docs] += self.idf[t] * tfs * (self.k1 + 1) / (tfs + self._normalizacao[docs])
+        return pontuacoes
+
+    def buscar(self, consulta, k=8):
+        """Retorna até k pares (id do docstore, pontuação) com pontuação positiva, do maior para o menor."""
+        pontuacoes = self.pontuar(consulta)
+        if not len(pontuacoes):
+            return []
+        k = min(k, len(pontuacoes))
+        candidatos = np.argpartition(-pontuacoes, k - 1)[:k]
+        candidatos = candidatos[np.argsort(-pontuacoes[candidatos])]
+        return [(self.ids[i], float(pontuacoes[i])) for i in candidatos if pontuacoes[i] > 0]
+
+
+def construir_e_salvar_indice_lexical(vectorstore, caminho_indice):
+    """Reconstrói o índice BM25 a partir do docstore e salva ao lado do índice FAISS."""
+    indice = IndiceBM25.construir_de_vectorstore(vectorstore)
+    indice.salvar(caminho_indice)
+    return indice
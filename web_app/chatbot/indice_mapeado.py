@@ -0,0 +1,111 @@
+import os
+import json
+import mmap
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+NOME_DOCSTORE = "docstore.bin"
+NOME_OFFSETS_DOCSTORE = "docstore_offsets.npy"
+NOME_IDS_DOCSTORE = "docstore_ids.json"
+
+
+def salvar_docstore_mapeado(vectorstore, caminho_indice):
+    """
+    Grava o docstore como um único arquivo binário (um JSON por documento, na ordem
+    do índice FAISS), os offsets de cada documento e a lista de ids, para ser lido
+    via mmap pelo servidor. O index.pkl continua sendo gravado pelo `save_local`
+    para as atualizações incrementais.
+    """
+    ids = [vectorstore.index_to_docstore_id[posicao] for posicao in sorted(vectorstore.index_to_docstore_id)]
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    temporario = os.path.join(caminho_indice, NOME_DOCSTORE + ".tmp")
+    with open(temporario, "wb") as f:
+        for i, doc_id in enumerate(ids):
+            documento = vectorstore.docstore.search(doc_id)
+            registro = json.dumps({"page_content": documento.page_content, "metadata": documento.metadata},
+                                  ensure_ascii=False).encode("utf-8")
+            f.write(registro)
+            offsets[i + 1] = offsets[i] + len(registro)
+    np.save(os.path.join(caminho_indice, NOME_OFFSETS_DOCSTORE), offsets)
+    with open(os.path.join(caminho_indice, NOME_IDS_DOCSTORE), "w", encoding="utf-8") as f:
+        json.dump(ids, f, ensure_ascii=False)
+    os.replace(temporario, os.path.join(caminho_indice, NOME_DOCSTORE))
+
+
+class DocstoreSomenteLeitura(TypeError):
+    """O docstore mapeado em memória não aceita alterações: o índice muda pelos scripts de criação."""
+
+    def __init__(self):
+        super().__init__("O docstore mapeado é somente leitura; atualize o índice com os scripts de criação.")
+
+
+class DocstoreMapeado:
+    """
+    Docstore somente leitura sobre o arquivo mapeado em memória. Os documentos só
+    viram objetos Python quando são buscados, então as páginas do arquivo ficam
+    compartilhadas entre os workers do gunicorn em vez de copiadas a cada fork.
+    """
+
+    def __init__(self, caminho_indice):
+        with open(os.path.join(caminho_indice, NOME_IDS_DOCSTORE), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.posicoes = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.offsets = np.load(os.path.join(caminho_indice, NOME_OFFSETS_DOCSTORE), mmap_mode="r")
+        self._dados = b""
+        if self.offsets[-1]:
+            with open(os.path.join(caminho_indice, NOME_DOCSTORE), "rb") as f:
+                self._dados = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def search(self, search):
+        """Mesmo contrato do InMemoryDocstore: o Document ou uma mensagem de erro."""
+        posicao = self.posicoes.get(search)
+        if posicao is None:
+            return f"ID {search} not found."
+        registro = json.loads(self._dados[int(self.offsets[posicao]):int(self.offsets[posicao + 1])])
+        return Document(page_content=registro["page_content"], metadata=registro["metadata"])
+
+    def add(self, texts):
+        raise DocstoreSomenteLeitura()
+
+    def delete(self, ids):
+        raise DocstoreSomenteLeitura()
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def ler_indice_mapeado(caminho_arquivo, tipo="flat"):
+    """
+    Lê o index.faiss mapeado em memória e somente leitura: as listas invertidas dos
+    índices IVF com IO_FLAG_MMAP e os vetores dos índices flat, SQ e HNSW com
+    IO_FLAG_MMAP_IFC. Versões do FAISS sem esse suporte caem na leitura normal.
+    """
+    if tipo.startswith("ivf"):
+        flag = faiss.IO_FLAG_MMAP
+    else:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is None:
+        return faiss.read_index(caminho_arquivo)
+    try:
+        return faiss.read_index(caminho_arquivo, flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(caminho_arquivo)
+
+
+def carregar_vectorstore(caminho_indice, embeddings, tipo="flat"):
+    """
+    Carrega o índice no formato mapeado em memória quando o docstore.bin existe
+    (gerado pelos scripts de criação); senão usa o `FAISS.load_local` com o pickle.
+    """
+    if not os.path.exists(os.path.join(caminho_indice, NOME_DOCSTORE)):
+        return FAISS.load_local(caminho_indice, embeddings, allow_dangerous_deserialization=True)
+    docstore = DocstoreMapeado(caminho_indice)
+    return FAISS(
+        embedding_function=embeddings,
+        index=ler_indice_mapeado(os.path.join(caminho_indice, "index.faiss"), tipo),
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(docstore.ids)),
+    )
@@ -0,0 +1,124 @@
+"""
+Perguntas em lote: POST /chat/batch e a linha de comando usada pelo QA para repassar as
+perguntas dos analistas depois de cada atualização da base de conhecimento.
+
+As perguntas do lote são recuperadas juntas (um pedido de embeddings e uma busca matricial
+no FAISS) e as gerações rodam em um pool limitado (LOTE_MAX_WORKERS), cada uma ocupando uma
+vaga do controle de admissão do LLM como uma pergunta do /chat. O resultado é NDJSON, uma
+linha por pergunta na ordem em que ficam prontas e uma linha final com o resumo.
+
+Uso (no diretório web_app):
+    python -m chatbot.lote perguntas.txt > respostas.ndjson
+    python -m chatbot.lote perguntas.jsonl --saida respostas.ndjson --workers 8
+
+Cada linha da entrada é uma pergunta ou um objeto JSON {"id": ..., "question": ...}.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+# Perguntas aceitas em uma requisição do /chat/batch
+MAX_PERGUNTAS = int(os.environ.get("LOTE_MAX_PERGUNTAS", "500"))
+
+
+def _ler_item(item):
+    """(pergunta, id) de um item do lote: texto ou {"id", "question"}."""
+    if isinstance(item, dict):
+        pergunta, identificador = item.get("question") or item.get("message"), item.get("id")
+    else:
+        pergunta, identificador = item, None
+    if not isinstance(pergunta, str) or not pergunta.strip():
+        raise ValueError("Cada pergunta deve ser um texto não vazio ou um objeto com o campo question.")
+    return pergunta.strip(), identificador
+
+
+def ler_lote(corpo):
+    """Lê {"questions": [...]} do corpo do /chat/batch; lança ValueError com a mensagem para o 400."""
+    itens = corpo.get("questions") if isinstance(corpo, dict) else None
+    if not isinstance(itens, list) or not itens:
+        raise ValueError("Envie um JSON com a lista questions.")
+    if len(itens) > MAX_PERGUNTAS:
+        raise ValueError(f"No máximo {MAX_PERGUNTAS} perguntas por lote.")
+    pares = [_ler_item(item) for item in itens]
+    return [pergunta for pergunta, _ in pares], [identificador for _, identificador in pares]
+
+
+def linhas_ndjson(resultados, ids):
+    """Uma linha JSON por resultado (com o id enviado, se houver) e, no fim, o resumo do lote."""
+    inicio = time.perf_counter()
+    respondidas = erros = 0
+    for resultado in resultados:
+        identificador = ids[resultado["indice"]]
+        if identificador is not None:
+            resultado = {"id": identificador, **resultado}
+        if "error" in resultado:
+            erros += 1
+        else:
+            respondidas += 1
+        yield json.dumps(resultado, ensure_ascii=False) + "\n"
+    duracao = time.perf_counter() - inicio
+    yield json.dumps({"resumo": {
+        "perguntas": len(ids),
+        "respondidas": respondidas,
+        "erros": erros,
+        "duracao_s": round(duracao, 3),
+        "perguntas_por_minuto": round(len(ids) / duracao * 60, 1) if duracao > 0 else None,
+    }}) + "\n"
+
+
+def _ler_arquivo(arquivo):
+    perguntas, ids = [], []
+    for linha in arquivo:
+        linha = linha.strip()
+        if not linha:
+            continue
+        item = json.loads(linha) if linha.startswith("{") else linha
+        pergunta, identificador = _ler_item(item)
+        perguntas.append(pergunta)
+        ids.append(identificador)
+    return perguntas, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Responde um arquivo de perguntas e grava as respostas em NDJSON.")
+    parser.add_argument("entrada", help="arquivo com uma pergunta (ou objeto JSON) por linha; - lê da entrada padrão")
+    parser.add_argument("--saida", help="arquivo NDJSON de saída (padrão: saída padrão)")
+    parser.add_argument("--workers", type=int, help="gerações simultâneas (padrão: LOTE_MAX_WORKERS)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from chatbot import chatbot
+
+    load_dotenv()
+    if args.entrada == "-":
+        perguntas, ids = _ler_arquivo(sys.stdin)
+    else:
+        with open(args.entrada, encoding="utf-8") as arquivo:
+            perguntas, ids = _ler_arquivo(arquivo)
+    if not perguntas:
+        sys.exit("Nenhuma pergunta na entrada.")
+    # A saída padrão é só do NDJSON: mensagens da inicialização vão para a saída de erros
+    with contextlib.redirect_stdout(sys.stderr):
+        pronto = chatbot.inicializar_chatbot()
+    if not pronto:
+        sys.exit("Não foi possível inicializar o chatbot (confira GOOGLE_API_KEY e o índice).")
+
+    saida = open(args.saida, "w", encoding="utf-8") if args.saida else sys.stdout
+    try:
+        for numero, linha in enumerate(linhas_ndjson(chatbot.responder_lote(perguntas, "lote:cli", args.workers),
+                                                     ids), 1):
+            saida.write(linha)
+            saida.flush()
+            if numero <= len(perguntas):
+                print(f"\r{numero}/{len(perguntas)} perguntas", end="", file=sys.stderr)
+        print(file=sys.stderr)
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Métricas Prometheus do /chat: histogramas por etapa, contadores de tokens, erros e
+desconexões, gauges de streams abertos e do tamanho do índice, e a fila do LLM
+(profundidade, gerações em andamento, espera e recusas).
+
+Com vários workers do gunicorn, defina PROMETHEUS_MULTIPROC_DIR (um diretório vazio a
+cada partida) antes de iniciar o servidor: cada processo grava seus valores em arquivos
+mapeados nesse diretório e o /metrics soma todos. Sem prometheus_client instalado, ou
+com METRICAS_PROMETHEUS=0, as métricas viram operações vazias.
+"""
+import os
+import time
+
+try:
+    if os.environ.get("METRICAS_PROMETHEUS", "1") == "0":
+        raise ImportError("métricas desativadas por METRICAS_PROMETHEUS=0")
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                                   generate_latest, multiprocess)
+    PROMETHEUS_DISPONIVEL = True
+except ImportError:
+    PROMETHEUS_DISPONIVEL = False
+
+# Etapas medidas em cada resposta:
+# - embedding, busca_vetorial, busca_lexical: dentro do RetrieverHibrido
+# - montagem_contexto: deduplicação, MMR e orçamento de tokens do prompt
+# - fontes: do início da requisição até o frame com as fontes (inclui a recuperação)
+# - geracao_primeiro_token: das fontes até o primeiro token (montagem do prompt + TTFT do Gemini)
+# - primeiro_token: do início da requisição até o primeiro token
+# - total: a resposta inteira, até o último frame
+# - pesquisa: uma requisição do /search (recuperação, trechos e paginação, sem o LLM)
+# - reordenacao: a segunda etapa da recuperação (RECUPERACAO_REORDENAR=1), sem a busca dos candidatos
+ETAPAS = ("embedding", "busca_vetorial", "busca_lexical", "montagem_contexto", "fontes",
+          "geracao_primeiro_token", "primeiro_token", "total", "pesquisa", "reordenacao")
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BUCKETS_TOKENS = (0, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+class _MetricaNula:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, valor):
+        pass
+
+    def inc(self, valor=1):
+        pass
+
+    def dec(self, valor=1):
+        pass
+
+    def set(self, valor):
+        pass
+
+
+if PROMETHEUS_DISPONIVEL:
+    _histograma_etapas = Histogram("chatbot_etapa_segundos", "Duração de cada etapa da resposta do /chat",
+                                   ["etapa"], buckets=BUCKETS)
+    TOKENS = Counter("chatbot_tokens_enviados_total", "Trechos da resposta (chunks do LLM) enviados por SSE")
+    RESPOSTAS = Counter("chatbot_respostas_total", "Respostas do /chat por rota de atendimento", ["rota"])
+    ERROS = Counter("chatbot_erros_total", "Respostas do /chat encerradas com erro")
+    DESCONEXOES = Counter("chatbot_clientes_desconectados_total", "Streams abandonados pelo cliente antes do fim")
+    STREAMS_ATIVOS = Gauge("chatbot_streams_ativos", "Streams SSE do /chat em andamento",
+                           multiprocess_mode="livesum")
+    INDICE_DOCUMENTOS = Gauge("chatbot_indice_documentos", "Documentos no índice FAISS ativo",
+                              multiprocess_mode="livemax")
+    INDICE_BYTES = Gauge("chatbot_indice_bytes", "Tamanho em disco da versão ativa do índice",
+                         multiprocess_mode="livemax")
+    FILA_LLM = Gauge("chatbot_llm_fila", "Gerações esperando uma vaga do LLM", multiprocess_mode="livesum")
+    LLM_EM_EXECUCAO = Gauge("chatbot_llm_em_execucao", "Gerações do LLM em andamento", multiprocess_mode="livesum")
+    ESPERA_LLM = Histogram("chatbot_llm_espera_segundos", "Espera na fila até a vaga do LLM", buckets=BUCKETS)
+    RECUSAS_LLM = Counter("chatbot_llm_recusas_total", "Perguntas recusadas pela fila do LLM",
+                          ["motivo"])
+    REORDENACAO_ESTOUROS = Counter("chatbot_reordenacao_estouros_total",
+                                   "Reordenações que passaram do orçamento e deixaram sinais de fora")
+    REORDENACAO_FEEDBACK_ERROS = Counter("chatbot_reordenacao_feedback_erros_total",
+                                         "Leituras do banco de feedback para a reordenação que falharam")
+    # Observado a cada montagem_contexto: tokens dos trechos recuperados que não foram para o prompt
+    CONTEXTO_TOKENS_ECONOMIZADOS = Histogram("chatbot_contexto_tokens_economizados",
+                                             "Tokens cortados do contexto por resposta (deduplicação, MMR e orçamento)",
+                                             buckets=BUCKETS_TOKENS)
+else:
+    _histograma_etapas = TOKENS = RESPOSTAS = ERROS = DESCONEXOES = _MetricaNula()
+    STREAMS_ATIVOS = INDICE_DOCUMENTOS = INDICE_BYTES = _MetricaNula()
+    FILA_LLM = LLM_EM_EXECUCAO = ESPERA_LLM = RECUSAS_LLM = _MetricaNula()
+    REORDENACAO_ESTOUROS = REORDENACAO_FEEDBACK_ERROS = CONTEXTO_TOKENS_ECONOMIZADOS = _MetricaNula()
+
+# Filhos resolvidos uma vez: `labels()` a cada observação custaria um lookup com lock
+_etapas = {etapa: _histograma_etapas.labels(etapa) for etapa in ETAPAS}
+
+
+def observar(etapa, segundos):
+    _etapas[etapa].observe(segundos)
+
+
+def registrar_indice(vectorstore, caminho_indice):
+    """Atualiza os gauges do índice ativo (chamado a cada carga ou recarga)."""
+    INDICE_DOCUMENTOS.set(len(vectorstore.index_to_docstore_id))
+    tamanho = 0
+    for nome in os.listdir(caminho_indice):
+        caminho = os.path.join(caminho_indice, nome)
+        if os.path.isfile(caminho):
+            tamanho += os.path.getsize(caminho)
+    INDICE_BYTES.set(tamanho)
+
+
+class MedicaoStream:
+    """
+    Acompanha um stream do /chat. O primeiro frame de uma resposta gerada é o das fontes
+    e os seguintes são tokens, então basta contar os frames. Os contadores são
+    atualizados uma vez, no fim, para não pagar uma escrita por token.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.fontes = None
+        self.primeiro_token = None
+        self.frames = 0
+        STREAMS_ATIVOS.inc()
+
+    def marcar_frame(self):
+        self.frames += 1
+        if self.frames == 1:
+            self.fontes = time.perf_counter()
+            observar("fontes", self.fontes - self.inicio)
+        elif self.frames == 2:
+            self.primeiro_token = time.perf_counter()
+            observar("geracao_primeiro_token", self.primeiro_token - self.fontes)
+            observar("primeiro_token", self.primeiro_token - self.inicio)
+
+    def finalizar(self, desfecho):
+        """`desfecho`: "ok", "erro" ou "desconectado"."""
+        STREAMS_ATIVOS.dec()
+        if self.frames > 1:
+            TOKENS.inc(self.frames - 1)
+        if desfecho == "ok":
+            observar("total", time.perf_counter() - self.inicio)
+        elif desfecho == "erro":
+            ERROS.inc()
+        else:
+            DESCONEXOES.inc()
+
+
+def gerar_metricas():
+    """Retorna (corpo, content type) no formato texto do Prometheus, somando todos os workers se houver."""
+    if not PROMETHEUS_DISPONIVEL:
+        return None, None
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return generate_latest(registro), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def processo_encerrado(pid):
+    """Hook child_exit do gunicorn: descarta os gauges "live" do worker que saiu."""
+    if PROMETHEUS_DISPONIVEL and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,158 @@
+import os
+from collections import Counter
+
+from chatbot.indice_lexical import tokenizar
+
+# Aproximação usada para o Gemini em português: ~4 caracteres por token
+CARACTERES_POR_TOKEN = 4
+
+
+def estimar_tokens(texto):
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+
+def remover_sobreposicao(anterior, atual, maximo=400, minimo=20):
+    """
+    Remove do início de `atual` o trecho que repete o final de `anterior`
+    (o `chunk_overlap` do RecursiveCharacterTextSplitter).
+    """
+    limite = min(maximo, len(anterior), len(atual))
+    for tamanho in range(limite, minimo - 1, -1):
+        if anterior.endswith(atual[:tamanho]):
+            return atual[tamanho:].lstrip()
+    return atual
+
+
+def _similaridade(contagem_a, contagem_b):
+    """Cosseno entre dois vetores de contagem de termos."""
+    if not contagem_a or not contagem_b:
+        return 0.0
+    comuns = contagem_a.keys() & contagem_b.keys()
+    produto = sum(contagem_a[t] * contagem_b[t] for t in comuns)
+    norma_a = sum(v * v for v in contagem_a.values()) ** 0.5
+    norma_b = sum(v * v for v in contagem_b.values()) ** 0.5
+    return produto / (norma_a * norma_b)
+
+
+def k_adaptativo(pontuacoes, k_minimo=2, queda_minima=0.25, razao_minima=0.5):
+    """
+    Escolhe quantos trechos manter a partir das pontuações brutas (já ordenadas), sempre
+    relativas à maior: corta no primeiro trecho abaixo de `razao_minima` da máxima ou na
+    primeira queda entre vizinhos maior que `queda_minima` da máxima. Pontuações quase
+    iguais ficam todas.
+    """
+    if len(pontuacoes) <= k_minimo or pontuacoes[0] <= 0:
+        return len(pontuacoes)
+    for i in range(k_minimo, len(pontuacoes)):
+        if (pontuacoes[i] < pontuacoes[0] * razao_minima
+                or (pontuacoes[i - 1] - pontuacoes[i]) / pontuacoes[0] >= queda_minima):
+            return i
+    return len(pontuacoes)
+
+
+def _codigo_artigo(doc):
+    return str(doc.metadata.get("article_code") or doc.metadata.get("codigo_artigo") or doc.metadata.get("source_file", ""))
+
+
+def montar_contexto(docs, pergunta=None, orcamento_tokens=3000, lambda_mmr=0.7, limiar_duplicata=0.9,
+                    k_minimo=2, queda_minima=0.25):
+    """
+    Monta o contexto do prompt a partir dos trechos recuperados:
+    remove sobreposições e quase-duplicatas, aplica MMR para diversidade, escolhe
+    k pelas quedas de pontuação, agrupa os trechos por artigo e para no orçamento de tokens.
+    Retorna (contexto, estatísticas).
+    """
+    tokens_originais = estimar_tokens("\n\n".join(doc.page_content for doc in docs))
+    if not docs:
+        return "", {"trechos_originais": 0, "trechos_usados": 0, "tokens_originais": 0, "tokens_usados": 0}
+
+    # 1. Relevância: pontuação da recuperação ou, na falta dela, a ordem e a sobreposição com a pergunta.
+    # Pontuações todas iguais (artigos pedidos pelo código) mantêm todos os trechos com o mesmo peso.
+    termos_pergunta = Counter(tokenizar(pergunta)) if pergunta else Counter()
+    contagens = [Counter(tokenizar(doc.page_content)) for doc in docs]
+    if all("score" in doc.metadata for doc in docs):
+        relevancias = [float(doc.metadata["score"]) for doc in docs]
+    else:
+        relevancias = [1.0 / (posicao + 1) + _similaridade(termos_pergunta, contagem)
+                       for posicao, contagem in enumerate(contagens)]
+    # O MMR compara relevância e similaridade na mesma escala; o k adaptativo usa as pontuações brutas
+    brutas = relevancias
+    maximo, minimo = max(relevancias), min(relevancias)
+    escala = (maximo - minimo) or 1.0
+    relevancias = [(r - minimo) / escala for r in relevancias]
+
+    # 2. MMR: escolhe o trecho mais relevante e menos parecido com os já escolhidos
+    restantes = list(range(len(docs)))
+    escolhidos = []
+    pontuacoes_mmr = []
+    while restantes:
+        melhor, melhor_pontuacao, maior_similaridade = None, None, 0.0
+        for i in restantes:
+            similaridade = max((_similaridade(contagens[i], contagens[j]) for j in escolhidos), default=0.0)
+            pontuacao = lambda_mmr * relevancias[i] - (1 - lambda_mmr) * similaridade
+            if melhor_pontuacao is None or pontuacao > melhor_pontuacao:
+                melhor, melhor_pontuacao, maior_similaridade = i, pontuacao, similaridade
+        restantes.remove(melhor)
+        # Quase-duplicatas de um trecho já escolhido são descartadas
+        if maior_similaridade >= limiar_duplicata:
+            continue
+        escolhidos.append(melhor)
+        pontuacoes_mmr.append(brutas[melhor])
+
+    # 3. k adaptativo pelas pontuações brutas; a ordem do MMR decide quais trechos ficam
+    escolhidos = escolhidos[:k_adaptativo(sorted(pontuacoes_mmr, reverse=True), k_minimo, queda_minima)]
+
+    # 4. Agrupa por artigo, na ordem do artigo mais relevante, e remove a sobreposição entre trechos vizinhos
+    grupos = {}
+    for i in escolhidos:
+        grupos.setdefault(_codigo_artigo(docs[i]), []).append(i)
+
+    blocos = []
+    tokens_usados = 0
+    trechos_usados = 0
+    for indices in grupos.values():
+        primeiro = docs[indices[0]]
+        titulo = primeiro.metadata.get("article_title") or primeiro.metadata.get("titulo_artigo") or ""
+        codigo = primeiro.metadata.get("article_code") or primeiro.metadata.get("codigo_artigo") or ""
+        cabecalho = f"[Artigo {codigo} - {titulo}]" if codigo or titulo else ""
+        if cabecalho and primeiro.metadata.get("codigos_alias"):
+            # O mesmo procedimento publicado com outros códigos: a pergunta pode citar qualquer um deles
+            cabecalho = f"{cabecalho[:-1]} (também {', '.join(primeiro.metadata['codigos_alias'])})]"
+        partes = []
+        originais = []
+        # Na ordem do documento: página (índice dos PDFs) e seção (layout "secoes")
+        for i in sorted(indices, key=lambda i: (docs[i].metadata.get("page", 0), docs[i].metadata.get("secao", 0))):
+            texto = docs[i].page_content
+            for anterior in originais:
+                texto = remover_sobreposicao(anterior, texto)
+            originais.append(docs[i].page_content)
+            # 5. Orçamento de tokens: para de adicionar quando estourar (o primeiro trecho sempre entra)
+            custo = estimar_tokens(texto) + (estimar_tokens(cabecalho) if not partes else 0)
+            if trechos_usados and tokens_usados + custo > orcamento_tokens:
+                break
+            partes.append(texto)
+            tokens_usados += custo
+            trechos_usados += 1
+        if partes:
+            blocos.append("\n".join(([cabecalho] if cabecalho else []) + partes))
+        if tokens_usados >= orcamento_tokens:
+            break
+
+    contexto = "\n\n".join(blocos)
+    return contexto, {
+        "trechos_originais": len(docs),
+        "trechos_usados": trechos_usados,
+        "tokens_originais": tokens_originais,
+        "tokens_usados": estimar_tokens(contexto),
+    }
+
+
+def criar_montador_contexto():
+    """Cria a função de montagem com a configuração das variáveis de ambiente CONTEXTO_*."""
+    orcamento = int(os.environ.get("CONTEXTO_ORCAMENTO_TOKENS", "3000"))
+    lambda_mmr = float(os.environ.get("CONTEXTO_LAMBDA_MMR", "0.7"))
+
+    def montar(docs, pergunta=None):
+        return montar_contexto(docs, pergunta, orcamento_tokens=orcamento, lambda_mmr=lambda_mmr)
+
+    return montar
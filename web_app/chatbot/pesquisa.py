@@ -0,0 +1,193 @@
+"""
+Pesquisa de artigos sem o LLM (GET /search): só a etapa de recuperação do /chat, com os
+artigos ordenados, um trecho com os termos da consulta destacados e paginação. A busca é a
+do retriever ativo do /chat (RetrieverHibrido), com a reordenação e o agrupamento das
+seções por artigo quando estão ligados, então as duas rotas ordenam os artigos igual.
+
+No modo "auto" (padrão), a busca é híbrida quando o embedding da consulta já está no
+cache de embeddings e apenas lexical (BM25) quando não está, então nenhuma pesquisa
+espera a API de embeddings. Os modos "hibrido" e "vetorial" calculam o embedding se
+preciso. Artigos cujo código aparece na consulta vêm sempre primeiro.
+"""
+import os
+import re
+import time
+import bisect
+import unicodedata
+
+from chatbot import metricas
+from chatbot.indice_lexical import tokenizar
+from chatbot.recuperacao import buscar_por_codigos
+
+MODOS = ("auto", "lexical", "hibrido", "vetorial")
+# Posição máxima alcançável pela paginação (pagina * por_pagina)
+RESULTADOS_MAXIMOS = int(os.environ.get("PESQUISA_RESULTADOS_MAXIMOS", "100"))
+POR_PAGINA_MAXIMO = 50
+CARACTERES_TRECHO = 220
+
+
+def _variantes_acentuadas():
+    """
+    Letra base -> letras minúsculas acentuadas que a `tokenizar` reduz a ela (a -> àáâãäå).
+    Só o Latin-1, que cobre o português: classes maiores deixam a compilação da regex lenta.
+    """
+    variantes = {}
+    for codigo in range(0xE0, 0x100):
+        letra = chr(codigo)
+        base = "".join(c for c in unicodedata.normalize("NFKD", letra) if not unicodedata.combining(c))
+        if len(base) == 1 and base != letra:
+            variantes[base] = variantes.get(base, "") + letra
+    return variantes
+
+
+_VARIANTES = _variantes_acentuadas()
+# Letra acentuada -> letra base, para normalizar cada termo encontrado sem chamar a `tokenizar`
+_PARA_BASE = str.maketrans({letra: base for base, letras in _VARIANTES.items() for letra in letras})
+
+
+def ler_parametros(argumentos):
+    """Lê q, pagina, por_pagina e modo da query string; lança ValueError com a mensagem para o 400."""
+    consulta = (argumentos.get("q") or "").strip()
+    if not consulta:
+        raise ValueError("O parâmetro q é obrigatório.")
+    try:
+        pagina = int(argumentos.get("pagina", 1))
+        por_pagina = int(argumentos.get("por_pagina", 10))
+    except (TypeError, ValueError):
+        raise ValueError("pagina e por_pagina devem ser números inteiros.")
+    if pagina < 1 or not 1 <= por_pagina <= POR_PAGINA_MAXIMO:
+        raise ValueError(f"Use pagina >= 1 e por_pagina entre 1 e {POR_PAGINA_MAXIMO}.")
+    modo = argumentos.get("modo") or None
+    if modo is not None and modo not in MODOS:
+        raise ValueError(f"modo deve ser um de: {', '.join(MODOS)}.")
+    return consulta, pagina, por_pagina, modo
+
+
+def _recuperar(ativo, consulta, k, artigos, modo, embeddings):
+    """Retorna (modo usado, Documents) da busca do retriever ativo: até k trechos em até `artigos` artigos."""
+    retriever = ativo["retriever"]
+    vetor = None
+    if modo == "auto":
+        if hasattr(embeddings, "consulta_em_cache"):
+            vetor = embeddings.consulta_em_cache(consulta)
+        modo = "hibrido" if vetor is not None else "lexical"
+    if retriever.indice_lexical is None:
+        modo = "vetorial"
+    pares = retriever.buscar_com_score(consulta, k, modo=modo, vetor=vetor)
+    return modo, retriever._documentos(pares, artigos)
+
+
+def _chave_artigo(metadata, doc_id):
+    return metadata.get("codigo_artigo") or metadata.get("article_code") or metadata.get("source_file") or doc_id
+
+
+def padrao_termos(termos):
+    """
+    Regex que encontra os termos (já normalizados pela `tokenizar`) no texto em minúsculas,
+    com ou sem acentos, sem precisar remover os acentos do texto inteiro.
+    """
+    if not termos:
+        return None
+    alternativas = []
+    for termo in sorted(termos, key=len, reverse=True):
+        alternativas.append("".join(f"[{letra}{_VARIANTES[letra]}]" if letra in _VARIANTES else re.escape(letra)
+                                    for letra in termo))
+    return re.compile(r"\b(?:" + "|".join(alternativas) + r")\b")
+
+
+def trecho_destacado(texto, padrao, caracteres=CARACTERES_TRECHO):
+    """
+    Retorna (trecho, destaques): a janela de ~`caracteres` caracteres com mais termos
+    distintos da consulta e os intervalos [início, fim) de cada termo dentro do trecho.
+    """
+    minusculo = texto.lower()
+    if len(minusculo) != len(texto):
+        # lower() mudou o tamanho (caso raro): sem destaques para não desalinhar os offsets
+        padrao = None
+    comecos, finais, termos = [], [], []
+    for ocorrencia in padrao.finditer(minusculo) if padrao else ():
+        comecos.append(ocorrencia.start())
+        finais.append(ocorrencia.end())
+        termos.append(ocorrencia.group().translate(_PARA_BASE))
+    inicio = 0
+    if termos:
+        # Os acertos não se sobrepõem, então começos e fins estão ambos em ordem crescente
+        melhor, todos = -1, len(set(termos))
+        for ancora in comecos:
+            candidato = max(0, min(ancora - 40, len(texto) - caracteres))
+            primeiro = bisect.bisect_left(comecos, candidato)
+            ultimo = bisect.bisect_right(finais, candidato + caracteres)
+            distintos = len(set(termos[primeiro:ultimo]))
+            if distintos > melhor:
+                melhor, inicio = distintos, candidato
+                if distintos == todos:
+                    break
+    fim = min(len(texto), inicio + caracteres)
+    # Não corta palavras: o início volta até um espaço e o fim avança até o próximo
+    if inicio > 0:
+        inicio = texto.rfind(" ", 0, inicio) + 1
+    if fim < len(texto):
+        espaco = texto.find(" ", fim)
+        fim = espaco if espaco != -1 else len(texto)
+
+    prefixo = "…" if inicio > 0 else ""
+    trecho = prefixo + texto[inicio:fim] + ("…" if fim < len(texto) else "")
+    deslocamento = len(prefixo) - inicio
+    destaques = [[comeco + deslocamento, final + deslocamento] for comeco, final in zip(comecos, finais)
+                 if comeco >= inicio and final <= fim]
+    return trecho, destaques
+
+
+def pesquisar(ativo, consulta, pagina=1, por_pagina=10, modo="auto", embeddings=None):
+    """Executa a pesquisa sobre o índice ativo e retorna o corpo JSON do /search."""
+    inicio = time.perf_counter()
+    if modo not in MODOS:
+        raise ValueError(f"modo deve ser um de: {', '.join(MODOS)}.")
+    vectorstore = ativo["vectorstore"]
+    limite = min(RESULTADOS_MAXIMOS, pagina * por_pagina)
+    # Vários trechos podem ser do mesmo artigo: busca mais trechos que artigos pedidos
+    k = min(len(vectorstore.index_to_docstore_id), limite * 3 + 1)
+
+    # Artigo -> (documento, pontuação, correspondência) do melhor trecho, na ordem do ranking
+    artigos = {}
+    for documento in buscar_por_codigos(consulta, ativo["codigos"], vectorstore) if ativo["codigos"] else []:
+        artigos.setdefault(_chave_artigo(documento.metadata, documento.metadata["doc_id"]),
+                           (documento, None, "codigo"))
+    # Um artigo além do limite basta para saber se há mais páginas
+    modo_usado, documentos = _recuperar(ativo, consulta, k, limite + 1, modo, embeddings)
+    for documento in documentos:
+        if len(artigos) > limite:
+            break
+        artigos.setdefault(_chave_artigo(documento.metadata, documento.metadata["doc_id"]),
+                           (documento, documento.metadata["score"], "busca"))
+
+    ordenados = list(artigos.values())[:limite]
+    pagina_atual = ordenados[(pagina - 1) * por_pagina:pagina * por_pagina]
+    # Termos de uma ou duas letras ("o", "de") destacariam o texto inteiro
+    padrao = padrao_termos({termo for termo in tokenizar(consulta) if len(termo) > 2 or termo.isdigit()})
+    resultados = []
+    for posicao, (documento, pontuacao, correspondencia) in enumerate(pagina_atual, (pagina - 1) * por_pagina + 1):
+        metadata = documento.metadata
+        trecho, destaques = trecho_destacado(documento.page_content, padrao)
+        resultados.append({
+            "posicao": posicao,
+            "codigo": metadata.get("codigo_artigo") or metadata.get("article_code"),
+            "titulo": metadata.get("article_title") or metadata.get("titulo_artigo"),
+            "source_file": metadata.get("source_file"),
+            "score": round(pontuacao, 6) if pontuacao is not None else None,
+            "correspondencia": correspondencia,
+            "trecho": trecho,
+            "destaques": destaques,
+        })
+
+    duracao = time.perf_counter() - inicio
+    metricas.observar("pesquisa", duracao)
+    return {
+        "consulta": consulta,
+        "modo": modo_usado,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "tem_mais": len(artigos) > pagina * por_pagina and pagina * por_pagina < RESULTADOS_MAXIMOS,
+        "tempo_ms": round(duracao * 1000, 3),
+        "resultados": resultados,
+    }
@@ -0,0 +1,271 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from chatbot.metricas import observar
+
+# Pool compartilhado para rodar a busca vetorial em paralelo com a lexical
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("RECUPERACAO_THREADS", "8")))
+
+
+def fusao_rrf(listas_ids, rrf_k=60):
+    """
+    Reciprocal Rank Fusion: soma 1 / (rrf_k + posição) de cada id em cada lista
+    e retorna os pares (id, pontuação) do maior para o menor.
+    """
+    pontuacoes = {}
+    for lista in listas_ids:
+        for posicao, doc_id in enumerate(lista, 1):
+            pontuacoes[doc_id] = pontuacoes.get(doc_id, 0.0) + 1.0 / (rrf_k + posicao)
+    return sorted(pontuacoes.items(), key=lambda item: item[1], reverse=True)
+
+
+def buscar_vetorial(vectorstore, query, k):
+    """
+    Busca no índice FAISS e retorna [(doc_id, relevância)], do mais para o menos relevante.
+    Vai direto ao índice para obter o id do docstore, que o `similarity_search` não devolve.
+    """
+    inicio = time.perf_counter()
+    vetor = vectorstore._embed_query(query)
+    observar("embedding", time.perf_counter() - inicio)
+    return buscar_por_vetor(vectorstore, vetor, k)
+
+
+def buscar_posicoes_consulta(vectorstore, query, k):
+    """Embedding da consulta e `buscar_posicoes`, para rodar no pool em paralelo com o BM25."""
+    inicio = time.perf_counter()
+    vetor = vectorstore._embed_query(query)
+    observar("embedding", time.perf_counter() - inicio)
+    return buscar_posicoes(vectorstore, [vetor], k)
+
+
+def buscar_por_vetor(vectorstore, vetor, k):
+    """Como `buscar_vetorial`, mas com o embedding da consulta já calculado."""
+    return buscar_por_vetores(vectorstore, [vetor], k)[0]
+
+
+def buscar_posicoes(vectorstore, vetores, k):
+    """
+    Busca matricial no FAISS sem passar pelos ids do docstore: (relevâncias, posições),
+    matrizes consultas x k, com posição -1 onde o índice não tem k resultados.
+    """
+    inicio = time.perf_counter()
+    matriz = np.asarray(vetores, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(matriz)
+    distancias, posicoes = vectorstore.index.search(matriz, k)
+    observar("busca_vetorial", time.perf_counter() - inicio)
+    relevancia = vectorstore._select_relevance_score_fn()
+    relevancias = np.array([[relevancia(float(distancia)) for distancia in linha] for linha in distancias],
+                           dtype=np.float64).reshape(distancias.shape)
+    return relevancias, posicoes
+
+
+def buscar_por_vetores(vectorstore, vetores, k):
+    """Várias consultas em uma única busca matricial no FAISS; uma lista [(doc_id, relevância)] por vetor."""
+    relevancias, posicoes = buscar_posicoes(vectorstore, vetores, k)
+    return [[(vectorstore.index_to_docstore_id[int(posicao)], float(relevancia))
+             for relevancia, posicao in zip(linha_relevancias, linha_posicoes) if posicao != -1]
+            for linha_relevancias, linha_posicoes in zip(relevancias, posicoes)]
+
+
+class RetrieverHibrido(BaseRetriever):
+    """
+    Combina a busca vetorial do FAISS com o índice BM25 por Reciprocal Rank Fusion.
+    `modo` pode ser "hibrido", "vetorial" ou "lexical"; o modo lexical não gera
+    embedding da pergunta. Sem índice lexical, o retriever usa apenas o FAISS.
+    Cada documento retornado é uma cópia com a pontuação da fusão em `metadata["score"]`.
+
+    Com um `reordenador` (RECUPERACAO_REORDENAR=1), a recuperação tem duas etapas: até
+    `k_reordenacao` candidatos do FAISS (e, no modo híbrido, do BM25) são pontuados de novo
+    pelo `Reordenador` e só os k melhores seguem, com a pontuação dele em `metadata["score"]`.
+
+    Com o mapa de `pais` (índice no layout "secoes"), a busca traz até k x `secoes_por_pai`
+    trechos e o retriever devolve até k artigos, cada um com as suas seções encontradas.
+    """
+
+    vectorstore: Any
+    indice_lexical: Optional[Any] = None
+    k: int = 8
+    k_candidatos: int = 20
+    rrf_k: int = 60
+    modo: str = "hibrido"
+    reordenador: Optional[Any] = None
+    k_reordenacao: int = 50
+    pais: Optional[Any] = None
+    secoes_por_pai: int = 3
+
+    def _documento_com_score(self, doc_id, score):
+        documento = self.vectorstore.docstore.search(doc_id)
+        return Document(page_content=documento.page_content,
+                        metadata={**documento.metadata, "doc_id": doc_id, "score": score})
+
+    def _k_trechos(self):
+        """Trechos buscados por consulta: com o mapa de pais, até `secoes_por_pai` por artigo."""
+        return self.k * self.secoes_por_pai if self.pais is not None else self.k
+
+    def _documentos(self, pares, k=None):
+        """Documents dos pares do ranking; com o mapa de pais, até k artigos (padrão: `self.k`)."""
+        if self.pais is not None:
+            return self.pais.agrupar(pares, self.vectorstore.docstore, k or self.k, self.secoes_por_pai)
+        return [self._documento_com_score(doc_id, score) for doc_id, score in pares]
+
+    def _buscar_lexical(self, query, k):
+        inicio = time.perf_counter()
+        resultado = self.indice_lexical.buscar(query, k)
+        observar("busca_lexical", time.perf_counter() - inicio)
+        return resultado
+
+    def _pontuar_lexical(self, query):
+        inicio = time.perf_counter()
+        pontuacoes = self.indice_lexical.pontuar(query)
+        observar("busca_lexical", time.perf_counter() - inicio)
+        return pontuacoes
+
+    def _reordenar(self, query, modo, relevancias, posicoes, pontuacoes_lexicais, k):
+        """Segunda etapa: os candidatos vetoriais (e os do BM25, no modo híbrido) pontuados pelo reordenador."""
+        return self.reordenador.reordenar(query, relevancias, posicoes, pontuacoes_lexicais, k,
+                                          candidatos_lexicais=self.k_reordenacao if modo != "vetorial" else 0)
+
+    def _modo(self, modo=None):
+        return (modo or self.modo) if self.indice_lexical is not None else "vetorial"
+
+    def _buscar_em_duas_etapas(self, query, k, modo=None, vetor=None):
+        modo = self._modo(modo)
+        candidatos = max(self.k_reordenacao, k)
+        futuro_vetorial = None
+        if modo != "lexical" and vetor is not None:
+            futuro_vetorial = _executor.submit(buscar_posicoes, self.vectorstore, [vetor], candidatos)
+        elif modo != "lexical":
+            futuro_vetorial = _executor.submit(buscar_posicoes_consulta, self.vectorstore, query, candidatos)
+        # O BM25 da pergunta em todos os trechos é um dos sinais do reordenador, mesmo no modo vetorial
+        pontuacoes_lexicais = self._pontuar_lexical(query) if self.indice_lexical is not None else None
+        if futuro_vetorial is not None:
+            relevancias, posicoes = futuro_vetorial.result()
+        else:
+            relevancias, posicoes = np.zeros((1, 0)), np.zeros((1, 0), dtype=np.int64)
+        return self._reordenar(query, modo, relevancias[0], posicoes[0], pontuacoes_lexicais, k)
+
+    def buscar_com_score(self, query, k=None, modo=None, vetor=None):
+        """
+        Retorna [(doc_id, pontuação)] já fundidos, sem montar os documentos. `modo` troca o
+        modo do retriever só nesta busca e `vetor` é o embedding da consulta já calculado
+        (o /search usa o do cache de embeddings para não esperar a API).
+        """
+        k = k or self.k
+        if self.reordenador is not None:
+            return self._buscar_em_duas_etapas(query, k, modo, vetor)
+        modo = self._modo(modo)
+
+        if modo == "lexical":
+            return self._buscar_lexical(query, k)
+
+        candidatos = max(self.k_candidatos, k)
+        if vetor is not None:
+            futuro_vetorial = _executor.submit(buscar_por_vetor, self.vectorstore, vetor, candidatos)
+        else:
+            futuro_vetorial = _executor.submit(buscar_vetorial, self.vectorstore, query, candidatos)
+        lexicais = self._buscar_lexical(query, candidatos) if modo == "hibrido" else []
+        vetoriais = futuro_vetorial.result()
+
+        if modo == "vetorial":
+            return vetoriais[:k]
+        return fusao_rrf([[doc_id for doc_id, _ in vetoriais], [doc_id for doc_id, _ in lexicais]], self.rrf_k)[:k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self._documentos(self.buscar_com_score(query, self._k_trechos()))
+
+    def buscar_em_lote(self, queries):
+        """
+        Documentos de várias consultas de uma vez (POST /chat/batch): um único pedido de
+        embeddings para todas e uma única busca matricial no FAISS, com a mesma fusão do `invoke`.
+        """
+        modo = self._modo()
+        k = self._k_trechos()
+        if modo == "lexical":
+            if self.reordenador is not None:
+                resultados = [self._buscar_em_duas_etapas(query, k) for query in queries]
+            else:
+                resultados = [self._buscar_lexical(query, k) for query in queries]
+        else:
+            inicio = time.perf_counter()
+            embeddings = self.vectorstore.embedding_function
+            if hasattr(embeddings, "embed_queries"):
+                vetores = embeddings.embed_queries(queries)
+            else:
+                vetores = [self.vectorstore._embed_query(query) for query in queries]
+            observar("embedding", time.perf_counter() - inicio)
+            if self.reordenador is not None:
+                relevancias, posicoes = buscar_posicoes(self.vectorstore, vetores, self.k_reordenacao)
+                resultados = [
+                    self._reordenar(query, modo, linha_relevancias, linha_posicoes,
+                                    self._pontuar_lexical(query) if self.indice_lexical is not None else None,
+                                    k)
+                    for query, linha_relevancias, linha_posicoes in zip(queries, relevancias, posicoes)
+                ]
+            else:
+                vetoriais = buscar_por_vetores(self.vectorstore, vetores, self.k_candidatos)
+                if modo == "vetorial":
+                    resultados = [pares[:k] for pares in vetoriais]
+                else:
+                    resultados = [
+                        fusao_rrf([[doc_id for doc_id, _ in pares],
+                                   [doc_id for doc_id, _ in self._buscar_lexical(query, self.k_candidatos)]],
+                                  self.rrf_k)[:k]
+                        for query, pares in zip(queries, vetoriais)
+                    ]
+        return [self._documentos(pares) for pares in resultados]
+
+
+# Código de artigo só com contexto: "artigo 7501", "código 7501", "cód. 7501", "CSF 7501" e listas
+# ("artigos 7501 e 7502"). Um número solto na pergunta ("impressora MP 4200 TH") não é código.
+_PADRAO_CODIGO = re.compile(r"\b(?:artigos?|c[óo]d(?:igos?)?\.?|csf)\s*(?:n[º°o]?\.?\s*)?[:#-]?\s*"
+                            r"(\d{3,6}(?:\s*(?:,|/|\be\b|\bou\b)\s*\d{3,6})*)\b", re.IGNORECASE)
+# Mensagem só com códigos ("7507", "7507 8502", "7501, 7502 ou 7503"): o analista colou os códigos no chat
+_SO_CODIGOS = re.compile(r"\s*\d{3,6}(?:(?:\s*(?:[,;/]|\be\b|\bou\b)\s*|\s+)\d{3,6})*\s*[.?!]?\s*", re.IGNORECASE)
+_NUMERO_CODIGO = re.compile(r"\d{3,6}")
+
+
+def codigos_citados(texto):
+    """Códigos de artigo citados no texto, na ordem em que aparecem."""
+    if _SO_CODIGOS.fullmatch(texto):
+        return _NUMERO_CODIGO.findall(texto)
+    return [codigo for lista in _PADRAO_CODIGO.findall(texto) for codigo in _NUMERO_CODIGO.findall(lista)]
+
+
+def construir_indice_codigos(vectorstore):
+    """
+    Monta o índice código do artigo -> ids do docstore a partir dos metadados
+    `codigo_artigo` (índice estruturado) ou `article_code` (índice dos PDFs), mais os
+    `codigos_alias` das quase duplicatas removidas na geração da base.
+    Códigos não numéricos como "Não Encontrado" são ignorados.
+    """
+    indice = {}
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        metadata = vectorstore.docstore.search(doc_id).metadata
+        codigo = str(metadata.get("codigo_artigo") or metadata.get("article_code") or "").strip()
+        for codigo in [codigo] + list(metadata.get("codigos_alias", ())):
+            if codigo.isdigit():
+                indice.setdefault(codigo, []).append(doc_id)
+    return indice
+
+
+def buscar_por_codigos(pergunta, indice_codigos, vectorstore):
+    """Retorna os documentos dos códigos de artigo citados na pergunta, na ordem em que aparecem."""
+    documentos = []
+    vistos = set()
+    for codigo in codigos_citados(pergunta):
+        for doc_id in indice_codigos.get(codigo, ()):
+            if doc_id not in vistos:
+                vistos.add(doc_id)
+                documento = vectorstore.docstore.search(doc_id)
+                documentos.append(Document(page_content=documento.page_content,
+                                           metadata={**documento.metadata, "doc_id": doc_id, "score": 1.0}))
+    return documentos
@@ -0,0 +1,199 @@
+"""
+Segunda etapa da recuperação (RECUPERACAO_REORDENAR=1): o RetrieverHibrido busca muitos
+candidatos (REORDENACAO_CANDIDATOS, 50 por padrão) e o `Reordenador` os pontua de novo
+com sinais locais, só numpy sobre arrays montados na carga do índice. Os REORDENACAO_K
+melhores (8 por padrão, como na busca de uma etapa) vão para o prompt. Com k=4 o prompt
+fica menor, mas no bench_reordenacao o trecho certo chega menos vezes ao prompt que hoje
+(0,204 contra 0,240); só vale baixar o k depois de ajustar os pesos.
+
+Sinais, cada um normalizado entre os candidatos e somado com o peso de REORDENACAO_PESOS:
+- vetorial: a relevância do FAISS
+- codigo: o código do artigo aparece na pergunta
+- feedback: saldo de 👍/👎 das respostas que citaram o artigo (lido do FEEDBACK_DB na carga)
+- lexical: BM25 da pergunta no trecho (o mesmo índice da busca híbrida)
+- titulo: BM25 da pergunta no título do artigo
+
+Orçamento de latência: os sinais são calculados do mais barato para o mais caro e, passados
+REORDENACAO_ORCAMENTO_MS, os que faltam ficam de fora da consulta (conta em `estouros`).
+"""
+import os
+import time
+import sqlite3
+import logging
+
+import numpy as np
+
+from chatbot import metricas
+from chatbot.indice_lexical import IndiceBM25
+from chatbot.recuperacao import codigos_citados
+
+logger = logging.getLogger(__name__)
+
+PESOS_PADRAO = {"vetorial": 1.0, "codigo": 1.0, "feedback": 0.15, "lexical": 0.6, "titulo": 0.3}
+CAMINHO_FEEDBACK_PADRAO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                       "feedback.sqlite3")
+
+
+def reordenacao_ativada():
+    return os.environ.get("RECUPERACAO_REORDENAR", "0") == "1"
+
+
+def pesos_configurados():
+    """PESOS_PADRAO com os valores de REORDENACAO_PESOS, por exemplo "lexical=0.8,titulo=0"."""
+    pesos = dict(PESOS_PADRAO)
+    for item in filter(None, os.environ.get("REORDENACAO_PESOS", "").split(",")):
+        nome, _, valor = item.partition("=")
+        if nome.strip() not in pesos:
+            raise ValueError(f"Peso de reordenação desconhecido: {nome}. Use um de {', '.join(PESOS_PADRAO)}.")
+        pesos[nome.strip()] = float(valor)
+    return pesos
+
+
+def avaliacoes_por_codigo(caminho_db, codigos):
+    """Código do artigo -> (positivas, negativas) das respostas com feedback que citam o código."""
+    if not caminho_db or not os.path.exists(caminho_db):
+        return {}
+    try:
+        # Somente leitura: quem cria e grava o banco é o feedback.py
+        conexao = sqlite3.connect(f"file:{caminho_db}?mode=ro", uri=True)
+        try:
+            linhas = conexao.execute("SELECT r.texto, f.feedback FROM feedback f "
+                                     "JOIN respostas r ON r.hash = f.hash_resposta").fetchall()
+        finally:
+            conexao.close()
+    except sqlite3.Error as e:
+        metricas.REORDENACAO_FEEDBACK_ERROS.inc()
+        logger.warning("Feedback indisponível para a reordenação: %s", e)
+        return {}
+    avaliacoes = {}
+    for texto, tipo in linhas:
+        for codigo in set(codigos_citados(texto)) & codigos:
+            positivas, negativas = avaliacoes.get(codigo, (0, 0))
+            avaliacoes[codigo] = (positivas + (tipo == "positive"), negativas + (tipo == "negative"))
+    return avaliacoes
+
+
+def _normalizar(valores):
+    """Escala para [0, 1] entre os candidatos; um sinal igual em todos não muda a ordem."""
+    minimo, maximo = valores.min(), valores.max()
+    if maximo <= minimo:
+        return np.zeros(len(valores))
+    return (valores - minimo) / (maximo - minimo)
+
+
+class Reordenador:
+    """
+    Arrays alinhados às posições do FAISS (código do artigo, título e saldo de feedback de
+    cada trecho) e o BM25 dos títulos. As posições do BM25 dos trechos são convertidas
+    quando a ordem dele não é a do FAISS.
+    """
+
+    def __init__(self, ids, codigos, titulos, indice_titulos, saldos, lexical_de, faiss_de, pesos=None,
+                 orcamento_ms=None):
+        self.ids = ids
+        self.codigos = codigos
+        self.titulos = titulos
+        self.indice_titulos = indice_titulos
+        self.saldos = saldos
+        self.lexical_de = lexical_de
+        self.faiss_de = faiss_de
+        self.pesos = pesos or pesos_configurados()
+        orcamento_ms = orcamento_ms or float(os.environ.get("REORDENACAO_ORCAMENTO_MS", "5"))
+        self.orcamento = orcamento_ms / 1000
+        self.consultas = 0
+        self.estouros = 0
+
+    @classmethod
+    def construir(cls, vectorstore, lexical=None, caminho_feedback=None, pesos=None, orcamento_ms=None):
+        """Lê os metadados do docstore uma vez e monta os arrays; o feedback vem de FEEDBACK_DB."""
+        ids = vectorstore.index_to_docstore_id
+        total = len(ids)
+        codigos = np.full(total, -1, dtype=np.int64)
+        titulos = np.zeros(total, dtype=np.int32)
+        titulo_para_id = {}
+        codigo_para_posicoes = {}
+        for posicao in range(total):
+            metadata = vectorstore.docstore.search(ids[posicao]).metadata
+            codigo = str(metadata.get("codigo_artigo") or metadata.get("article_code") or "").strip()
+            if codigo.isdigit():
+                codigos[posicao] = int(codigo)
+                codigo_para_posicoes.setdefault(codigo, []).append(posicao)
+            titulo = metadata.get("article_title") or metadata.get("titulo_artigo") or ""
+            titulos[posicao] = titulo_para_id.setdefault(titulo, len(titulo_para_id))
+        indice_titulos = IndiceBM25.construir([str(i) for i in range(len(titulo_para_id))], list(titulo_para_id))
+
+        saldos = np.zeros(total, dtype=np.float32)
+        caminho_feedback = caminho_feedback or os.environ.get("FEEDBACK_DB") or CAMINHO_FEEDBACK_PADRAO
+        avaliacoes = avaliacoes_por_codigo(caminho_feedback, set(codigo_para_posicoes))
+        for codigo, (positivas, negativas) in avaliacoes.items():
+            # Entre -1 e 1, perto de 0 com poucas avaliações
+            saldos[codigo_para_posicoes[codigo]] = (positivas - negativas) / (positivas + negativas + 2)
+
+        lexical_de = faiss_de = None
+        if lexical is not None and lexical.ids != [ids[posicao] for posicao in range(total)]:
+            # Índices atualizados incrementalmente podem ter o BM25 em outra ordem: -1 onde falta o trecho
+            posicao_faiss = {ids[posicao]: posicao for posicao in range(total)}
+            faiss_de = np.array([posicao_faiss.get(doc_id, -1) for doc_id in lexical.ids], dtype=np.int64)
+            lexical_de = np.full(total, -1, dtype=np.int64)
+            lexical_de[faiss_de[faiss_de >= 0]] = np.flatnonzero(faiss_de >= 0)
+        return cls(ids, codigos, titulos, indice_titulos, saldos, lexical_de, faiss_de, pesos, orcamento_ms)
+
+    def _candidatos_lexicais(self, pontuacoes_lexicais, quantidade):
+        """Posições do FAISS dos `quantidade` trechos de maior BM25 (com pontuação positiva)."""
+        quantidade = min(quantidade, len(pontuacoes_lexicais))
+        if not quantidade:
+            return np.zeros(0, dtype=np.int64)
+        melhores = np.argpartition(-pontuacoes_lexicais, quantidade - 1)[:quantidade]
+        melhores = melhores[pontuacoes_lexicais[melhores] > 0]
+        if self.faiss_de is not None:
+            melhores = self.faiss_de[melhores]
+            melhores = melhores[melhores >= 0]
+        return melhores
+
+    def _lexical_dos_candidatos(self, pontuacoes_lexicais, candidatos):
+        if self.lexical_de is None:
+            return pontuacoes_lexicais[candidatos]
+        posicoes = self.lexical_de[candidatos]
+        return np.where(posicoes >= 0, pontuacoes_lexicais[posicoes], 0.0)
+
+    def reordenar(self, consulta, relevancias, posicoes, pontuacoes_lexicais=None, k=8, candidatos_lexicais=0):
+        """
+        Pontua os candidatos do FAISS (`posicoes`, com as `relevancias`) somados aos
+        `candidatos_lexicais` melhores do BM25 e retorna os k melhores [(doc_id, pontuação)].
+        `pontuacoes_lexicais` é o BM25 da consulta em todos os trechos (`IndiceBM25.pontuar`).
+        """
+        inicio = time.perf_counter()
+        validos = posicoes >= 0
+        candidatos, vetoriais = posicoes[validos].astype(np.int64), relevancias[validos]
+        if pontuacoes_lexicais is not None and candidatos_lexicais:
+            novos = np.setdiff1d(self._candidatos_lexicais(pontuacoes_lexicais, candidatos_lexicais), candidatos)
+            # Trechos que só o BM25 encontrou ficam com a menor relevância vetorial dos candidatos
+            candidatos = np.concatenate([candidatos, novos])
+            vetoriais = np.concatenate([vetoriais, np.full(len(novos), vetoriais.min() if len(vetoriais) else 0.0)])
+        if not len(candidatos):
+            return []
+
+        pontuacoes = self.pesos["vetorial"] * _normalizar(vetoriais)
+        codigos_consulta = [int(codigo) for codigo in codigos_citados(consulta)]
+        if codigos_consulta:
+            pontuacoes += self.pesos["codigo"] * np.isin(self.codigos[candidatos], codigos_consulta)
+        pontuacoes += self.pesos["feedback"] * self.saldos[candidatos]
+        # Os sinais mais caros por último, e só dentro do orçamento
+        sinais = []
+        if pontuacoes_lexicais is not None:
+            sinais.append(("lexical", lambda: self._lexical_dos_candidatos(pontuacoes_lexicais, candidatos)))
+        sinais.append(("titulo", lambda: self.indice_titulos.pontuar(consulta)[self.titulos[candidatos]]))
+        for nome, sinal in sinais:
+            if time.perf_counter() - inicio > self.orcamento:
+                self.estouros += 1
+                metricas.REORDENACAO_ESTOUROS.inc()
+                break
+            if self.pesos[nome]:
+                pontuacoes += self.pesos[nome] * _normalizar(sinal())
+
+        k = min(k, len(candidatos))
+        melhores = np.argpartition(-pontuacoes, k - 1)[:k]
+        melhores = melhores[np.argsort(-pontuacoes[melhores], kind="stable")]
+        self.consultas += 1
+        metricas.observar("reordenacao", time.perf_counter() - inicio)
+        return [(self.ids[int(candidatos[i])], float(pontuacoes[i])) for i in melhores]
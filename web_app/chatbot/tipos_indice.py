@@ -0,0 +1,108 @@
+import os
+import json
+
+import faiss
+import numpy as np
+
+NOME_ARQUIVO_PARAMETROS = "parametros_indice.json"
+
+# flat: busca exata | ivf_flat / hnsw: aproximadas | ivf_pq, sq8, sq_fp16: vetores comprimidos
+TIPOS_INDICE = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8", "sq_fp16")
+
+# Tipos cujo índice FAISS não implementa remove_ids (exigem reconstrução completa para apagar linhas)
+TIPOS_SEM_REMOCAO = ("hnsw",)
+
+
+def parametros_padrao(tipo, total_vetores, dimensao):
+    """Parâmetros de construção e de busca razoáveis para o tamanho da base."""
+    # O FAISS recomenda ao menos ~39 vetores de treino por centróide
+    nlist = int(max(1, min(4 * np.sqrt(max(total_vetores, 1)), total_vetores // 39 or 1)))
+    parametros = {"tipo": tipo, "dimensao": dimensao, "total_vetores": total_vetores}
+    if tipo in ("ivf_flat", "ivf_pq"):
+        parametros.update({"nlist": nlist, "nprobe": max(1, min(nlist, nlist // 8 or 1, 32))})
+    if tipo == "ivf_pq":
+        # m precisa dividir a dimensão; ~8 dimensões por subquantizador (96 bytes por vetor em 768 dimensões)
+        m = next(m for m in range(max(1, dimensao // 8), 0, -1) if dimensao % m == 0)
+        parametros.update({"m": m, "nbits": 8 if total_vetores >= 256 * 39 else 4})
+    if tipo == "hnsw":
+        parametros.update({"hnsw_m": 32, "ef_construction": 80, "ef_search": 64})
+    return parametros
+
+
+def criar_indice_faiss(vetores, tipo="flat", parametros=None):
+    """Cria, treina (quando necessário) e preenche um índice FAISS do tipo pedido."""
+    vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+    total, dimensao = vetores.shape
+    parametros = {**parametros_padrao(tipo, total, dimensao), **(parametros or {})}
+
+    if tipo == "flat":
+        indice = faiss.IndexFlatL2(dimensao)
+    elif tipo == "ivf_flat":
+        indice = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimensao), dimensao, parametros["nlist"])
+    elif tipo == "ivf_pq":
+        indice = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimensao), dimensao, parametros["nlist"],
+                                  parametros["m"], parametros["nbits"])
+    elif tipo == "hnsw":
+        indice = faiss.IndexHNSWFlat(dimensao, parametros["hnsw_m"])
+        indice.hnsw.efConstruction = parametros["ef_construction"]
+    elif tipo == "sq8":
+        indice = faiss.IndexScalarQuantizer(dimensao, faiss.ScalarQuantizer.QT_8bit)
+    elif tipo == "sq_fp16":
+        indice = faiss.IndexScalarQuantizer(dimensao, faiss.ScalarQuantizer.QT_fp16)
+    else:
+        raise ValueError(f"Tipo de índice desconhecido: {tipo}. Use um de {TIPOS_INDICE}.")
+
+    if not indice.is_trained:
+        indice.train(vetores)
+    indice.add(vetores)
+    aplicar_parametros_busca(indice, parametros)
+    return indice, parametros
+
+
+def aplicar_parametros_busca(indice, parametros):
+    """Aplica nprobe (IVF) e efSearch (HNSW) salvos junto do índice ou vindos do ambiente."""
+    parametros = parametros or {}
+    nprobe = os.environ.get("FAISS_NPROBE") or parametros.get("nprobe")
+    ef_search = os.environ.get("FAISS_EF_SEARCH") or parametros.get("ef_search")
+    try:
+        ivf = faiss.extract_index_ivf(indice)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None and nprobe:
+        ivf.nprobe = int(nprobe)
+    if hasattr(indice, "hnsw") and ef_search:
+        indice.hnsw.efSearch = int(ef_search)
+
+
+def salvar_parametros(caminho_indice, parametros):
+    with open(os.path.join(caminho_indice, NOME_ARQUIVO_PARAMETROS), "w", encoding="utf-8") as f:
+        json.dump(parametros, f, ensure_ascii=False, indent=2)
+
+
+def carregar_parametros(caminho_indice):
+    """Parâmetros salvos com o índice; índices antigos sem o arquivo são do tipo flat."""
+    caminho = os.path.join(caminho_indice, NOME_ARQUIVO_PARAMETROS)
+    if not os.path.exists(caminho):
+        return {"tipo": "flat"}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def trocar_indice(vectorstore, tipo, parametros=None):
+    """
+    Substitui o índice flat de um FAISS do LangChain por um índice do tipo pedido,
+    reaproveitando os vetores na mesma ordem (o mapeamento para o docstore não muda).
+    Retorna os parâmetros usados.
+    """
+    if tipo == "flat" and not parametros:
+        return {"tipo": "flat"}
+    vetores = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    vectorstore.index, parametros = criar_indice_faiss(vetores, tipo, parametros)
+    return parametros
+
+
+def tipo_indice_configurado():
+    tipo = os.environ.get("FAISS_TIPO_INDICE", "flat")
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"FAISS_TIPO_INDICE inválido: {tipo}. Use um de {TIPOS_INDICE}.")
+    return tipo
@@ -0,0 +1,59 @@
+import os
+import time
+import shutil
+
+# Layout: <base>/versoes/<versão>/{index.faiss, index.pkl, bm25.npz, ...} e <base>/ATUAL com o nome da versão ativa
+NOME_DIRETORIO_VERSOES = "versoes"
+NOME_ARQUIVO_ATUAL = "ATUAL"
+VERSAO_LEGADO = "legado"
+
+
+def versao_atual(caminho_base):
+    """
+    Retorna (versão, diretório) do snapshot publicado em `caminho_base`, ou (None, None).
+    Índices antigos, salvos direto em `caminho_base`, aparecem como a versão "legado".
+    """
+    caminho_atual = os.path.join(caminho_base, NOME_ARQUIVO_ATUAL)
+    if os.path.exists(caminho_atual):
+        with open(caminho_atual, "r", encoding="utf-8") as f:
+            versao = f.read().strip()
+        caminho_versao = os.path.join(caminho_base, NOME_DIRETORIO_VERSOES, versao)
+        if versao and os.path.isdir(caminho_versao):
+            return versao, caminho_versao
+    if os.path.exists(os.path.join(caminho_base, "index.faiss")):
+        return VERSAO_LEGADO, caminho_base
+    return None, None
+
+
+def criar_versao(caminho_base):
+    """Cria o diretório de um snapshot novo (ainda não publicado) e retorna (versão, diretório)."""
+    diretorio_versoes = os.path.join(caminho_base, NOME_DIRETORIO_VERSOES)
+    os.makedirs(diretorio_versoes, exist_ok=True)
+    base = time.strftime("%Y%m%d-%H%M%S")
+    versao, sufixo = base, 1
+    while os.path.exists(os.path.join(diretorio_versoes, versao)):
+        sufixo += 1
+        versao = f"{base}-{sufixo}"
+    caminho_versao = os.path.join(diretorio_versoes, versao)
+    os.makedirs(caminho_versao)
+    return versao, caminho_versao
+
+
+def publicar_versao(caminho_base, versao, manter=None):
+    """
+    Torna `versao` a ativa trocando o arquivo ATUAL de uma vez (os.replace) e apaga os
+    snapshots mais antigos, mantendo os `manter` mais recentes (INDICE_VERSOES_MANTIDAS).
+    Servidores com uma versão antiga carregada continuam funcionando: os arquivos
+    mapeados em memória só somem do disco quando o último processo os solta.
+    """
+    temporario = os.path.join(caminho_base, NOME_ARQUIVO_ATUAL + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(versao)
+    os.replace(temporario, os.path.join(caminho_base, NOME_ARQUIVO_ATUAL))
+
+    manter = manter if manter is not None else int(os.environ.get("INDICE_VERSOES_MANTIDAS", "3"))
+    diretorio_versoes = os.path.join(caminho_base, NOME_DIRETORIO_VERSOES)
+    antigas = [v for v in sorted(os.listdir(diretorio_versoes)) if v != versao]
+    for antiga in antigas[:max(0, len(antigas) - max(0, manter - 1))]:
+        shutil.rmtree(os.path.join(diretorio_versoes, antiga), ignore_errors=True)
+
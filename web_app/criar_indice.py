@@ -4,9 +4,16 @@ import re
 import google.generativeai as genai
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
+from chatbot.embeddings_cache import criar_embeddings
+from chatbot.embeddings_locais import EmbeddingsLSA, backend_configurado
+from chatbot.documentos_pais import documentos_secoes, id_trecho, layout_configurado, salvar_mapa_pais
+from chatbot.agendador_embeddings import criar_agendador
+from chatbot.indice_lexical import construir_e_salvar_indice_lexical, texto_para_indexar
+from chatbot.indice_mapeado import salvar_docstore_mapeado
+from chatbot.versoes_indice import criar_versao, publicar_versao
+from chatbot.tipos_indice import salvar_parametros, tipo_indice_configurado, trocar_indice
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -48,14 +55,19 @@ def extrair_metadados_do_texto(texto):
 def criar_e_salvar_indice():
     """
     Processa os PDFs, extrai metadados do conteúdo e salva o índice FAISS.
+    EMBEDDINGS_BACKEND=lsa troca os embeddings do Google por um modelo local ajustado sobre os chunks.
+    INDICE_LAYOUT=secoes troca os chunks de 1000 caracteres por seções pequenas ligadas ao artigo.
     """
     try:
-        # 1. Configurar a API Key
+        backend = backend_configurado()
+        layout = layout_configurado()
+        # 1. Configurar a API Key (o backend local não chama a API)
         api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
+        if not api_key and backend == "google":
             print("Erro: A variável de ambiente GOOGLE_API_KEY não foi definida.")
             return
-        genai.configure(api_key=api_key)
+        if api_key:
+            genai.configure(api_key=api_key)
 
         # 2. Definir caminhos
         script_dir = os.path.dirname(__file__)
@@ -79,6 +91,9 @@ def criar_e_salvar_indice():
         print("Processando documentos, extraindo metadados e dividindo em pedaços...")
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
         todos_os_chunks = []
+        ids_chunks = []
+        # Layout "secoes": seções já numeradas por artigo, continuando de uma página para a outra
+        secoes_por_artigo = {}
 
         for doc in documentos:
             # Extrai metadados do CONTEÚDO do documento inteiro
@@ -92,29 +107,69 @@ def criar_e_salvar_indice():
 
             print(f"  - Processando: {source_name} | Código: {codigo_artigo} | Título: {titulo_artigo}")
 
-            # Divide o documento em chunks
-            chunks = text_splitter.split_documents([doc])
-
-            # Adiciona os metadados extraídos a cada chunk
-            for chunk in chunks:
-                chunk.metadata['article_code'] = codigo_artigo
-                chunk.metadata['article_title'] = titulo_artigo
-                # Mantém o nome do arquivo original para referência
-                chunk.metadata['source_file'] = source_name
+            # Adiciona os metadados extraídos ao documento (e a cada chunk)
+            doc.metadata['article_code'] = codigo_artigo
+            doc.metadata['article_title'] = titulo_artigo
+            # Mantém o nome do arquivo original para referência
+            doc.metadata['source_file'] = source_name
+
+            if layout == "secoes":
+                # Páginas sem código são artigos à parte
+                pai = codigo_artigo if codigo_artigo.isdigit() else f"{source_name}:{doc.metadata.get('page', 0)}"
+                _, chunks = documentos_secoes(doc, pai)
+                inicio = secoes_por_artigo.get(pai, 0)
+                for chunk in chunks:
+                    chunk.metadata['secao'] += inicio
+                ids_chunks.extend(id_trecho(pai, chunk.metadata['secao']) for chunk in chunks)
+                secoes_por_artigo[pai] = inicio + len(chunks)
+            else:
+                # Divide o documento em chunks
+                chunks = text_splitter.split_documents([doc])
 
             todos_os_chunks.extend(chunks)
 
         # 4. Gerar Embeddings e Criar o Índice FAISS
         print("\nGerando embeddings e criando o índice FAISS...")
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        vectorstore = FAISS.from_documents(todos_os_chunks, embeddings)
-
-        # 5. Salvar o Índice
-        os.makedirs(caminho_indice, exist_ok=True)
-        vectorstore.save_local(caminho_indice)
+        textos = [chunk.page_content for chunk in todos_os_chunks]
+        # Seções pequenas são embeddadas com o título do artigo
+        textos_embeddings = textos if layout == "artigo" else [texto_para_indexar(chunk) for chunk in todos_os_chunks]
+        if backend == "lsa":
+            embeddings = EmbeddingsLSA.ajustar(textos)
+            vetores = embeddings.embed_documents(textos_embeddings)
+        else:
+            embeddings = criar_embeddings("models/embedding-001")
+            agendador = criar_agendador(embeddings, os.path.join(script_dir, ".checkpoint_embeddings"))
+            vetores = agendador.embeddar(textos_embeddings)
+        vectorstore = FAISS.from_embeddings(
+            zip(textos, vetores), embeddings, metadatas=[chunk.metadata for chunk in todos_os_chunks],
+            ids=ids_chunks or None,
+        )
+        # Troca o índice flat pelo tipo configurado em FAISS_TIPO_INDICE (ivf_flat, hnsw, ivf_pq, sq8...)
+        parametros_indice = trocar_indice(vectorstore, tipo_indice_configurado())
+        parametros_indice["embeddings"] = backend
+        parametros_indice["layout"] = layout
+        if backend == "google":
+            estatisticas = embeddings.estatisticas()
+            print(f"Cache de embeddings: {estatisticas['taxa_acerto']:.1%} de acerto, "
+                  f"{estatisticas['misses']} chamadas à API, {estatisticas['bytes_armazenados']} bytes armazenados")
+
+        # 5. Salvar o Índice em um snapshot novo e publicá-lo
+        versao, caminho_versao = criar_versao(caminho_indice)
+        vectorstore.save_local(caminho_versao)
+        salvar_parametros(caminho_versao, parametros_indice)
+        if backend == "lsa":
+            embeddings.salvar(caminho_versao)
+        # Docstore em formato mapeado em memória, compartilhado entre os workers do gunicorn
+        salvar_docstore_mapeado(vectorstore, caminho_versao)
+        construir_e_salvar_indice_lexical(vectorstore, caminho_versao)
+        if layout == "secoes":
+            salvar_mapa_pais(vectorstore, caminho_versao)
+        publicar_versao(caminho_indice, versao)
+        if backend == "google":
+            agendador.limpar_checkpoint()
 
         print("-" * 80)
-        print(f"Índice FAISS estruturado foi salvo com sucesso em: '{caminho_indice}'")
+        print(f"Índice FAISS estruturado foi salvo com sucesso em: '{caminho_versao}' (versão {versao})")
         print("Execute 'python web_app/app.py' agora para iniciar o servidor.")
         print("-" * 80)
 
@@ -1,30 +1,96 @@
 import os
+import sys
+import json
+import time
+import shutil
+import hashlib
 import pandas as pd
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.docstore.document import Document
 from dotenv import load_dotenv
 import google.generativeai as genai
+from chatbot.embeddings_cache import criar_embeddings
+from chatbot.embeddings_locais import EmbeddingsLSA, backend_configurado
+from chatbot.documentos_pais import chave_pai, documentos_secoes, layout_configurado, salvar_mapa_pais
+from chatbot.agendador_embeddings import criar_agendador
+from chatbot.indice_lexical import construir_e_salvar_indice_lexical, texto_para_indexar
+from chatbot.indice_mapeado import salvar_docstore_mapeado
+from chatbot.versoes_indice import criar_versao, publicar_versao, versao_atual
+from chatbot.tipos_indice import (TIPOS_INDICE, TIPOS_SEM_REMOCAO, carregar_parametros,
+                                  salvar_parametros, tipo_indice_configurado, trocar_indice)
 
-def criar_e_salvar_indice_estruturado():
+NOME_MANIFESTO = 'manifesto.json'
+
+def hash_documento(documento):
+    """Hash do conteúdo e dos metadados de um documento, usado para detectar linhas alteradas."""
+    conteudo = documento.page_content + json.dumps(documento.metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+def chaves_por_codigo(documentos):
+    """
+    Gera uma chave estável por linha a partir do `codigo_artigo`. As linhas de um código
+    repetido (por exemplo "Não Encontrado") recebem um sufixo com o hash do título e do
+    texto, para que apagar ou reordenar uma delas não mude a chave das outras; linhas
+    idênticas, que são intercambiáveis, ainda levam um contador depois do hash.
+    """
+    total_por_codigo = {}
+    for documento in documentos:
+        codigo = documento.metadata['codigo_artigo']
+        total_por_codigo[codigo] = total_por_codigo.get(codigo, 0) + 1
+    ocorrencias = {}
+    chaves = []
+    for documento in documentos:
+        codigo = documento.metadata['codigo_artigo']
+        if total_por_codigo[codigo] == 1:
+            chaves.append(codigo)
+            continue
+        conteudo = documento.metadata.get('titulo_artigo', '') + '\n' + documento.page_content
+        chave = f"{codigo}#{hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:12]}"
+        ocorrencias[chave] = ocorrencias.get(chave, 0) + 1
+        chaves.append(chave if ocorrencias[chave] == 1 else f"{chave}-{ocorrencias[chave]}")
+    return chaves
+
+def carregar_manifesto(caminho_indice):
+    caminho_manifesto = os.path.join(caminho_indice, NOME_MANIFESTO)
+    if not os.path.exists(caminho_manifesto):
+        return None
+    with open(caminho_manifesto, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def salvar_manifesto(caminho_indice, linhas):
+    caminho_manifesto = os.path.join(caminho_indice, NOME_MANIFESTO)
+    with open(caminho_manifesto, 'w', encoding='utf-8') as f:
+        json.dump({'linhas': linhas}, f, ensure_ascii=False)
+
+def criar_e_salvar_indice_estruturado(reconstruir_tudo=False, tipo_indice=None, diretorio=None):
     """
     Lê o arquivo CSV limpo, cria documentos com metadados, gera embeddings 
-    e salva um novo índice FAISS estruturado.
+    e salva o índice FAISS estruturado. Se já existir um índice com manifesto,
+    apenas as linhas novas ou alteradas são processadas e as removidas são apagadas.
+    `tipo_indice` (ou FAISS_TIPO_INDICE) escolhe o índice FAISS: veja `TIPOS_INDICE`.
+    `diretorio` é onde ficam o CSV e o índice (padrão: o diretório deste script).
+    EMBEDDINGS_BACKEND=lsa troca os embeddings do Google por um modelo local ajustado sobre a base.
+    INDICE_LAYOUT=secoes indexa as seções de cada artigo em vez do artigo inteiro (veja documentos_pais).
     """
     load_dotenv()
+    tipo_indice = tipo_indice or tipo_indice_configurado()
+    backend = backend_configurado()
+    layout = layout_configurado()
     print("--- Iniciando a criação do novo índice FAISS estruturado ---")
 
-    # 1. Configurar a API Key do Google
+    # 1. Configurar a API Key do Google (o backend local não chama a API)
     api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
+    if not api_key and backend == 'google':
         print("Erro: A chave de API do Google (GOOGLE_API_KEY) não foi definida.")
         return
-    genai.configure(api_key=api_key)
+    if api_key:
+        genai.configure(api_key=api_key)
 
     # 2. Definir os caminhos
-    project_root = os.path.abspath(os.path.dirname(__file__))
+    project_root = os.path.abspath(diretorio or os.path.dirname(__file__))
     caminho_csv = os.path.join(project_root, 'base_conhecimento_precisao.csv')
     caminho_indice_novo = os.path.join(project_root, 'faiss_index_estruturado')
+    caminho_checkpoint = os.path.join(project_root, '.checkpoint_embeddings_estruturado')
 
     if not os.path.exists(caminho_csv):
         print(f"Erro: Arquivo de conhecimento limpo não encontrado em '{caminho_csv}'.")
@@ -33,7 +99,7 @@ def criar_e_salvar_indice_estruturado():
 
     # 3. Carregar os dados do CSV
     print(f"Carregando dados do arquivo: {caminho_csv}")
-    df = pd.read_csv(caminho_csv)
+    df = pd.read_csv(caminho_csv, dtype={'codigos_alias': str})
     df.dropna(subset=['texto_para_busca'], inplace=True) # Garante que a coluna de busca não seja vazia
 
     # 4. Criar documentos LangChain com metadados
@@ -51,6 +117,9 @@ def criar_e_salvar_indice_estruturado():
             'source_file': f"Artigo_{row.get('codigo_artigo', 'desconhecido')}.pdf"  # Arquivo fonte simulado
             # Adicione aqui outros campos do CSV que queira manter como metadados
         }
+        # Códigos dos quase iguais que a deduplicação juntou nesta linha (scripts/duplicatas.py)
+        if pd.notna(row.get('codigos_alias')) and str(row.get('codigos_alias')).strip():
+            metadata['codigos_alias'] = str(row['codigos_alias']).split(';')
         documento = Document(page_content=page_content, metadata=metadata)
         documentos.append(documento)
 
@@ -60,23 +129,154 @@ def criar_e_salvar_indice_estruturado():
 
     print(f"{len(documentos)} documentos foram criados com sucesso.")
 
-    # 5. Gerar Embeddings e criar o índice FAISS
+    # 5. Comparar com o manifesto do índice existente
+    inicio = time.time()
+    chaves = chaves_por_codigo(documentos)
+    linhas_novas = {chave: hash_documento(doc) for chave, doc in zip(chaves, documentos)}
+    # Cada construção grava um snapshot novo em versoes/; o anterior é a base da atualização incremental
+    versao_anterior, caminho_anterior = versao_atual(caminho_indice_novo)
+    indice_existe = caminho_anterior is not None
+    manifesto = None if reconstruir_tudo or not indice_existe else carregar_manifesto(caminho_anterior)
+    parametros_anteriores = carregar_parametros(caminho_anterior) if indice_existe else {}
+    tipo_anterior = parametros_anteriores.get('tipo', 'flat')
+    if manifesto is not None and indice_existe and tipo_anterior != tipo_indice:
+        print(f"Tipo de índice mudou de '{tipo_anterior}' para '{tipo_indice}'. Reconstruindo o índice completo.")
+        manifesto = None
+    backend_anterior = parametros_anteriores.get('embeddings', 'google')
+    if manifesto is not None and indice_existe and backend_anterior != backend:
+        print(f"Embeddings mudaram de '{backend_anterior}' para '{backend}'. Reconstruindo o índice completo.")
+        manifesto = None
+    layout_anterior = parametros_anteriores.get('layout', 'artigo')
+    if manifesto is not None and indice_existe and layout_anterior != layout:
+        print(f"Layout mudou de '{layout_anterior}' para '{layout}'. Reconstruindo o índice completo.")
+        manifesto = None
+
+    if manifesto is not None and indice_existe:
+        linhas_antigas = manifesto.get('linhas', {})
+        adicionadas = [c for c in linhas_novas if c not in linhas_antigas]
+        atualizadas = [c for c in linhas_novas if c in linhas_antigas and linhas_antigas[c] != linhas_novas[c]]
+        removidas = [c for c in linhas_antigas if c not in linhas_novas]
+    else:
+        linhas_antigas = {}
+        adicionadas, atualizadas, removidas = list(linhas_novas), [], []
+
+    if manifesto is not None and indice_existe and not (adicionadas or atualizadas or removidas):
+        print("Nenhuma linha nova, alterada ou removida. O índice já está atualizado.")
+        return
+
+    # 6. Gerar Embeddings apenas do que mudou e atualizar o índice FAISS
     try:
-        print("Inicializando o modelo de embeddings do Google...")
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        
-        print("Gerando embeddings e construindo o índice FAISS... (Isso pode levar alguns minutos)")
-        vectorstore = FAISS.from_documents(documentos, embeddings)
+        documentos_por_chave = dict(zip(chaves, documentos))
+        para_embeddar = adicionadas + atualizadas
+
+        def indexados(chaves_linhas):
+            """(ids, documentos, textos dos embeddings) das linhas: a linha inteira ou as suas seções."""
+            if layout == 'artigo':
+                docs = [documentos_por_chave[c] for c in chaves_linhas]
+                return list(chaves_linhas), docs, [doc.page_content for doc in docs]
+            ids, docs = [], []
+            for c in chaves_linhas:
+                ids_secoes, secoes = documentos_secoes(documentos_por_chave[c], c)
+                ids.extend(ids_secoes)
+                docs.extend(secoes)
+            # O título vai junto: uma seção sozinha muitas vezes não diz de que artigo é
+            return ids, docs, [texto_para_indexar(doc) for doc in docs]
+
+        if backend == 'lsa':
+            print("Ajustando o modelo de embeddings local (TF-IDF + SVD) sobre a base...")
+            # Ajustado sobre os artigos inteiros também no layout "secoes": as seções são curtas
+            # demais para a SVD separar mais do que os temas da base
+            embeddings = EmbeddingsLSA.ajustar([doc.page_content for doc in documentos])
+            embeddar = embeddings.embed_documents
+        else:
+            print("Inicializando o modelo de embeddings do Google...")
+            embeddings = criar_embeddings("models/embedding-001")
+            agendador = criar_agendador(embeddings, caminho_checkpoint)
+            embeddar = agendador.embeddar
+
+        # Índices sem remove_ids (HNSW) precisam ser reconstruídos para apagar linhas
+        sem_remocao = tipo_indice in TIPOS_SEM_REMOCAO and (removidas or atualizadas)
+
+        # O modelo local é reajustado a cada construção, então todos os vetores são refeitos
+        if linhas_antigas and not sem_remocao and backend == 'google':
+            print(f"Atualizando o índice da versão {versao_anterior}")
+            vectorstore = FAISS.load_local(caminho_anterior, embeddings, allow_dangerous_deserialization=True)
+            # As linhas alteradas são apagadas (com todas as suas seções) e reinseridas com os mesmos ids
+            apagar = set(removidas + atualizadas)
+            ids_para_apagar = [doc_id for doc_id in vectorstore.index_to_docstore_id.values()
+                               if (doc_id if layout == 'artigo' else chave_pai(doc_id)) in apagar]
+            if ids_para_apagar:
+                vectorstore.delete(ids_para_apagar)
+            if para_embeddar:
+                print(f"Gerando embeddings de {len(para_embeddar)} linhas novas ou alteradas...")
+                ids_alterados, docs_alterados, textos = indexados(para_embeddar)
+                vetores = embeddar(textos)
+                vectorstore.add_embeddings(
+                    zip([doc.page_content for doc in docs_alterados], vetores),
+                    metadatas=[doc.metadata for doc in docs_alterados],
+                    ids=ids_alterados,
+                )
+            parametros_indice = carregar_parametros(caminho_anterior)
+        else:
+            print("Gerando embeddings e construindo o índice FAISS... (Isso pode levar alguns minutos)")
+            ids_indexados, docs_indexados, textos = indexados(chaves)
+            if layout == 'secoes':
+                print(f"{len(docs_indexados)} seções indexadas de {len(documentos)} artigos.")
+            vetores = embeddar(textos)
+            vectorstore = FAISS.from_embeddings(
+                zip([doc.page_content for doc in docs_indexados], vetores),
+                embeddings,
+                metadatas=[doc.metadata for doc in docs_indexados],
+                ids=ids_indexados,
+            )
+            if tipo_indice != 'flat':
+                print(f"Construindo o índice FAISS do tipo '{tipo_indice}'...")
+            parametros_indice = trocar_indice(vectorstore, tipo_indice)
+
+        if backend == 'google':
+            estatisticas = embeddings.estatisticas()
+            print(f"Cache de embeddings: {estatisticas['taxa_acerto']:.1%} de acerto, "
+                  f"{estatisticas['misses']} chamadas à API, {estatisticas['bytes_armazenados']} bytes armazenados")
+        parametros_indice['embeddings'] = backend
+        parametros_indice['layout'] = layout
         
-        print(f"Salvando o novo índice em: {caminho_indice_novo}")
-        vectorstore.save_local(caminho_indice_novo)
+        versao, caminho_versao = criar_versao(caminho_indice_novo)
+        print(f"Salvando o índice na versão {versao}: {caminho_versao}")
+        try:
+            vectorstore.save_local(caminho_versao)
+            salvar_parametros(caminho_versao, parametros_indice)
+            if backend == 'lsa':
+                # O modelo fica na versão: o servidor consulta cada índice com o modelo que gerou seus vetores
+                embeddings.salvar(caminho_versao)
+            # Docstore em formato mapeado em memória, compartilhado entre os workers do gunicorn
+            salvar_docstore_mapeado(vectorstore, caminho_versao)
+            print("Construindo o índice lexical BM25...")
+            construir_e_salvar_indice_lexical(vectorstore, caminho_versao)
+            if layout == 'secoes':
+                # Trecho -> artigo, para o retriever devolver um documento por artigo
+                salvar_mapa_pais(vectorstore, caminho_versao)
+            salvar_manifesto(caminho_versao, linhas_novas)
+        except Exception:
+            # Um snapshot incompleto nunca é publicado
+            shutil.rmtree(caminho_versao, ignore_errors=True)
+            raise
+        # Só agora os servidores passam a enxergar a versão nova (recarga sem reiniciar)
+        publicar_versao(caminho_indice_novo, versao)
+        if backend == 'google':
+            agendador.limpar_checkpoint()
         
         print("-" * 50)
-        print("SUCESSO! O novo índice FAISS estruturado foi criado e salvo.")
+        print(f"SUCESSO! O índice FAISS estruturado foi salvo e publicado como versão {versao}.")
+        print(f"Adicionadas: {len(adicionadas)} | Atualizadas: {len(atualizadas)} | "
+              f"Removidas: {len(removidas)} | Tempo: {time.time() - inicio:.1f}s")
         print("-" * 50)
 
     except Exception as e:
         print(f"Ocorreu um erro crítico durante a criação do índice: {e}")
 
 if __name__ == '__main__':
-    criar_e_salvar_indice_estruturado()
+    tipo = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--tipo-indice=')), None)
+    if tipo is not None and tipo not in TIPOS_INDICE:
+        print(f"Tipo de índice inválido: {tipo}. Use um de {TIPOS_INDICE}.")
+        sys.exit(1)
+    criar_e_salvar_indice_estruturado(reconstruir_tudo='--completo' in sys.argv, tipo_indice=tipo)
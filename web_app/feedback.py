@@ -0,0 +1,216 @@
+"""
+Armazenamento do feedback dos usuários em SQLite (WAL).
+
+O POST /feedback só coloca o registro em uma fila em memória; uma thread em segundo
+plano grava os registros em lotes, em uma transação por lote. O texto de cada resposta
+(vários KB) é guardado uma única vez na tabela `respostas` e referenciado pelo hash
+SHA-256. O feedback.csv antigo é importado uma vez, na primeira abertura do banco.
+
+Uso: python feedback.py --exportar feedback_exportado.csv
+"""
+import os
+import csv
+import queue
+import atexit
+import sqlite3
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+# Configuração do arquivo de feedback
+FEEDBACK_FILE = os.path.join(os.path.dirname(__file__), 'feedback.csv')
+FEEDBACK_DB = os.environ.get("FEEDBACK_DB") or os.path.join(os.path.dirname(__file__), 'feedback.sqlite3')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respostas (hash TEXT PRIMARY KEY, texto TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    pergunta TEXT NOT NULL,
+    hash_resposta TEXT NOT NULL REFERENCES respostas (hash),
+    feedback TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS importacoes (arquivo TEXT PRIMARY KEY, linhas INTEGER NOT NULL, em TEXT NOT NULL);
+"""
+
+
+def hash_resposta(texto):
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _conectar(caminho_db):
+    # timeout alto: vários workers do gunicorn escrevem no mesmo banco e o SQLite serializa as escritas
+    conexao = sqlite3.connect(caminho_db, timeout=30, check_same_thread=False)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+def _inserir(conexao, registros):
+    """Grava (timestamp, pergunta, resposta, feedback) na transação aberta, cada resposta uma única vez."""
+    hashes = [hash_resposta(resposta) for _, _, resposta, _ in registros]
+    conexao.executemany(
+        "INSERT OR IGNORE INTO respostas (hash, texto) VALUES (?, ?)",
+        {h: r[2] for h, r in zip(hashes, registros)}.items(),
+    )
+    conexao.executemany(
+        "INSERT INTO feedback (timestamp, pergunta, hash_resposta, feedback) VALUES (?, ?, ?, ?)",
+        [(timestamp, pergunta, h, tipo) for (timestamp, pergunta, _, tipo), h in zip(registros, hashes)],
+    )
+
+
+class GravadorFeedback:
+    """
+    Fila em memória e thread de gravação em lotes. `registrar` nunca toca o disco.
+    A thread é criada no primeiro registro de cada processo, então o gravador pode ser
+    criado no master do gunicorn (preload) sem perder a thread no fork.
+    Um lote que falha por banco travado (OperationalError) é gravado de novo, com espera
+    crescente, até `max_tentativas` vezes; só então os registros contam em `erros`.
+    """
+
+    def __init__(self, caminho_db=FEEDBACK_DB, tamanho_lote=256, max_tentativas=5, espera_inicial=0.5):
+        self.caminho_db = caminho_db
+        self.tamanho_lote = tamanho_lote
+        self.max_tentativas = max(1, max_tentativas)
+        self.espera_inicial = espera_inicial
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid_thread = None
+        self.gravados = 0
+        self.lotes = 0
+        self.erros = 0
+        self.novas_tentativas = 0
+
+    def _garantir_thread(self):
+        if self._pid_thread == os.getpid():
+            return
+        with self._lock:
+            if self._pid_thread != os.getpid():
+                threading.Thread(target=self._gravar_em_lotes, name="gravador-feedback", daemon=True).start()
+                self._pid_thread = os.getpid()
+
+    def registrar(self, question, answer, feedback_type):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._garantir_thread()
+        self._fila.put((timestamp, question, answer, feedback_type))
+
+    def _proximo_lote(self):
+        # Espera o primeiro registro e leva junto o que acumulou enquanto o lote anterior era gravado
+        lote = [self._fila.get()]
+        try:
+            while len(lote) < self.tamanho_lote:
+                lote.append(self._fila.get_nowait())
+        except queue.Empty:
+            pass
+        return lote
+
+    def _gravar_lote(self, conexao, lote):
+        """Grava o lote em uma transação, repetindo enquanto o erro for de banco travado."""
+        for tentativa in range(self.max_tentativas):
+            try:
+                with conexao:
+                    _inserir(conexao, lote)
+                return
+            except sqlite3.OperationalError:
+                if tentativa == self.max_tentativas - 1:
+                    raise
+                self.novas_tentativas += 1
+                time.sleep(self.espera_inicial * (2 ** tentativa))
+
+    def _gravar_em_lotes(self):
+        conexao = _conectar(self.caminho_db)
+        while True:
+            lote = self._proximo_lote()
+            try:
+                self._gravar_lote(conexao, lote)
+                self.gravados += len(lote)
+                self.lotes += 1
+            except Exception as e:
+                self.erros += len(lote)
+                print(f"Erro ao gravar {len(lote)} feedbacks: {e}")
+            finally:
+                for _ in lote:
+                    self._fila.task_done()
+
+    def descarregar(self):
+        """Bloqueia até que todos os registros enfileirados tenham sido gravados."""
+        if self._pid_thread == os.getpid():
+            self._fila.join()
+
+    def estatisticas(self):
+        return {"pendentes": self._fila.qsize(), "gravados": self.gravados, "lotes": self.lotes, "erros": self.erros,
+                "novas_tentativas": self.novas_tentativas}
+
+
+def importar_csv(caminho_db=FEEDBACK_DB, caminho_csv=FEEDBACK_FILE):
+    """Importa o feedback.csv antigo uma única vez. Retorna o número de linhas importadas."""
+    if not os.path.isfile(caminho_csv):
+        return 0
+    conexao = _conectar(caminho_db)
+    try:
+        # BEGIN IMMEDIATE: se dois workers abrirem o banco juntos, só um importa
+        conexao.execute("BEGIN IMMEDIATE")
+        nome = os.path.basename(caminho_csv)
+        if conexao.execute("SELECT 1 FROM importacoes WHERE arquivo = ?", (nome,)).fetchone():
+            conexao.rollback()
+            return 0
+        with open(caminho_csv, newline='', encoding='utf-8') as f:
+            registros = [(l["Timestamp"], l["Question"], l["Answer"], l["Feedback"]) for l in csv.DictReader(f)]
+        _inserir(conexao, registros)
+        conexao.execute("INSERT INTO importacoes (arquivo, linhas, em) VALUES (?, ?, ?)",
+                        (nome, len(registros), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conexao.commit()
+        return len(registros)
+    finally:
+        conexao.close()
+
+
+def exportar_csv(caminho_csv, caminho_db=FEEDBACK_DB):
+    """Exporta o feedback no formato do CSV antigo, com o texto completo das respostas."""
+    conexao = _conectar(caminho_db)
+    try:
+        linhas = conexao.execute(
+            "SELECT f.timestamp, f.pergunta, r.texto, f.feedback FROM feedback f "
+            "JOIN respostas r ON r.hash = f.hash_resposta ORDER BY f.id"
+        )
+        with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Timestamp", "Question", "Answer", "Feedback"])
+            writer.writerows(linhas)
+    finally:
+        conexao.close()
+
+
+gravador = None
+_lock_gravador = threading.Lock()
+
+
+def obter_gravador():
+    """Cria o gravador do processo na primeira chamada, importando o feedback.csv antigo se preciso."""
+    global gravador
+    if gravador is None:
+        with _lock_gravador:
+            if gravador is None:
+                importados = importar_csv()
+                if importados:
+                    print(f"{importados} feedbacks importados de {FEEDBACK_FILE} para {FEEDBACK_DB}")
+                gravador = GravadorFeedback()
+                atexit.register(gravador.descarregar)
+    return gravador
+
+
+def gravar_feedback(question, answer, feedback_type):
+    """Enfileira o feedback; a gravação no SQLite acontece em lotes, fora da requisição."""
+    obter_gravador().registrar(question, answer, feedback_type)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exporta o feedback gravado no SQLite para CSV.")
+    parser.add_argument('--exportar', required=True, help="Arquivo CSV de saída")
+    args = parser.parse_args()
+    importar_csv()
+    exportar_csv(args.exportar)
+    print(f"Feedback exportado para {args.exportar}")
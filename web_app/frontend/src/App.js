@@ -5,15 +5,17 @@ import './App.css';
 
 function App() {
   const [username, setUsername] = useState(null);
+  const [token, setToken] = useState(null);
 
-  const handleLogin = (user) => {
+  const handleLogin = (user, sessionToken) => {
     setUsername(user);
+    setToken(sessionToken || null);
   };
 
   return (
     <div className="App">
       {username ? (
-        <Chat username={username} />
+        <Chat username={username} token={token} />
       ) : (
         <Login onLogin={handleLogin} />
       )}
@@ -3,7 +3,7 @@ import ReactMarkdown from 'react-markdown';
 import { API_BASE_URL } from './config';
 import './Chat.css';
 
-function Chat({ username }) {
+function Chat({ username, token }) {
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
   const [isConnected, setIsConnected] = useState(false);
@@ -73,7 +73,10 @@ function Chat({ username }) {
     setIsLoading(true);
 
     try {
-      const response = await fetch(`${API_BASE_URL}/chat?message=${encodeURIComponent(newMessage)}`);
+      // O token identifica o usuário na fila do LLM do backend
+      const response = await fetch(`${API_BASE_URL}/chat?message=${encodeURIComponent(newMessage)}`, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {}
+      });
       const responseText = await response.text();
       
       // Processa múltiplas mensagens SSE
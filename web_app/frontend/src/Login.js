@@ -27,7 +27,8 @@ function Login({ onLogin }) {
       clearTimeout(timeoutId);
       
       if (response.ok) {
-        onLogin(username);
+        const data = await response.json();
+        onLogin(username, data.token);
       } else {
         setError('Usuário ou senha inválidos.');
       }
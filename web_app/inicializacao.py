@@ -0,0 +1,163 @@
+"""
+Inicialização do chatbot em segundo plano, compartilhada por app.py e app_async.py.
+O módulo chatbot.chatbot (langchain, google-generativeai, faiss) só é importado aqui,
+então o servidor responde /health/live enquanto o índice e a cadeia de QA carregam.
+"""
+import os
+import hmac
+import json
+import time
+import threading
+from chatbot.versoes_indice import NOME_ARQUIVO_ATUAL
+
+# Estados: parado -> inicializando -> pronto | sem_indice | erro | indisponivel (dependências ausentes)
+_estado = {"estado": "parado", "mensagem": None, "inicio": None, "duracao_s": None, "pid": None}
+_lock = threading.Lock()
+modulo_chatbot = None
+# Última recarga do índice (POST /admin/recarregar-indice ou vigia do arquivo ATUAL)
+_recarga = {"estado": None, "mensagem": None, "em": None}
+_lock_recarga = threading.Lock()
+
+
+def carregar_modulo_chatbot():
+    """Importa chatbot.chatbot sob demanda e guarda o módulo."""
+    global modulo_chatbot
+    if modulo_chatbot is None:
+        import chatbot.chatbot as modulo
+        modulo_chatbot = modulo
+    return modulo_chatbot
+
+
+def _definir(estado, mensagem=None):
+    with _lock:
+        _estado["estado"] = estado
+        _estado["mensagem"] = mensagem
+        if _estado["inicio"] is not None:
+            _estado["duracao_s"] = round(time.time() - _estado["inicio"], 3)
+
+
+def _inicializar():
+    try:
+        modulo = carregar_modulo_chatbot()
+    except ImportError as e:
+        _definir("indisponivel", f"Dependências do chatbot indisponíveis: {e}")
+        return
+    try:
+        if modulo.versao_atual(modulo.CAMINHO_INDICE_PADRAO)[1] is None:
+            # O índice é construído fora do servidor (criar_indice_estruturado.py ou railway_start.sh)
+            _definir("sem_indice", f"Índice não encontrado em '{modulo.CAMINHO_INDICE_PADRAO}'. "
+                                   "Execute 'python criar_indice_estruturado.py' antes de iniciar o servidor.")
+        elif modulo.inicializar_chatbot():
+            _definir("pronto")
+            _iniciar_vigia()
+        else:
+            _definir("erro", "Falha ao inicializar o chatbot. Verifique a GOOGLE_API_KEY e o índice.")
+    except Exception as e:
+        _definir("erro", f"Falha ao inicializar o chatbot: {e}")
+
+
+def iniciar(em_segundo_plano=True):
+    """
+    Inicia a carga do chatbot, por padrão em uma thread daemon.
+    Chamadas repetidas enquanto a carga está em andamento ou concluída não fazem nada.
+    Um estado herdado do master do gunicorn pelo fork não conta: a thread não atravessa
+    o fork e os clientes do Gemini precisam ser criados no próprio worker.
+    """
+    with _lock:
+        if _estado["estado"] in ("inicializando", "pronto") and _estado["pid"] == os.getpid():
+            return
+        _estado.update(estado="inicializando", mensagem=None, inicio=time.time(), duracao_s=None, pid=os.getpid())
+    if em_segundo_plano:
+        threading.Thread(target=_inicializar, name="inicializacao-chatbot", daemon=True).start()
+    else:
+        _inicializar()
+
+
+def _recarregar():
+    try:
+        trocou = modulo_chatbot.recarregar_indice()
+        estado, mensagem = ("trocado" if trocou else "sem_mudanca"), None
+    except Exception as e:
+        # A versão anterior continua atendendo
+        estado, mensagem = "erro", f"Falha ao recarregar o índice: {e}"
+    with _lock:
+        _recarga.update(estado=estado, mensagem=mensagem, em=time.strftime("%Y-%m-%dT%H:%M:%S"))
+
+
+def recarregar(em_segundo_plano=True):
+    """
+    Carrega a versão publicada do índice e troca a ativa quando terminar.
+    Retorna False se o chatbot não está pronto ou se já há uma recarga em andamento.
+    """
+    if not pronto() or not _lock_recarga.acquire(blocking=False):
+        return False
+
+    def executar():
+        try:
+            _recarregar()
+        finally:
+            _lock_recarga.release()
+
+    if em_segundo_plano:
+        threading.Thread(target=executar, name="recarga-indice", daemon=True).start()
+    else:
+        executar()
+    return True
+
+
+def token_admin_valido(token):
+    """Confere o cabeçalho X-Admin-Token com ADMIN_TOKEN; sem ADMIN_TOKEN a rota de admin fica fechada."""
+    esperado = os.environ.get("ADMIN_TOKEN")
+    return bool(esperado and token and hmac.compare_digest(token, esperado))
+
+
+def _iniciar_vigia():
+    """Com INDICE_VIGIAR_SEGUNDOS, confere periodicamente se uma versão nova do índice foi publicada."""
+    intervalo = float(os.environ.get("INDICE_VIGIAR_SEGUNDOS", "0"))
+    if intervalo <= 0:
+        return
+
+    def vigiar():
+        caminho_arquivo = os.path.join(modulo_chatbot.CAMINHO_INDICE_PADRAO, NOME_ARQUIVO_ATUAL)
+        ultima = None
+        while True:
+            time.sleep(intervalo)
+            try:
+                mtime = os.stat(caminho_arquivo).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != ultima:
+                ultima = mtime
+                recarregar(em_segundo_plano=False)
+
+    threading.Thread(target=vigiar, name="vigia-indice", daemon=True).start()
+
+
+def pronto():
+    return _estado["estado"] == "pronto"
+
+
+def status():
+    with _lock:
+        return {"estado": _estado["estado"], "mensagem": _estado["mensagem"], "duracao_s": _estado["duracao_s"]}
+
+
+def status_indice():
+    """Versão ativa do índice, tempo de carga e resultado da última recarga."""
+    modulo = modulo_chatbot if pronto() else None
+    with _lock:
+        recarga = dict(_recarga)
+    versao = (modulo.obter_versao_indice() if modulo else None) or {}
+    return {**versao, "ultima_recarga": recarga}
+
+
+def frame_indisponivel():
+    """Frame SSE enviado ao /chat enquanto o chatbot não está pronto."""
+    estado = status()
+    if estado["estado"] == "indisponivel":
+        dados = {"answer": "Serviço em manutenção. Por favor, tente novamente mais tarde."}
+    elif estado["estado"] in ("parado", "inicializando"):
+        dados = {"error": "O chatbot ainda está sendo inicializado. Tente novamente em alguns segundos."}
+    else:
+        dados = {"error": estado["mensagem"] or "O chatbot não foi inicializado corretamente."}
+    return "data: " + json.dumps(dados) + "\n\n"
@@ -40,6 +40,23 @@ else
     echo "✅ GOOGLE_API_KEY configurada"
 fi
 
+# O índice é construído aqui, fora do processo do servidor (o app só carrega o índice pronto).
+# Versões publicadas ficam em faiss_index_estruturado/versoes, com a ativa em faiss_index_estruturado/ATUAL
+if [ ! -f "faiss_index_estruturado/ATUAL" ] && [ ! -f "faiss_index_estruturado/index.faiss" ] && [ -f "base_conhecimento_precisao.csv" ]; then
+    echo "📦 Índice não encontrado, construindo antes de iniciar o servidor..."
+    python3 criar_indice_estruturado.py || echo "❌ Falha ao construir o índice"
+fi
+
 # Inicia a aplicação
 echo "🚀 Iniciando aplicação..."
-exec gunicorn app:app --bind 0.0.0.0:$PORT --workers 1 --timeout 60
\ No newline at end of file
+# SERVIDOR_ASYNC=1 usa o servidor ASGI (app_async.py): um processo segura muitos streams SSE
+if [ "$SERVIDOR_ASYNC" = "1" ]; then
+    exec uvicorn app_async:app --host 0.0.0.0 --port $PORT
+fi
+# Métricas do Prometheus somadas entre os workers: o diretório começa vazio a cada partida
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# O índice é carregado uma vez no master e compartilhado pelos workers (hooks em app.py)
+export PRE_CARREGAR_INDICE="${PRE_CARREGAR_INDICE:-1}"
+exec gunicorn -c python:app app:app --bind 0.0.0.0:$PORT --workers ${GUNICORN_WORKERS:-1} --timeout 60
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.embeddings import Embeddings
+
+from chatbot.agendador_embeddings import AgendadorEmbeddings, criar_agendador
+from chatbot.embeddings_cache import EmbeddingsComCache
+
+
+class BackendInstavel(Embeddings):
+    """Falha a primeira chamada de cada lote e conta as chamadas."""
+
+    def __init__(self, falhar_depois_de=None):
+        self.falhar_depois_de = falhar_depois_de
+        self.chamadas = 0
+        self.falhas = 0
+        self.vistos = set()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, textos):
+        with self._lock:
+            self.chamadas += 1
+            if self.falhar_depois_de is not None and self.chamadas > self.falhar_depois_de:
+                raise RuntimeError("construção interrompida")
+            if self.falhar_depois_de is None and textos[0] not in self.vistos:
+                self.vistos.add(textos[0])
+                self.falhas += 1
+                raise RuntimeError("erro temporário")
+        return [[float(len(texto)), 1.0] for texto in textos]
+
+    def embed_query(self, texto):
+        return self.embed_documents([texto])[0]
+
+
+def test_tentativas_extras_somam_as_falhas_de_todas_as_threads():
+    backend = BackendInstavel()
+    agendador = AgendadorEmbeddings(backend, tamanho_lote=2, max_workers=8, espera_inicial=0,
+                                    mostrar_progresso=False)
+    vetores = agendador.embeddar([f"texto {i}" for i in range(64)])
+    assert len(vetores) == 64
+    assert agendador.tentativas_extras == backend.falhas == 32
+
+
+def test_construcao_interrompida_retoma_pelo_cache_de_embeddings(tmp_path):
+    textos = [f"texto {i}" for i in range(40)]
+    caminho_checkpoint = str(tmp_path / "checkpoint")
+    interrompido = BackendInstavel(falhar_depois_de=3)
+    agendador = criar_agendador(EmbeddingsComCache(interrompido, "falso", str(tmp_path / "cache.sqlite3")),
+                                caminho_checkpoint)
+    agendador.tamanho_lote, agendador.max_workers, agendador.max_tentativas = 8, 1, 1
+    agendador.mostrar_progresso = False
+    with pytest.raises(RuntimeError):
+        agendador.embeddar(textos)
+    # Sem .npy: os lotes concluídos estão no SQLite
+    assert not os.path.exists(caminho_checkpoint)
+
+    retomado = BackendInstavel(falhar_depois_de=10 ** 6)
+    agendador = criar_agendador(EmbeddingsComCache(retomado, "falso", str(tmp_path / "cache.sqlite3")),
+                                caminho_checkpoint)
+    agendador.tamanho_lote, agendador.mostrar_progresso = 8, False
+    assert len(agendador.embeddar(textos)) == 40
+    # Só os 2 lotes que faltavam dos 5 chamam a API
+    assert retomado.chamadas == 2
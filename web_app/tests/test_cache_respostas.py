@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chatbot import cache_respostas as modulo
+from chatbot.cache_respostas import CacheRespostas
+
+
+def test_buscar_exata_acha_a_pergunta_sem_embedding():
+    cache = CacheRespostas(similaridade_minima=0.9)
+    cache.guardar("Como trocar a bobina?", ["data: a\n\n"], [1.0, 0.0])
+    assert cache.buscar_exata("como trocar a bobina") == ["data: a\n\n"]
+    assert cache.buscar_exata("outra pergunta") is None
+    assert cache.estatisticas()["misses"] == 0
+    assert cache.buscar("outra pergunta", [0.99, 0.1]) == ["data: a\n\n"]
+    assert cache.estatisticas()["hits_semanticos"] == 1
+
+
+def test_entrada_expirada_sai_do_cache_quando_e_encontrada(monkeypatch):
+    agora = [100.0]
+    monkeypatch.setattr(modulo.time, "monotonic", lambda: agora[0])
+    cache = CacheRespostas(ttl_segundos=10)
+    cache.guardar("primeira", ["data: 1\n\n"])
+    cache.guardar("segunda", ["data: 2\n\n"])
+    agora[0] = 111.0
+    assert cache.buscar("primeira") is None
+    # Só a entrada procurada foi removida; a outra espera ser encontrada
+    assert cache.estatisticas()["tamanho"] == 1
+    assert not cache.contem("segunda")
+    assert cache.estatisticas()["tamanho"] == 0
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("google.generativeai")
+
+from langchain_core.documents import Document
+
+from criar_indice_estruturado import chaves_por_codigo
+
+
+def _documento(codigo, texto, titulo="Título"):
+    return Document(page_content=texto, metadata={"codigo_artigo": codigo, "titulo_artigo": titulo})
+
+
+def test_codigo_unico_e_a_propria_chave():
+    assert chaves_por_codigo([_documento("7500", "a"), _documento("7501", "b")]) == ["7500", "7501"]
+
+
+def test_chave_de_codigo_repetido_nao_depende_da_posicao():
+    linhas = [_documento("Não Encontrado", texto) for texto in ("primeiro", "segundo", "terceiro")]
+    chaves = dict(zip((d.page_content for d in linhas), chaves_por_codigo(linhas)))
+    assert len(set(chaves.values())) == 3
+    # Apagar a primeira linha e inverter as outras não muda as chaves que sobram
+    restantes = [linhas[2], linhas[1]]
+    assert chaves_por_codigo(restantes + [_documento("Não Encontrado", "quarto")])[:2] == \
+        [chaves["terceiro"], chaves["segundo"]]
+
+
+def test_linhas_identicas_recebem_chaves_distintas():
+    chaves = chaves_por_codigo([_documento("7500", "igual"), _documento("7500", "igual")])
+    assert len(set(chaves)) == 2
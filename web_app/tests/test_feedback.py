@@ -0,0 +1,44 @@
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import feedback
+from feedback import GravadorFeedback
+
+
+def _falhar_vezes(monkeypatch, vezes):
+    original = feedback._inserir
+    falhas = {"restantes": vezes}
+
+    def inserir(conexao, registros):
+        if falhas["restantes"]:
+            falhas["restantes"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        original(conexao, registros)
+
+    monkeypatch.setattr(feedback, "_inserir", inserir)
+
+
+def _gravar(gravador, quantidade):
+    for i in range(quantidade):
+        gravador.registrar(f"pergunta {i}", "resposta", "positive")
+    gravador.descarregar()
+    return gravador.estatisticas()
+
+
+def test_lote_com_banco_travado_e_gravado_de_novo(tmp_path, monkeypatch):
+    _falhar_vezes(monkeypatch, 2)
+    gravador = GravadorFeedback(str(tmp_path / "feedback.sqlite3"), espera_inicial=0)
+    estatisticas = _gravar(gravador, 3)
+    assert (estatisticas["gravados"], estatisticas["erros"], estatisticas["novas_tentativas"]) == (3, 0, 2)
+    with sqlite3.connect(str(tmp_path / "feedback.sqlite3")) as conexao:
+        assert conexao.execute("SELECT COUNT(*) FROM feedback").fetchone()[0] == 3
+
+
+def test_lote_desiste_depois_do_limite_de_tentativas(tmp_path, monkeypatch):
+    _falhar_vezes(monkeypatch, 10)
+    gravador = GravadorFeedback(str(tmp_path / "feedback.sqlite3"), max_tentativas=3, espera_inicial=0)
+    estatisticas = _gravar(gravador, 1)
+    assert (estatisticas["gravados"], estatisticas["erros"], estatisticas["novas_tentativas"]) == (0, 1, 2)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+
+from chatbot.montagem_contexto import k_adaptativo, montar_contexto
+
+
+def _documento(codigo, pontuacao, assunto):
+    texto = f"Procedimento {codigo} sobre {assunto}: confira o {assunto} e registre o chamado do {assunto}."
+    return Document(page_content=texto, metadata={"codigo_artigo": str(codigo), "titulo_artigo": assunto,
+                                                  "score": pontuacao})
+
+
+def test_k_adaptativo_mantem_pontuacoes_quase_iguais():
+    assert k_adaptativo([0.90, 0.89, 0.88, 0.87]) == 4
+
+
+def test_k_adaptativo_corta_queda_relativa_a_maxima():
+    assert k_adaptativo([0.90, 0.85, 0.30, 0.29]) == 2
+    assert k_adaptativo([0.90, 0.80, 0.70, 0.60, 0.40]) == 4
+
+
+def test_montar_contexto_com_pontuacoes_quase_iguais_usa_todos_os_trechos():
+    docs = [_documento(7500 + i, pontuacao, assunto)
+            for i, (pontuacao, assunto) in enumerate(zip([0.90, 0.89, 0.88, 0.87],
+                                                         ["impressora", "pinpad", "balança", "roteador"]))]
+    contexto, estatisticas = montar_contexto(docs, "como resolver?")
+    assert estatisticas["trechos_usados"] == 4
+    assert all(f"Artigo {7500 + i}" in contexto for i in range(4))
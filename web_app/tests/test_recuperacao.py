@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from chatbot.recuperacao import codigos_citados
+
+
+def test_codigos_citados_exige_contexto_de_artigo():
+    assert codigos_citados("impressora MP 4200 TH não imprime desde 2024") == []
+    assert codigos_citados("o que diz o artigo 7501?") == ["7501"]
+    assert codigos_citados("Código: 7501") == ["7501"]
+    assert codigos_citados("CSF 7600 trava no pinpad") == ["7600"]
+
+
+def test_codigos_citados_em_lista():
+    assert codigos_citados("compare os artigos 7501, 7502 e 7503") == ["7501", "7502", "7503"]
+    assert codigos_citados("cód. 7501 ou cód 7502") == ["7501", "7502"]
+
+
+def test_mensagem_so_com_codigos():
+    assert codigos_citados("7507") == ["7507"]
+    assert codigos_citados("7507 8502") == ["7507", "8502"]
+    assert codigos_citados(" 7501, 7502 ou 7503 ") == ["7501", "7502", "7503"]
+    assert codigos_citados("4200 TH") == []
+    assert codigos_citados("12345678") == []